@@ -0,0 +1,145 @@
+# app/ann_index.py
+
+import math
+import faiss
+import numpy as np
+
+from app.config import (
+    FAISS_INDEX_TYPE,
+    ANN_INDEX_TYPE,
+    ANN_PROMOTE_THRESHOLD,
+    IVF_NLIST,
+    IVF_NPROBE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    PQ_M,
+    PQ_NBITS,
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# Faiss wants ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+ADD_BATCH = 65536
+
+
+def ideal_nlist(n: int) -> int:
+    if IVF_NLIST:
+        return IVF_NLIST
+    return int(min(65536, max(16, 4 * math.sqrt(n))))
+
+
+def _pq_m(dim: int) -> int:
+    """Largest sub-quantizer count <= PQ_M that divides the dimension."""
+    m = min(PQ_M, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def min_train_size(kind: str, n: int) -> int:
+    if kind == "ivf_flat":
+        return ideal_nlist(n) * MIN_POINTS_PER_CENTROID
+    if kind == "ivf_pq":
+        return max(ideal_nlist(n), 2 ** PQ_NBITS) * MIN_POINTS_PER_CENTROID
+    return 0
+
+
+def target_kind(n: int, configured: str = FAISS_INDEX_TYPE) -> str:
+    """
+    Index type the store should use at `n` chunks: the configured one, or flat until the
+    promotion threshold in auto mode. IVF types stay flat until there is enough to train on.
+    """
+    kind = configured
+    if configured == "auto":
+        kind = ANN_INDEX_TYPE if n >= ANN_PROMOTE_THRESHOLD else "flat"
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {kind}")
+    if n < min_train_size(kind, n):
+        return "flat"
+    return kind
+
+
+def index_kind(index) -> str:
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def needs_rebuild(index, n: int, configured: str = FAISS_INDEX_TYPE) -> bool:
+    """
+    True when the index type should change (promotion) or an IVF index has outgrown its
+    coarse quantizer (the ideal nlist doubled since it was trained).
+    """
+    if index is None:
+        return False
+    kind = target_kind(n, configured)
+    if kind != index_kind(index):
+        return True
+    if kind in ("ivf_flat", "ivf_pq"):
+        return ideal_nlist(n) >= 2 * faiss.extract_index_ivf(index).nlist
+    return False
+
+
+def new_index(kind: str, dim: int, n: int = 0):
+    """Empty (untrained) index of the given type; ids are always explicit chunk ids."""
+    if kind == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    if kind == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, HNSW_M)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(hnsw)
+    quantizer = faiss.IndexFlatL2(dim)
+    if kind == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, ideal_nlist(n))
+    elif kind == "ivf_pq":
+        index = faiss.IndexIVFPQ(quantizer, dim, ideal_nlist(n), _pq_m(dim), PQ_NBITS)
+    else:
+        raise ValueError(f"Unknown FAISS index type: {kind}")
+    return index
+
+
+def tune(index, nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH):
+    """Apply search-time parameters (they are not stored in the index file)."""
+    if index is None:
+        return index
+    kind = index_kind(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    elif kind == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efSearch = ef_search
+    return index
+
+
+def build_index(kind: str, dim: int, n: int, sample_fn, batches):
+    """
+    Train (if needed) and fill a new index.
+    `sample_fn(size)` returns training vectors; `batches` yields (ids, vectors).
+    """
+    index = new_index(kind, dim, n)
+    if not index.is_trained:
+        size = min(n, max(min_train_size(kind, n), 256 * ideal_nlist(n)))
+        index.train(np.ascontiguousarray(sample_fn(size), dtype=np.float32))
+    for ids, vectors in batches:
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+    return tune(index)
+
+
+def supports_remove(index) -> bool:
+    """HNSW graphs cannot drop vectors; deleted ids are filtered at search time instead."""
+    return index_kind(index) != "hnsw"
+
+
+def search_params(index, selector):
+    """Search parameters restricting `index` to the ids accepted by `selector`."""
+    kind = index_kind(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=faiss.downcast_index(index.index).hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
@@ -0,0 +1,138 @@
+# app/answer_cache.py
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE
+from app.utils import metrics
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case, punctuation and spacing removed: "What's the  leave policy?" == "whats the leave policy"."""
+    return _SPACES.sub(" ", _PUNCTUATION.sub("", text.lower())).strip()
+
+
+class _Entry:
+    __slots__ = ("vector", "answer", "latency_ms", "created")
+
+    def __init__(self, vector: np.ndarray, answer: str, latency_ms: float):
+        self.vector = vector
+        self.answer = answer
+        self.latency_ms = latency_ms
+        self.created = time.monotonic()
+
+
+class AnswerCache:
+    """
+    Answers to questions asked before, for questions without an attached file.
+    Entries are grouped by workspace, system prompt version and the ids of the chunks
+    retrieved for the question; within a group, a cached answer is served when its
+    question's embedding has cosine similarity >= `threshold` with the new one. A newer
+    vector store (manager.generation) empties the cache; a prompt change starts new
+    groups. Entries expire after `ttl` seconds; at most `max_entries` are kept (LRU).
+    Cached answers are shared by everyone in the workspace who retrieves the same chunks,
+    so they are built without the asker's conversation history (see openai_utils);
+    questions that retrieved no chunks are answered from that history and not cached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        self._groups = OrderedDict()  # group key -> list of _Entry, least recently used first
+        self._size = 0
+        self._generation = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group(team_id: str, prompt_version: str, chunk_ids) -> tuple | None:
+        """Cache group of a question, or None (not cacheable) when no chunks were retrieved."""
+        if not chunk_ids:
+            return None
+        return team_id, prompt_version, tuple(sorted(chunk_ids))
+
+    # ----------------- PUBLIC API -----------------
+    def get(self, group: tuple | None, vector, generation: int) -> str | None:
+        if not self.enabled or group is None:
+            return None
+        query = self._unit(vector)
+        with self._lock:
+            entries = self._groups.get(group) if self._check_generation(generation) else None
+            best, best_score = None, self.threshold
+            now = time.monotonic()
+            for entry in list(entries or []):
+                if now - entry.created > self.ttl:
+                    entries.remove(entry)
+                    self._size -= 1
+                    continue
+                score = float(entry.vector @ query)
+                if score >= best_score:
+                    best, best_score = entry, score
+            if entries is not None:
+                self._groups.move_to_end(group)
+        if best is None:
+            metrics.incr("answer_cache.misses")
+            return None
+        metrics.incr("answer_cache.hits")
+        metrics.incr("answer_cache.saved_ms", int(best.latency_ms))
+        return best.answer
+
+    def put(self, group: tuple | None, vector, generation: int, answer: str, latency_ms: float):
+        if not self.enabled or group is None or not answer:
+            return
+        with self._lock:
+            if not self._check_generation(generation):
+                return  # answered from a store that has changed since
+            self._groups.setdefault(group, []).append(_Entry(self._unit(vector), answer, latency_ms))
+            self._groups.move_to_end(group)
+            self._size += 1
+            while self._size > self.max_entries and self._groups:
+                _, evicted = self._groups.popitem(last=False)
+                self._size -= len(evicted)
+            metrics.gauge("answer_cache.entries", self._size)
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+            self._size = 0
+
+    # ----------------- INTERNALS -----------------
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_generation(self, generation: int) -> bool:
+        """
+        Called with the lock held: drop everything once the vector store moved to a newer
+        generation. False for an older one (a request that read the store before a change),
+        which must neither be served nor stored.
+        """
+        if self._generation is not None and generation < self._generation:
+            return False
+        if generation != self._generation:
+            if self._generation is not None and self._size:
+                metrics.incr("answer_cache.invalidations")
+            self._groups.clear()
+            self._size = 0
+            self._generation = generation
+        return True
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,406 @@
+# app/async_slack_listener.py
+#
+# asyncio twin of slack_listener.py (SLACK_ASYNC_MODE=true): AsyncApp + async socket mode
+# on the FastAPI event loop, AsyncOpenAI, and the pooled httpx client for Supabase and file
+# downloads. Blocking work (document parsing, FAISS search, chunking) runs on worker threads.
+
+import os
+import time
+import asyncio
+import weakref
+from dotenv import load_dotenv
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.errors import SlackApiError
+
+from app.config import ASYNC_MAX_CONVERSATIONS, STREAM_ANSWERS, SLACK_CACHE_PREWARM, SLACK_ADMIN_TTL, QUERY_ROUTING
+from app.utils import metrics
+from app.utils.slack_utils import is_admin_async, slack_directory
+from app.openai_utils import ask_gpt_async, ask_gpt_stream_async
+from app.image_pipeline import analyze_image_async
+from app.db.supabase_client import (
+    save_interaction_async,
+    update_feedback_async,
+    clear_user_interactions_async,
+    clear_all_interactions_async,
+)
+from app.db.prompt_repo import update_system_prompt_async, get_system_prompt_record_async
+from app.slack_common import (
+    ERROR_TEXT,
+    FEEDBACK_MAP,
+    STREAM_CURSOR,
+    StreamThrottle,
+    answer_blocks,
+    chunk_metadata,
+    extract_document_text,
+    file_kind,
+    upload_chunks,
+)
+from app.vector_store_utils import clear_vector_store
+from app.ingestion import ingestion_queue
+from app.extraction import ExtractionLimitError
+from app.downloads import DownloadError, FileTooLargeError, download_async
+from app.extraction_cache import extraction_cache
+from app.process_response import needs_map_reduce, process_document_in_chunks
+from app.query_router import route_query
+from app.history import conversation_history
+
+load_dotenv()
+
+async_slack_app = AsyncApp(token=os.getenv("SLACK_BOT_TOKEN"))
+
+# Bounds conversations in flight; one lock per user keeps their messages in order
+_conversations = asyncio.Semaphore(ASYNC_MAX_CONVERSATIONS)
+_user_locks = weakref.WeakValueDictionary()
+_active = 0
+# Strong references to fire-and-forget tasks (the loop only keeps weak ones)
+_background = set()
+
+
+def _user_lock(key) -> asyncio.Lock:
+    lock = _user_locks.get(key)
+    if lock is None:
+        lock = _user_locks[key] = asyncio.Lock()
+    return lock
+
+
+# ----------------- SLACK LISTENER -----------------
+@async_slack_app.event("message")
+async def handle_user_message(body, client, logger):
+    event = body.get("event", {})
+    if event.get("subtype", "") == "bot_message":
+        return
+
+    lock = _user_lock((body.get("team_id") or event.get("team"), event.get("user")))
+    submitted_at = time.perf_counter()
+    global _active
+    async with lock, _conversations:
+        metrics.observe("async.wait", (time.perf_counter() - submitted_at) * 1000)
+        _active += 1
+        metrics.gauge("async.active", _active)
+        try:
+            with metrics.timed("async.run"):
+                await process_user_message(body, client, logger)
+        finally:
+            _active -= 1
+            metrics.gauge("async.active", _active)
+
+
+async def process_user_message(body, client, logger):
+    try:
+        event = body.get("event", {})
+        user_id = event.get("user")
+        raw_text = event.get("text", "")
+        message_text = raw_text.strip() if isinstance(raw_text, str) else ""
+        files = event.get("files", [])
+        channel_id = event.get("channel")
+        team_id = body.get("team_id") or event.get("team")
+        thread_ts = event.get("thread_ts", event.get("ts"))
+
+        thinking_msg = await client.chat_postMessage(
+            channel=channel_id,
+            thread_ts=thread_ts,
+            text="🤔 Analyzing your message and files..."
+        )
+        thinking_ts = thinking_msg["ts"]
+
+        # Files are downloaded and parsed concurrently; results keep the upload order
+        results = await asyncio.gather(*(
+            extract_file(f, client, logger, user_id, thinking_ts, chunk_metadata(
+                user_id, channel_id, team_id, f.get("id"), event.get("ts")
+            )) for f in files or []
+        ))
+        extracted_texts = [text for text, _ in results if text is not None]
+        uploaded_files = [upload for _, upload in results if upload is not None]
+
+        # Combine extracted text
+        extracted_combined_text = "\n\n".join([t for t in extracted_texts if isinstance(t, str)])
+
+        # Queue for background embedding if we have text (status: GET /ingestion/<thinking_ts>)
+        chunks, metadatas = await asyncio.to_thread(
+            upload_chunks, uploaded_files, user_id, channel_id, team_id, event.get("ts")
+        )
+        if chunks:
+            await asyncio.to_thread(ingestion_queue.submit, chunks, upload_id=thinking_ts, metadatas=metadatas)
+
+        # Route locally: decides whether the answer searches the vector store
+        kinds = [file_kind(f) for f in files or []]
+        route = None
+        if QUERY_ROUTING:
+            route = route_query(
+                message_text,
+                has_documents=any(kind and kind != "image" for kind in kinds),
+                has_images="image" in kinds,
+            )
+
+        # Ask GPT (the prompt version is recorded with the interaction)
+        system_prompt = await get_system_prompt_record_async()
+        if await asyncio.to_thread(needs_map_reduce, extracted_combined_text):
+            # Too large for one request: answer chunk by chunk (map-reduce)
+            final_response = await asyncio.to_thread(
+                process_document_in_chunks,
+                extracted_combined_text,
+                message_text,
+                user_id,
+                team_id=team_id,
+                system_prompt=system_prompt
+            )
+        elif STREAM_ANSWERS:
+            # Shown in the thinking message as it is generated
+            final_response = await stream_answer(client, channel_id, thinking_ts, ask_gpt_stream_async(
+                user_message=message_text,
+                file_text=extracted_combined_text,
+                slack_user_id=user_id,
+                team_id=team_id,
+                system_prompt=system_prompt,
+                route=route
+            ))
+        else:
+            final_response = await ask_gpt_async(
+                user_message=message_text,
+                file_text=extracted_combined_text,
+                slack_user_id=user_id,
+                team_id=team_id,
+                system_prompt=system_prompt,
+                route=route
+            )
+
+        # Update Slack message
+        await client.chat_update(
+            channel=channel_id,
+            ts=thinking_ts,
+            text=final_response,
+            blocks=answer_blocks(final_response)
+        )
+
+        # Save full interaction
+        user, team = await asyncio.gather(
+            slack_directory.user_async(client, user_id), slack_directory.team_async(client)
+        )
+        saved = await save_interaction_async(
+            slack_user_id=user_id,
+            slack_user_name=user["real_name"],
+            organization=team["name"],
+            message_text=message_text,
+            extracted_text=extracted_combined_text,
+            response_text=final_response,
+            prompt_version=f"RAG-GPT4:{system_prompt.version}",
+            slack_ts=thinking_ts
+        )
+        conversation_history.append(user_id, saved)
+
+    except Exception as e:
+        logger.error(f"❌ Error handling message: {e}")
+        try:
+            await client.chat_postMessage(
+                channel=channel_id,
+                thread_ts=thread_ts,
+                text=ERROR_TEXT
+            )
+        except Exception as inner:
+            logger.error(f"❌ Failed to send fallback message: {inner}")
+
+
+async def stream_answer(client, channel_id, ts, deltas) -> str:
+    """Write the answer into the message at `ts` while it streams in; returns the full answer."""
+    throttle, parts = StreamThrottle(), []
+    async for delta in deltas:
+        parts.append(delta)
+        if throttle.add():
+            try:
+                await client.chat_update(channel=channel_id, ts=ts, text="".join(parts) + STREAM_CURSOR)
+                throttle.sent()
+            except SlackApiError as e:
+                if not throttle.rate_limited(e):
+                    raise
+    return "".join(parts).strip()
+
+
+async def extract_file(f, client, logger, user_id, thinking_ts, metadata):
+    """
+    Download and extract one Slack file, or take its text from the extraction cache; returns
+    (text for the prompt, (file id, text) to index). Documents parsed here are queued for
+    embedding during extraction and return no second part.
+    """
+    filename = f.get("name")
+    kind = file_kind(f)
+    if not kind:
+        unsupported = f.get("filetype") or f.get("mimetype")
+        logger.warning(f"⚠️ Unsupported file type: {unsupported}")
+        return f"[Unsupported file type: {unsupported}]", None
+
+    download = None
+    try:
+        file_text = await extraction_cache.get_async(f)
+        if file_text is None:
+            download = await download_async(f)
+            logger.info(f"📥 Downloaded: {filename} ({download.size} bytes)")
+            # The same content may have been read before under another file id
+            file_text = await extraction_cache.get_async(f, download.sha256)
+
+        streamed = False
+        if file_text is not None:
+            logger.info(f"♻️ Cached text for: {filename}")
+        elif kind == "image":
+            # --- Local OCR, GPT Vision when OCR falls short ---
+            file_text = await analyze_image_async(await asyncio.to_thread(download.read))
+            extraction_cache.put(f, download.sha256, kind, file_text)
+        else:
+            file_text = await asyncio.to_thread(
+                extract_document_text,
+                kind,
+                download.source,
+                lambda chunks: ingestion_queue.submit(chunks, upload_id=thinking_ts, metadatas=[metadata] * len(chunks)),
+            )
+            extraction_cache.put(f, download.sha256, kind, file_text)
+            streamed = True
+
+        if kind == "image":
+            user, team = await asyncio.gather(
+                slack_directory.user_async(client, user_id), slack_directory.team_async(client)
+            )
+            saved = await save_interaction_async(
+                slack_user_id=user_id,
+                slack_user_name=user["real_name"],
+                organization=team["name"],
+                message_text=file_text,
+                extracted_text=None,
+                response_text=None,
+                prompt_version="RAG-GPT4",
+                slack_ts=thinking_ts
+            )
+            conversation_history.append(user_id, saved)
+        return file_text, None if streamed else (f.get("id"), file_text)
+
+    except (FileTooLargeError, ExtractionLimitError) as limit_err:
+        logger.warning(f"⚠️ Skipped {filename}: {limit_err}")
+        return f"[Skipped {filename}: file too large to read]", None
+    except DownloadError as download_err:
+        logger.error(f"❌ Failed to download {download_err}")
+        return None, None
+    except Exception as file_err:
+        logger.error(f"❌ Error processing {filename}: {file_err}")
+        return None, None
+    finally:
+        if download is not None:
+            download.close()
+
+
+@async_slack_app.command("/update")
+async def handle_update_prompt_command(ack, body, respond, client):
+    await ack()
+
+    user_id = body["user_id"]
+    new_prompt = body["text"].strip()
+
+    if not new_prompt:
+        await respond("⚠️ Please provide a new prompt.")
+        return
+    try:
+        # Fetch user info from Slack (admin flags no older than SLACK_ADMIN_TTL)
+        user_info = await slack_directory.user_async(client, user_id, max_age=SLACK_ADMIN_TTL)
+        is_admin = user_info["is_admin"]
+        is_owner = user_info.get("is_owner", False)
+
+        if not (is_admin or is_owner):
+            await respond("❌ You are not authorized to update the system prompt.")
+            return
+
+    except SlackApiError as e:
+        await respond(f"❌ Failed to check user permissions: {e.response['error']}")
+        return
+
+    # Update the prompt in Supabase
+    success = await update_system_prompt_async(new_prompt, updated_by=user_id)
+
+    if success:
+        await respond(f"✅ System prompt updated by <@{user_id}>.")
+    else:
+        await respond("❌ Failed to update the system prompt. Please try again.")
+
+
+@async_slack_app.action("feedback_like")
+@async_slack_app.action("feedback_dislike")
+@async_slack_app.action("feedback_error")
+async def handle_feedback(ack, body, action, client, logger):
+    await ack()  # Acknowledge the button click
+
+    feedback = FEEDBACK_MAP[action["action_id"]]
+    user_id = body["user"]["id"]
+    message_ts = body["message"]["ts"]
+
+    try:
+        # Update the record in Supabase using `message_ts` as a key
+        await update_feedback_async(message_ts, feedback)
+
+        await client.chat_postEphemeral(
+            channel=body["channel"]["id"],
+            user=user_id,
+            text=f"Thank you for the feedback.: {feedback}"
+        )
+    except Exception as e:
+        logger.error("Error updating feedback: %s", e)
+
+
+@async_slack_app.command("/clear")
+async def handle_clear_command(ack, body, respond):
+    await ack()
+
+    user_id = body["user_id"]
+    success, clearVector = await asyncio.gather(
+        clear_user_interactions_async(user_id),
+        asyncio.to_thread(clear_vector_store, user_id=user_id, team_id=body.get("team_id")),
+    )
+    conversation_history.clear(user_id)
+
+    if success and clearVector:
+        await respond(f"🧹 Your chat history and uploaded documents have been cleared from memory.")
+    else:
+        await respond(f"❌ Failed to clear your chat history. Please try again later.")
+
+
+@async_slack_app.command("/clear_all")
+async def handle_clear_all_command(ack, body, client, respond):
+    await ack()
+    user_id = body["user_id"]
+
+    if not await is_admin_async(user_id, client):
+        await respond("❌ You do not have permission to use this command.")
+        return
+
+    success = await clear_all_interactions_async()
+    conversation_history.clear()
+
+    if success:
+        await respond("🚨 All interactions have been permanently deleted from the database.")
+    else:
+        await respond("❌ Failed to clear all interactions. Please try again later.")
+
+
+# ----------------- DIRECTORY UPDATES -----------------
+@async_slack_app.event("user_change")
+async def handle_user_change(event):
+    slack_directory.put_user(event["user"])
+
+
+@async_slack_app.event("team_rename")
+async def handle_team_rename(event):
+    slack_directory.invalidate_team()
+
+
+async def prewarm_directory():
+    try:
+        await slack_directory.prewarm_async(async_slack_app.client)
+    except Exception as e:
+        print(f"❌ Failed to prewarm the Slack user cache: {e}")
+
+
+# 🔁 Start the socket mode handler
+async def start_async_socket_mode() -> AsyncSocketModeHandler:
+    """Connect on the running event loop and return; close with handler.close_async()."""
+    handler = AsyncSocketModeHandler(async_slack_app, os.getenv("SLACK_APP_TOKEN"))
+    await handler.connect_async()
+    if SLACK_CACHE_PREWARM:
+        _background.add(task := asyncio.create_task(prewarm_directory()))
+        task.add_done_callback(_background.discard)
+    return handler
@@ -0,0 +1,404 @@
+# app/chunk_store.py
+#
+# Compact, memory-mapped chunk store addressed by vector id. A snapshot holds:
+#
+#   chunks.offsets / chunks.blob        UTF-8 text of chunk i = blob[offsets[i]:offsets[i + 1]]
+#   chunks.meta.offsets / chunks.meta   JSON metadata of chunk i (user, channel, team, file, time)
+#   chunks.ns                           uint32 namespace code per chunk (DELETED for tombstones)
+#   chunks.fp                           uint64 content fingerprint per chunk (0 when deleted)
+#   chunks.fp.sorted                    the live fingerprints, sorted, for de-duplication lookups
+#   chunks.vectors                      float32[n, dim] raw embeddings, the source of truth for
+#                                       (re)building any FAISS index type
+#   namespaces.json                     namespace key of every code
+#
+# Opening a snapshot only maps the files, so cold start does not depend on how many chunks
+# exist, and a query only pages in the texts it actually returns. Chunks added or deleted
+# since the snapshot (replayed from the WAL) live in memory until the next compaction.
+# Ids are never reused: deleted chunks stay behind as empty tombstone rows.
+
+import os
+import json
+import mmap
+import hashlib
+import numpy as np
+
+OFFSETS_FILE = "chunks.offsets"
+BLOB_FILE = "chunks.blob"
+META_OFFSETS_FILE = "chunks.meta.offsets"
+META_FILE = "chunks.meta"
+NAMESPACE_CODES_FILE = "chunks.ns"
+FINGERPRINTS_FILE = "chunks.fp"
+SORTED_FINGERPRINTS_FILE = "chunks.fp.sorted"
+VECTORS_FILE = "chunks.vectors"
+NAMESPACES_FILE = "namespaces.json"
+COPY_CHUNK_BYTES = 16 * 1024 * 1024
+DELETED = 0xFFFFFFFF
+
+# Namespace of chunks uploaded before metadata existed; searched on behalf of every caller
+SHARED_NAMESPACE = ""
+
+
+def namespace_key(metadata: dict | None) -> str:
+    """Vector namespace of a chunk: one per Slack user within a workspace."""
+    if not metadata or not metadata.get("user"):
+        return SHARED_NAMESPACE
+    return f"{metadata.get('team') or ''}:{metadata['user']}"
+
+
+def namespaced_hash(text: str, namespace: str = SHARED_NAMESPACE) -> str:
+    """sha256 hex digest of namespace + chunk text, NUL-separated."""
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+def fingerprint(text: str, namespace: str = SHARED_NAMESPACE) -> int:
+    """64-bit content fingerprint (prefix of namespaced_hash)."""
+    return int(namespaced_hash(text, namespace)[:16], 16) or 1  # 0 marks a deleted row
+
+
+def _map_array(path: str, dtype) -> np.ndarray:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _write_array(path: str, array, dtype: str):
+    with open(path, "wb") as f:
+        f.write(np.asarray(array).astype(dtype).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class _BlobColumn:
+    """Variable-length byte strings stored as offsets[n + 1] plus one contiguous blob."""
+
+    def __init__(self, directory: str = None, offsets_file: str = None, blob_file: str = None):
+        self.offsets = np.zeros(1, dtype=np.uint64)
+        self.blob = None
+        if directory:
+            offsets = _map_array(os.path.join(directory, offsets_file), "<u8")
+            if len(offsets):
+                self.offsets = offsets
+            path = os.path.join(directory, blob_file)
+            if os.path.exists(path) and os.path.getsize(path):
+                with open(path, "rb") as f:
+                    self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, i: int) -> bytes:
+        if i >= len(self):
+            return b""
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.blob[start:end] if end > start else b""
+
+    def write(self, directory: str, offsets_file: str, blob_file: str, base: int, tail: list[bytes], dropped: set):
+        """Write `base` rows (blanking the `dropped` ones) followed by `tail`."""
+        offsets = np.zeros(base + len(tail) + 1, dtype=np.uint64)
+        position = 0
+        with open(os.path.join(directory, blob_file), "wb") as f:
+            if not dropped and len(self) == base:
+                # Fast path: copy the base blob verbatim
+                offsets[:base + 1] = self.offsets
+                position = int(self.offsets[base])
+                for start in range(0, position, COPY_CHUNK_BYTES):
+                    f.write(self.blob[start:min(position, start + COPY_CHUNK_BYTES)])
+            else:
+                for i in range(base):
+                    if i not in dropped:
+                        data = self.get(i)
+                        f.write(data)
+                        position += len(data)
+                    offsets[i + 1] = position
+            for n, data in enumerate(tail, start=base + 1):
+                f.write(data)
+                position += len(data)
+                offsets[n] = position
+            f.flush()
+            os.fsync(f.fileno())
+        _write_array(os.path.join(directory, offsets_file), offsets, "<u8")
+
+
+class ChunkStore:
+    """
+    Read-only base snapshot plus an in-memory tail of new chunks and a set of deletions.
+    Writers must be serialized by the caller (the vector store manager's lock).
+    """
+
+    def __init__(self, snapshot_dir: str = None):
+        self.snapshot_dir = snapshot_dir
+        self._texts = _BlobColumn(snapshot_dir, OFFSETS_FILE, BLOB_FILE)
+        self._metas = _BlobColumn(snapshot_dir, META_OFFSETS_FILE, META_FILE)
+        self.base_count = len(self._texts)
+
+        self._namespaces = [SHARED_NAMESPACE]
+        self._ns_codes = np.zeros(self.base_count, dtype=np.uint32)
+        self._fingerprints = None  # per-id; None for snapshots that predate namespaces
+        self._sorted_fingerprints = np.zeros(0, dtype=np.uint64)
+        self._vectors = None
+        if snapshot_dir:
+            path = os.path.join(snapshot_dir, NAMESPACES_FILE)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self._namespaces = json.load(f)
+                self._ns_codes = _map_array(os.path.join(snapshot_dir, NAMESPACE_CODES_FILE), "<u4")
+                self._fingerprints = _map_array(os.path.join(snapshot_dir, FINGERPRINTS_FILE), "<u8")
+                self._sorted_fingerprints = _map_array(os.path.join(snapshot_dir, SORTED_FINGERPRINTS_FILE), "<u8")
+            else:
+                # Older layout: chunks.fp held the sorted fingerprints, everything is shared
+                self._sorted_fingerprints = _map_array(os.path.join(snapshot_dir, FINGERPRINTS_FILE), "<u8")
+            if self.base_count:
+                flat = _map_array(os.path.join(snapshot_dir, VECTORS_FILE), "<f4")
+                if len(flat):
+                    self._vectors = flat.reshape(self.base_count, len(flat) // self.base_count)
+        self._ns_lookup = {key: code for code, key in enumerate(self._namespaces)}
+        self._ns_ids = None  # namespace code -> sorted live ids, built on first scoped query
+
+        self._tail = {}  # id -> (text, vector, metadata, ns code, fingerprint) newer than the snapshot
+        self._tail_fingerprints = set()
+        self._deleted = set()  # ids deleted since the snapshot
+        self._deleted_fingerprints = set()
+        self._base_deleted = None  # tombstones already in the snapshot, counted on first use
+
+    def __len__(self):
+        return self.base_count + len(self._tail)
+
+    @property
+    def next_id(self) -> int:
+        return len(self)
+
+    @property
+    def live_count(self) -> int:
+        """Chunks that have not been deleted."""
+        if self._base_deleted is None:
+            self._base_deleted = int(np.count_nonzero(np.asarray(self._ns_codes) == DELETED))
+        return len(self) - self._base_deleted - len(self._deleted)
+
+    def is_deleted(self, chunk_id: int) -> bool:
+        if chunk_id in self._deleted:
+            return True
+        return 0 <= chunk_id < self.base_count and int(self._ns_codes[chunk_id]) == DELETED
+
+    # ----------------- READS -----------------
+    def get(self, chunk_id: int) -> str | None:
+        if self.is_deleted(chunk_id):
+            return None
+        if 0 <= chunk_id < self.base_count:
+            return self._texts.get(chunk_id).decode("utf-8")
+        row = self._tail.get(chunk_id)
+        return row[0] if row else None
+
+    def get_many(self, chunk_ids) -> list[str | None]:
+        return [self.get(int(i)) for i in chunk_ids]
+
+    def metadata(self, chunk_id: int) -> dict | None:
+        if self.is_deleted(chunk_id):
+            return None
+        if 0 <= chunk_id < self.base_count:
+            raw = self._metas.get(chunk_id)
+            return json.loads(raw) if raw else {}
+        row = self._tail.get(chunk_id)
+        return row[2] if row else None
+
+    @property
+    def missing_vectors(self) -> bool:
+        """True for snapshots written before raw vectors were stored."""
+        return self.base_count > 0 and self._vectors is None
+
+    @property
+    def dim(self) -> int | None:
+        if self._vectors is not None:
+            return self._vectors.shape[1]
+        for row in self._tail.values():
+            return len(row[1])
+        return None
+
+    def vectors(self, chunk_ids) -> np.ndarray:
+        ids = np.asarray(chunk_ids, dtype=np.int64).reshape(-1)
+        out = np.empty((len(ids), self.dim or 0), dtype=np.float32)
+        in_base = ids < self.base_count
+        if in_base.any():
+            out[in_base] = self._vectors[ids[in_base]]
+        for pos in np.flatnonzero(~in_base):
+            out[pos] = self._tail[int(ids[pos])][1]
+        return out
+
+    def live_ids(self, upto_id: int) -> np.ndarray:
+        """Ids <= upto_id that have not been deleted."""
+        keep = np.ones(upto_id + 1, dtype=bool)
+        base = min(self.base_count, upto_id + 1)
+        keep[:base] = np.asarray(self._ns_codes[:base]) != DELETED
+        for i in self._deleted:
+            if i <= upto_id:
+                keep[i] = False
+        return np.flatnonzero(keep).astype(np.int64)
+
+    def iter_vectors(self, chunk_ids: np.ndarray, batch: int):
+        """Yield (ids, vectors) for the given ids, `batch` at a time."""
+        for start in range(0, len(chunk_ids), batch):
+            part = chunk_ids[start:start + batch]
+            yield part, self.vectors(part)
+
+    def sample_vectors(self, size: int, chunk_ids: np.ndarray) -> np.ndarray:
+        if size < len(chunk_ids):
+            chunk_ids = np.sort(np.random.default_rng(0).choice(chunk_ids, size, replace=False))
+        return self.vectors(chunk_ids)
+
+    def set_base_vectors(self, vectors: np.ndarray):
+        """Back-fill vectors for an old snapshot (recovered from the FAISS index)."""
+        self._vectors = np.asarray(vectors, dtype=np.float32)
+
+    def contains(self, fp: int) -> bool:
+        if fp in self._tail_fingerprints:
+            return True
+        if fp in self._deleted_fingerprints:
+            return False
+        fps = self._sorted_fingerprints
+        if not len(fps):
+            return False
+        pos = int(np.searchsorted(fps, np.uint64(fp)))
+        return pos < len(fps) and int(fps[pos]) == fp
+
+    # ----------------- NAMESPACES -----------------
+    def _namespace_ids(self) -> dict[int, np.ndarray]:
+        if self._ns_ids is None:
+            codes = np.asarray(self._ns_codes)
+            order = np.argsort(codes, kind="stable")
+            groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1) if len(order) else []
+            ns_ids = {}
+            for group in groups:
+                code = int(codes[group[0]])
+                if code != DELETED:
+                    ns_ids[code] = group.astype(np.int64)
+            for i in sorted(self._tail):
+                code = self._tail[i][3]
+                ns_ids[code] = np.append(ns_ids.get(code, np.zeros(0, dtype=np.int64)), i)
+            if self._deleted:
+                deleted = np.fromiter(self._deleted, dtype=np.int64)
+                ns_ids = {code: np.setdiff1d(ids, deleted, assume_unique=True) for code, ids in ns_ids.items()}
+            self._ns_ids = ns_ids
+        return self._ns_ids
+
+    def ids_for(self, namespaces) -> np.ndarray:
+        """Sorted live chunk ids belonging to any of the given namespaces."""
+        groups = self._namespace_ids()
+        parts = [groups[self._ns_lookup[ns]] for ns in namespaces
+                 if self._ns_lookup.get(ns) in groups]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def namespaces(self, team: str = None) -> list[str]:
+        """Known namespaces, optionally only those of one workspace."""
+        if team is None:
+            return list(self._namespaces)
+        return [ns for ns in self._namespaces if ns.startswith(f"{team}:")]
+
+    def _code(self, namespace: str) -> int:
+        code = self._ns_lookup.get(namespace)
+        if code is None:
+            code = len(self._namespaces)
+            self._namespaces.append(namespace)
+            self._ns_lookup[namespace] = code
+        return code
+
+    # ----------------- WRITES -----------------
+    def add(self, chunk_id: int, text: str, vector, metadata: dict = None):
+        if chunk_id != self.next_id:
+            raise ValueError(f"Chunk ids must be contiguous: expected {self.next_id}, got {chunk_id}")
+        namespace = namespace_key(metadata)
+        code = self._code(namespace)
+        fp = fingerprint(text, namespace)
+        self._tail[chunk_id] = (text, np.asarray(vector, dtype=np.float32), metadata or {}, code, fp)
+        self._tail_fingerprints.add(fp)
+        self._deleted_fingerprints.discard(fp)
+        if self._ns_ids is not None:
+            self._ns_ids[code] = np.append(self._ns_ids.get(code, np.zeros(0, dtype=np.int64)), chunk_id)
+
+    def delete(self, chunk_ids):
+        """Tombstone chunks: they drop out of reads, namespaces and de-duplication."""
+        for i in chunk_ids:
+            i = int(i)
+            if i >= self.next_id or self.is_deleted(i):
+                continue
+            self._deleted.add(i)
+            if i < self.base_count:
+                fp = int(self._base_fingerprint(i))
+                if fp:
+                    self._deleted_fingerprints.add(fp)
+            else:
+                self._tail_fingerprints.discard(self._tail[i][4])
+        self._ns_ids = None
+
+    def _base_fingerprint(self, i: int) -> int:
+        if self._fingerprints is not None:
+            return int(self._fingerprints[i])
+        return fingerprint(self._texts.get(i).decode("utf-8"))
+
+    def tail_items(self) -> list[tuple]:
+        """(id, text, vector, metadata) of chunks newer than the snapshot, in id order."""
+        return [(i, *self._tail[i][:3]) for i in sorted(self._tail)]
+
+    def deleted_ids(self) -> set:
+        return set(self._deleted)
+
+    def write_snapshot(self, directory: str, tail: list[tuple], deleted: set):
+        """
+        Write base + `tail` with `deleted` tombstoned (a consistent copy taken under the
+        writer lock) as snapshot files in `directory`. Safe to run concurrently with reads
+        and new writes.
+        """
+        base = self.base_count
+        dropped = {i for i in deleted if i < base}
+        self._texts.write(directory, OFFSETS_FILE, BLOB_FILE, base,
+                          [b"" if i in deleted else text.encode("utf-8") for i, text, _, _ in tail], dropped)
+        self._metas.write(directory, META_OFFSETS_FILE, META_FILE, base,
+                          [b"" if i in deleted else json.dumps(meta, ensure_ascii=False).encode("utf-8")
+                           for i, _, _, meta in tail], dropped)
+
+        codes = np.concatenate([
+            np.asarray(self._ns_codes, dtype=np.uint32),
+            np.array([self._tail[i][3] for i, _, _, _ in tail], dtype=np.uint32),
+        ])
+        if self._fingerprints is not None:
+            base_fps = np.asarray(self._fingerprints, dtype=np.uint64)
+        else:
+            base_fps = np.array([self._base_fingerprint(i) for i in range(base)], dtype=np.uint64)
+        fps = np.concatenate([base_fps, np.array([self._tail[i][4] for i, _, _, _ in tail], dtype=np.uint64)])
+        for i in deleted:
+            codes[i] = DELETED
+            fps[i] = 0
+        _write_array(os.path.join(directory, NAMESPACE_CODES_FILE), codes, "<u4")
+        _write_array(os.path.join(directory, FINGERPRINTS_FILE), fps, "<u8")
+        _write_array(os.path.join(directory, SORTED_FINGERPRINTS_FILE), np.unique(fps[fps != 0]), "<u8")
+
+        with open(os.path.join(directory, VECTORS_FILE), "wb") as f:
+            if self._vectors is not None:
+                rows = max(1, COPY_CHUNK_BYTES // (4 * self._vectors.shape[1]))
+                for start in range(0, base, rows):
+                    block = np.array(self._vectors[start:start + rows], dtype="<f4")
+                    for i in dropped:
+                        if start <= i < start + rows:
+                            block[i - start] = 0
+                    f.write(block.tobytes())
+            for _, _, vector, _ in tail:
+                f.write(vector.astype("<f4").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(os.path.join(directory, NAMESPACES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self._namespaces, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rebase(self, snapshot_dir: str) -> "ChunkStore":
+        """
+        Open a freshly written snapshot of this store, carrying over the chunks added and
+        deleted while it was being written.
+        """
+        rebased = ChunkStore(snapshot_dir)
+        for chunk_id, text, vector, metadata in self.tail_items():
+            if chunk_id >= rebased.base_count:
+                rebased.add(chunk_id, text, vector, metadata)
+        rebased.delete(self._deleted)
+        return rebased
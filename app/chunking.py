@@ -0,0 +1,184 @@
+# app/chunking.py
+#
+# Token-aware chunking shared by ingestion (slack_common.upload_chunks) and document QA
+# (process_response). The whole document is tokenized once (large documents in parallel
+# blocks), token byte offsets come from a per-vocabulary length table, and chunks are
+# packed by binary search over those offsets. Chunks end at paragraph, line or sentence
+# boundaries where one is in reach, and map back to exact character spans of the text.
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from app.utils.tokens import encoding
+
+# Candidate chunk ends: a blank line (paragraph), a newline, or whitespace after . ! ?
+_BOUNDARY = re.compile(rb"\n[ \t]*\n\s*|\n|(?<=[.!?])[\"')\]]*\s+")
+
+# Documents are tokenized in blocks of about this many characters, one thread per block
+ENCODE_BLOCK_CHARS = 4 * 1024 * 1024
+
+_token_bytes = None
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # character span in the source text
+    end: int
+    tokens: int
+
+
+def _token_byte_lengths() -> np.ndarray:
+    """UTF-8 byte length of every token id in the vocabulary."""
+    global _token_bytes
+    if _token_bytes is None:
+        enc = encoding()
+        lengths = np.zeros(enc.max_token_value + 1, dtype=np.int64)
+        for token in range(enc.max_token_value + 1):
+            try:
+                lengths[token] = len(enc.decode_single_token_bytes(token))
+            except KeyError:  # unused ids between the ranks and the special tokens
+                pass
+        _token_bytes = lengths
+    return _token_bytes
+
+
+def _encode(text: str) -> np.ndarray:
+    """Token ids of the whole text; long texts are split at paragraph breaks and encoded in parallel."""
+    enc = encoding()
+    if len(text) <= ENCODE_BLOCK_CHARS:
+        return enc.encode_to_numpy(text, disallowed_special=())
+    blocks, start = [], 0
+    while start < len(text):
+        end = start + ENCODE_BLOCK_CHARS
+        if end < len(text):
+            cut = text.rfind("\n\n", start + ENCODE_BLOCK_CHARS // 2, end)
+            end = cut + 2 if cut >= 0 else end
+        blocks.append(text[start:end])
+        start = end
+    with ThreadPoolExecutor(max_workers=min(len(blocks), os.cpu_count() or 1)) as pool:
+        return np.concatenate(list(pool.map(lambda block: enc.encode_to_numpy(block, disallowed_special=()), blocks)))
+
+
+def _char_offsets(data: bytes, byte_offsets: list[int], ascii_only: bool) -> dict[int, int]:
+    """Character offset of each (character-aligned) byte offset, in one pass over the text."""
+    if ascii_only:
+        return {b: b for b in byte_offsets}
+    offsets, chars, previous = {}, 0, 0
+    for b in sorted(set(byte_offsets)):
+        chars += len(data[previous:b].decode("utf-8"))
+        offsets[b] = chars
+        previous = b
+    return offsets
+
+
+def chunk_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> list[Chunk]:
+    """
+    Chunks of about `chunk_tokens` tokens at most, consecutive chunks sharing about
+    `overlap_tokens` tokens. A chunk ends at the last paragraph break that keeps it at least
+    half full, else at the last sentence or line break, else mid-sentence at a token edge.
+    """
+    if not text:
+        return []
+    data = text.encode("utf-8")
+    ascii_only = len(data) == len(text)
+
+    tokens = _encode(text)
+    token_end = np.cumsum(_token_byte_lengths()[tokens])  # byte offset after each token
+    n = len(tokens)
+
+    # Boundaries as (token index, byte offset): tokens wholly before the boundary
+    matches = [(m.end(), m.group().count(b"\n") >= 2) for m in _BOUNDARY.finditer(data)]
+    boundary_bytes = np.array([b for b, _ in matches], dtype=np.int64)
+    boundary_tokens = np.searchsorted(token_end, boundary_bytes, side="right")
+    paragraph = np.array([p for _, p in matches], dtype=bool)
+    paragraph_tokens, paragraph_bytes = boundary_tokens[paragraph], boundary_bytes[paragraph]
+
+    def token_edge(t: int) -> int:
+        """Byte offset after token t - 1, moved back to the start of a UTF-8 character."""
+        b = int(token_end[t - 1]) if t else 0
+        while 0 < b < len(data) and data[b] & 0xC0 == 0x80:
+            b -= 1
+        return b
+
+    def after(b: int) -> int:
+        """Start of the first UTF-8 character after byte offset b."""
+        b += 1
+        while b < len(data) and data[b] & 0xC0 == 0x80:
+            b += 1
+        return b
+
+    def tokens_before(b: int) -> int:
+        """Tokens wholly before byte offset b: the token cursor that goes with byte cursor b."""
+        return int(np.searchsorted(token_end, b, side="right"))
+
+    def last_before(positions, values, low, high):
+        """Last boundary with low < token index <= high, as (token index, byte offset)."""
+        i = int(np.searchsorted(positions, high, side="right")) - 1
+        if i >= 0 and positions[i] > low:
+            return int(positions[i]), int(values[i])
+        return None
+
+    spans, start_t, start_b = [], 0, 0
+    while True:
+        if n - start_t <= chunk_tokens:
+            spans.append((start_b, len(data), n - start_t))
+            break
+        limit = start_t + chunk_tokens
+        end = last_before(paragraph_tokens, paragraph_bytes, start_t + chunk_tokens // 2 - 1, limit)
+        end = end or last_before(boundary_tokens, boundary_bytes, start_t, limit)
+        end_t, end_b = end or (limit, token_edge(limit))
+        if end_b <= start_b:  # a token edge inside one long multi-byte run
+            end_b = after(start_b)
+        end_t = tokens_before(end_b)
+        spans.append((start_b, end_b, max(end_t - start_t, 1)))
+
+        # Next chunk starts `overlap_tokens` back, at a boundary when one is in that window
+        next_t = max(end_t - overlap_tokens, start_t + 1)
+        i = int(np.searchsorted(boundary_tokens, next_t, side="left"))
+        if overlap_tokens and i < len(boundary_tokens) and boundary_tokens[i] < end_t and boundary_bytes[i] > start_b:
+            start_t, start_b = int(boundary_tokens[i]), int(boundary_bytes[i])
+        elif overlap_tokens:
+            start_b = max(token_edge(next_t), after(start_b))
+            start_t = tokens_before(start_b)
+        else:
+            start_t, start_b = end_t, end_b
+
+    chars = _char_offsets(data, [b for span in spans for b in span[:2]], ascii_only)
+    return [
+        Chunk(text[chars[start]:chars[end]], chars[start], chars[end], count)
+        for start, end, count in spans
+    ]
+
+
+def split_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> list[str]:
+    """Chunk texts only, without blank chunks (see chunk_text)."""
+    return [chunk.text for chunk in chunk_text(text, chunk_tokens, overlap_tokens) if chunk.text.strip()]
+
+
+def iter_chunks(sections, chunk_tokens: int, overlap_tokens: int = 0, flush_chars: int = 1024 * 1024):
+    """
+    chunk_text over a stream of text sections (extracted pages, paragraphs, ...): yields
+    lists of chunk texts as soon as `flush_chars` characters are buffered. The last chunk of
+    each flush is held back and re-chunked with the following text, so chunks still end at
+    boundaries and overlap across flushes.
+    """
+    buffer, buffered, carried = [], 0, 0
+    for section in sections:
+        buffer.append(section)
+        buffered += len(section)
+        if buffered - carried < flush_chars:
+            continue
+        text = "".join(buffer)
+        chunks = chunk_text(text, chunk_tokens, overlap_tokens)
+        ready = [chunk.text for chunk in chunks[:-1] if chunk.text.strip()]
+        if ready:
+            yield ready
+        buffer = [text[chunks[-1].start:]] if chunks else []
+        buffered = carried = len(buffer[0]) if buffer else 0
+    ready = split_text("".join(buffer), chunk_tokens, overlap_tokens)
+    if ready:
+        yield ready
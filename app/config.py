@@ -1 +1,221 @@
+# app/config.py
 
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------- VECTOR STORE -----------------
+# How often (seconds) the resident FAISS index checks whether the files on disk changed
+VECTOR_STORE_CHECK_INTERVAL = float(os.getenv("VECTOR_STORE_CHECK_INTERVAL", "2"))
+
+# ----------------- EMBEDDINGS -----------------
+# "openai" in production, "fake" for a deterministic local embedder (tests / benchmarks)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
+# ----------------- INGESTION QUEUE -----------------
+# A batch is flushed once it reaches either budget, or after INGEST_FLUSH_INTERVAL seconds
+INGEST_BATCH_TOKENS = int(os.getenv("INGEST_BATCH_TOKENS", "100000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))
+# Max embedding batches in flight at once
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "4"))
+
+# ----------------- MESSAGE DISPATCHER -----------------
+# Slack messages are handled on this many worker threads (one message per user at a time)
+DISPATCH_MAX_WORKERS = int(os.getenv("DISPATCH_MAX_WORKERS", "8"))
+# Messages waiting for a worker before new ones are held back, and for how long (seconds)
+DISPATCH_MAX_PENDING = int(os.getenv("DISPATCH_MAX_PENDING", "200"))
+DISPATCH_SUBMIT_TIMEOUT = float(os.getenv("DISPATCH_SUBMIT_TIMEOUT", "2"))
+
+# ----------------- ASYNC MODE -----------------
+# Which Slack listener app/main.py starts (read once at startup):
+#   false (default): threaded Bolt App (app/slack_listener.py) with the message dispatcher,
+#                    bounded by DISPATCH_* above
+#   true:            AsyncApp + async socket mode on the FastAPI event loop
+#                    (app/async_slack_listener.py), bounded by ASYNC_MAX_CONVERSATIONS and
+#                    the pooled HTTP client below; opt in once it has been run in your workspace
+SLACK_ASYNC_MODE = os.getenv("SLACK_ASYNC_MODE", "false").lower() == "true"
+# Conversations handled concurrently by one async process
+ASYNC_MAX_CONVERSATIONS = int(os.getenv("ASYNC_MAX_CONVERSATIONS", "256"))
+# Pooled async HTTP client (Supabase, Slack file downloads)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+# ----------------- ANSWER STREAMING -----------------
+# Answers are streamed into the Slack message: the first text at once, then an update
+# every STREAM_UPDATE_TOKENS tokens or STREAM_UPDATE_INTERVAL seconds, whichever comes first
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() == "true"
+STREAM_UPDATE_TOKENS = int(os.getenv("STREAM_UPDATE_TOKENS", "100"))
+STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", "1.0"))
+
+# ----------------- SLACK DIRECTORY -----------------
+# users_info / team_info results (names, avatars) are reused for SLACK_CACHE_TTL seconds;
+# with SLACK_CACHE_PREWARM, all members are loaded with users_list at startup
+SLACK_CACHE_TTL = float(os.getenv("SLACK_CACHE_TTL", "3600"))
+# Permission checks (/update, /clear_all) read admin flags no older than this (seconds);
+# 0 fetches users_info on every check, so a demoted admin loses access right away
+SLACK_ADMIN_TTL = float(os.getenv("SLACK_ADMIN_TTL", "0"))
+SLACK_CACHE_USERS = int(os.getenv("SLACK_CACHE_USERS", "20000"))
+SLACK_CACHE_PREWARM = os.getenv("SLACK_CACHE_PREWARM", "false").lower() == "true"
+
+# ----------------- SUPABASE -----------------
+# Keep-alive connections per host, timeouts (seconds), and retries for 429/5xx and
+# connection errors (waits SUPABASE_BACKOFF * 2^n between attempts)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "3.05"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "10"))
+SUPABASE_RETRIES = int(os.getenv("SUPABASE_RETRIES", "3"))
+SUPABASE_BACKOFF = float(os.getenv("SUPABASE_BACKOFF", "0.3"))
+
+# ----------------- PROMPT CACHE -----------------
+# Seconds the system prompt is served from memory. /update refreshes the process that
+# handled it at once; other processes pick the new prompt up within this window.
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "300"))
+
+# ----------------- CONVERSATION HISTORY -----------------
+# Prompt tokens for history: a rolling summary of older turns plus the newest turns that fit
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "400"))
+# Document text attached to a past turn is cut to this many tokens (the full text is in the vector store)
+HISTORY_TURN_MAX_TOKENS = int(os.getenv("HISTORY_TURN_MAX_TOKENS", "300"))
+# Rows fetched when a user's history is first needed; users kept in memory and for how long (seconds)
+HISTORY_FETCH_LIMIT = int(os.getenv("HISTORY_FETCH_LIMIT", "50"))
+HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "2000"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "1800"))
+
+# ----------------- DOWNLOADS -----------------
+# Slack files over DOWNLOAD_MAX_MB are rejected (from the declared size when Slack sends
+# one); downloads over DOWNLOAD_SPOOL_MB are spooled to a temp file instead of memory
+DOWNLOAD_MAX_BYTES = int(float(os.getenv("DOWNLOAD_MAX_MB", "200")) * 1024 * 1024)
+DOWNLOAD_SPOOL_BYTES = int(float(os.getenv("DOWNLOAD_SPOOL_MB", "8")) * 1024 * 1024)
+# Files downloaded at once (threaded mode) and timeouts (seconds)
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "5"))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "60"))
+
+# ----------------- EXTRACTION -----------------
+# Files over EXTRACT_MAX_BYTES are not parsed; text stops after EXTRACT_MAX_PAGES PDF pages
+# or EXTRACT_MAX_CHARS characters
+EXTRACT_MAX_BYTES = int(float(os.getenv("EXTRACT_MAX_MB", "200")) * 1024 * 1024)
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "2000"))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "20000000"))
+# PDFs with at least PDF_PARALLEL_MIN_PAGES pages are split into PDF_PAGES_PER_TASK-page
+# ranges and extracted across EXTRACT_PROCESSES worker processes (1 = never)
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# ----------------- IMAGES -----------------
+# Images are OCR'd locally (Tesseract, OCR_PROCESSES worker processes) at OCR_MIN_SIDE to
+# OCR_MAX_SIDE pixels on the long side. The OCR text is the answer when the mean word
+# confidence and the word count reach OCR_MIN_CONFIDENCE and OCR_MIN_WORDS; otherwise GPT-4o
+# vision gets the image downscaled to VISION_MAX_SIDE.
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", str(min(2, os.cpu_count() or 1))))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2500"))
+OCR_MIN_SIDE = int(os.getenv("OCR_MIN_SIDE", "1000"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))
+OCR_MIN_WORDS = int(os.getenv("OCR_MIN_WORDS", "30"))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "30"))
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1536"))
+
+# ----------------- EXTRACTION CACHE -----------------
+# Extracted text and vision output by Slack file id and content hash: an in-process LRU of
+# up to EXTRACT_CACHE_MB of text, backed by Supabase image_contexts for texts up to
+# EXTRACT_CACHE_REMOTE_MAX_CHARS characters
+EXTRACT_CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "true").lower() == "true"
+EXTRACT_CACHE_BYTES = int(float(os.getenv("EXTRACT_CACHE_MB", "256")) * 1024 * 1024)
+EXTRACT_CACHE_REMOTE_MAX_CHARS = int(os.getenv("EXTRACT_CACHE_REMOTE_MAX_CHARS", "1000000"))
+
+# ----------------- DOCUMENT QA -----------------
+# Extracted text above this many tokens is answered map-reduce style (process_response.py)
+# instead of in one request: gpt-4o-mini's 128k context minus history, RAG context and answer
+DOC_QA_TRIGGER_TOKENS = int(os.getenv("DOC_QA_TRIGGER_TOKENS", "100000"))
+DOC_QA_CHUNK_TOKENS = int(os.getenv("DOC_QA_CHUNK_TOKENS", "6000"))
+# Partial answers merged per reduce request
+DOC_QA_REDUCE_TOKENS = int(os.getenv("DOC_QA_REDUCE_TOKENS", "12000"))
+# Chat requests in flight for document QA (whole process), and retries after a 429
+DOC_QA_CONCURRENCY = int(os.getenv("DOC_QA_CONCURRENCY", "8"))
+DOC_QA_MAX_RETRIES = int(os.getenv("DOC_QA_MAX_RETRIES", "4"))
+
+# ----------------- RETRIEVAL -----------------
+# RAG_FETCH_K nearest chunks are scored by cosine similarity with the query; those under
+# RAG_MIN_SCORE are dropped, up to RAG_TOP_K of the rest are picked by maximal marginal
+# relevance (RAG_MMR_LAMBDA: 1 = by score only, lower = more diverse) and injected up to
+# RAG_CONTEXT_TOKENS tokens. RAG_LOG_SCORES prints scores and injected tokens per query.
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "10"))
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", "30"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.75"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+RAG_LOG_SCORES = os.getenv("RAG_LOG_SCORES", "true").lower() == "true"
+
+# ----------------- HYBRID SEARCH -----------------
+# A BM25 inverted index is kept next to the FAISS index; dense and lexical candidates are
+# merged by reciprocal-rank fusion (RRF_K), and chunks holding every identifier of the query
+# (invoice / contract numbers) count as relevant whatever their vector score. Queries of up
+# to LEXICAL_FAST_PATH_MAX_WORDS words with an identifier found verbatim skip the embedding.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "true").lower() == "true"
+LEXICAL_FAST_PATH_MAX_WORDS = int(os.getenv("LEXICAL_FAST_PATH_MAX_WORDS", "12"))
+
+# ----------------- QUERY ROUTER -----------------
+# Messages are routed locally (general / document / image / mixed) to decide whether the
+# vector store is searched; a model trained by benchmarks/bench_router.py is loaded from
+# ROUTER_MODEL_PATH when present, else built-in examples are used
+QUERY_ROUTING = os.getenv("QUERY_ROUTING", "true").lower() == "true"
+ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", "router/centroids.npz")
+# Text-only messages skip retrieval only when "general" leads the next label by this much
+# (cosine); with the built-in examples that is greetings and thanks, not factual questions
+ROUTER_GENERAL_MARGIN = float(os.getenv("ROUTER_GENERAL_MARGIN", "0.5"))
+
+# ----------------- ANSWER CACHE -----------------
+# Answers reused for questions without files whose embedding is this similar (cosine) to
+# an earlier one with the same retrieved chunks and prompt version, in the same workspace
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+
+# ----------------- EMBEDDING CACHE -----------------
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embedding_cache/embeddings.sqlite3")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+# In-process LRU of user query embeddings, keyed on normalized query text (0 = off)
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "10000"))
+
+# ----------------- INDEX PERSISTENCE -----------------
+# fsync every WAL append (durable across power loss, slower on some disks)
+WAL_FSYNC = os.getenv("WAL_FSYNC", "true").lower() == "true"
+# Compact the WAL into a new base snapshot once it exceeds
+# max(WAL_COMPACT_MIN_MB, WAL_COMPACT_RATIO * snapshot size)
+WAL_COMPACT_MIN_MB = float(os.getenv("WAL_COMPACT_MIN_MB", "16"))
+WAL_COMPACT_RATIO = float(os.getenv("WAL_COMPACT_RATIO", "0.5"))
+# How often (seconds) the background compactor re-checks the WAL size
+WAL_COMPACT_INTERVAL = float(os.getenv("WAL_COMPACT_INTERVAL", "60"))
+
+# ----------------- ANN INDEX -----------------
+# flat | ivf_flat | hnsw | ivf_pq, or "auto": flat until ANN_PROMOTE_THRESHOLD chunks, then ANN_INDEX_TYPE
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "ivf_flat")
+ANN_PROMOTE_THRESHOLD = int(os.getenv("ANN_PROMOTE_THRESHOLD", "50000"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = 4 * sqrt(chunk count)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+PQ_M = int(os.getenv("PQ_M", "64"))  # sub-quantizers; 1536-dim vectors -> 24 dims each
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+
+# ----------------- NAMESPACES -----------------
+# Scoped searches over at most this many chunks scan the namespace's own vectors exactly
+NAMESPACE_BRUTE_FORCE_MAX = int(os.getenv("NAMESPACE_BRUTE_FORCE_MAX", "20000"))
+# HNSW cannot remove vectors: rebuild once this fraction of the index is deleted chunks
+TOMBSTONE_REBUILD_RATIO = float(os.getenv("TOMBSTONE_REBUILD_RATIO", "0.1"))
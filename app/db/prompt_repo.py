@@ -1,47 +1,131 @@
-import os
-import requests
-from dotenv import load_dotenv
+import time
+import hashlib
+import threading
 from datetime import datetime
+from typing import NamedTuple
 
-load_dotenv()
+from app.config import PROMPT_CACHE_TTL
+from app.db.rest_client import supabase
+from app.utils import metrics
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
 
-HEADERS = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
 
+class SystemPrompt(NamedTuple):
+    text: str
+    version: str  # short content hash, stamped into saved interactions
+
+
+def prompt_version(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+# ----------------- PROMPT CACHE -----------------
+# The prompt only changes through /update, so it is served from memory for PROMPT_CACHE_TTL
+# seconds; a successful update replaces the cached copy in this process right away.
+_cache_lock = threading.Lock()
+_cached = None  # (SystemPrompt, fetched_at)
+
+
+def _cache_get(allow_stale: bool = False):
+    cached = _cached
+    if cached is not None and (allow_stale or time.monotonic() - cached[1] < PROMPT_CACHE_TTL):
+        return cached[0]
+    return None
 
-def get_system_prompt():
-    """Fetch the latest system prompt"""
-    url = f"{SUPABASE_URL}/rest/v1/system_prompt?select=prompt,updated_by,updated_at&order=updated_at.desc&limit=1"
-    response = requests.get(url, headers=HEADERS)
 
+def _cache_put(prompt: SystemPrompt):
+    global _cached
+    _cached = (prompt, time.monotonic())
+
+
+def _get_system_prompt_request() -> dict:
+    return {
+        "method": "GET",
+        "path": "/rest/v1/system_prompt",
+        "params": {"select": "prompt,updated_by,updated_at", "order": "updated_at.desc", "limit": "1"},
+    }
+
+
+def _get_system_prompt_result(response) -> SystemPrompt:
     if response.status_code == 200 and response.json():
         prompt_data = response.json()[0]
-        return prompt_data["prompt"]
+        prompt = SystemPrompt(prompt_data["prompt"], prompt_version(prompt_data["prompt"]))
+        _cache_put(prompt)
+        return prompt
+    elif response.status_code == 200:
+        # No prompt saved yet: the default is cached like a fetched one until /update sets one
+        prompt = SystemPrompt(DEFAULT_SYSTEM_PROMPT, "default")
+        _cache_put(prompt)
+        return prompt
     else:
         print("❌ Failed to fetch system prompt:", response.text)
-        return "You are a helpful assistant."  # fallback default
+        # Keep serving the last known prompt; it is refetched on the next call
+        return _cache_get(allow_stale=True) or SystemPrompt(DEFAULT_SYSTEM_PROMPT, "default")
 
 
-def update_system_prompt(new_prompt: str, updated_by: str):
-    """Update the system prompt"""
-    url = f"{SUPABASE_URL}/rest/v1/system_prompt"
-    payload = {
-        "prompt": new_prompt,
-        "updated_by": updated_by,
-        "updated_at": datetime.utcnow().isoformat()
+def get_system_prompt_record() -> SystemPrompt:
+    """Latest system prompt and its version, from the cache when fresh."""
+    prompt = _cache_get()
+    if prompt is not None:
+        metrics.incr("prompt_cache.hits")
+        return prompt
+    with _cache_lock:  # one fetch when the entry expires under load
+        prompt = _cache_get()
+        if prompt is not None:
+            metrics.incr("prompt_cache.hits")
+            return prompt
+        metrics.incr("prompt_cache.misses")
+        return _get_system_prompt_result(supabase.request(_get_system_prompt_request()))
+
+
+async def get_system_prompt_record_async() -> SystemPrompt:
+    prompt = _cache_get()
+    if prompt is not None:
+        metrics.incr("prompt_cache.hits")
+        return prompt
+    metrics.incr("prompt_cache.misses")
+    return _get_system_prompt_result(await supabase.request_async(_get_system_prompt_request()))
+
+
+def get_system_prompt():
+    """Fetch the latest system prompt"""
+    return get_system_prompt_record().text
+
+
+async def get_system_prompt_async():
+    return (await get_system_prompt_record_async()).text
+
+
+def _update_system_prompt_request(new_prompt: str, updated_by: str) -> dict:
+    return {
+        "method": "POST",
+        "path": "/rest/v1/system_prompt",
+        "json": {
+            "prompt": new_prompt,
+            "updated_by": updated_by,
+            "updated_at": datetime.utcnow().isoformat()
+        },
     }
 
-    response = requests.post(url, json=payload, headers=HEADERS)
 
+def _update_system_prompt_result(response, new_prompt: str) -> bool:
     if response.status_code in [200, 201]:
         print("✅ System prompt updated.")
+        _cache_put(SystemPrompt(new_prompt, prompt_version(new_prompt)))
+        metrics.incr("prompt_cache.updates")
         return True
     else:
         print("❌ Failed to update prompt:", response.status_code, response.text)
         return False
+
+
+def update_system_prompt(new_prompt: str, updated_by: str):
+    """Update the system prompt"""
+    response = supabase.request(_update_system_prompt_request(new_prompt, updated_by))
+    return _update_system_prompt_result(response, new_prompt)
+
+
+async def update_system_prompt_async(new_prompt: str, updated_by: str):
+    response = await supabase.request_async(_update_system_prompt_request(new_prompt, updated_by))
+    return _update_system_prompt_result(response, new_prompt)
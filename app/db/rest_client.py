@@ -0,0 +1,133 @@
+# app/db/rest_client.py
+#
+# Shared Supabase REST client. Blocking calls go through one keep-alive requests.Session
+# (pooled connections, urllib3 retries with backoff); `_async` calls go through the pooled
+# httpx client with the same retry policy. Every call is timed into the metrics registry.
+
+import asyncio
+import os
+import time
+import requests
+import httpx
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import (
+    SUPABASE_POOL_SIZE,
+    SUPABASE_CONNECT_TIMEOUT,
+    SUPABASE_READ_TIMEOUT,
+    SUPABASE_RETRIES,
+    SUPABASE_BACKOFF,
+)
+from app.utils import metrics
+from app.utils.http import get_async_client
+
+load_dotenv()
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST is left out: a retried insert after a lost response would duplicate the row
+RETRY_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class SupabaseClient:
+    """
+    Requests are described as dicts: method, path (e.g. "/rest/v1/interactions"), and
+    optionally params, json and extra headers. The API key headers are added here.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        pool_size: int = SUPABASE_POOL_SIZE,
+        connect_timeout: float = SUPABASE_CONNECT_TIMEOUT,
+        read_timeout: float = SUPABASE_READ_TIMEOUT,
+        retries: int = SUPABASE_RETRIES,
+        backoff: float = SUPABASE_BACKOFF,
+    ):
+        self.url = (url or "").rstrip("/")
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        }
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=RETRY_METHODS,
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _prepare(self, spec: dict) -> tuple[str, dict]:
+        spec = dict(spec)
+        path = spec.pop("path")
+        spec["url"] = f"{self.url}{path}"
+        spec["headers"] = {**self.headers, **spec.get("headers", {})}
+        return f"supabase.{path.rsplit('/', 1)[-1]}.{spec['method'].lower()}", spec
+
+    def request(self, spec: dict) -> requests.Response:
+        name, spec = self._prepare(spec)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(timeout=self.timeout, **spec)
+        except requests.RequestException:
+            metrics.incr("supabase.errors")
+            raise
+        finally:
+            metrics.observe(name, (time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            metrics.incr("supabase.errors")
+        return response
+
+    async def request_async(self, spec: dict) -> httpx.Response:
+        name, spec = self._prepare(spec)
+        timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+        retryable = spec["method"].upper() in RETRY_METHODS
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                if attempt:
+                    metrics.incr("supabase.retries")
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                try:
+                    response = await get_async_client().request(timeout=timeout, **spec)
+                except httpx.ConnectError:
+                    # Nothing was sent, so any method may be retried
+                    if last:
+                        raise
+                    continue
+                except httpx.TransportError:
+                    if last or not retryable:
+                        raise
+                    continue
+                if response.status_code in RETRY_STATUSES and retryable and not last:
+                    continue
+                break
+        except httpx.HTTPError:
+            metrics.incr("supabase.errors")
+            raise
+        finally:
+            metrics.observe(name, (time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            metrics.incr("supabase.errors")
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+supabase = SupabaseClient(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
@@ -1,16 +1,16 @@
 # app/db/supabase_client.py
+#
+# Every operation is a request builder (method, path, params, json, headers) plus a result
+# handler, shared by the blocking functions and their `_async` twins. Both go through the
+# pooled client in rest_client.py; both response types expose status_code/text/json().
 
 import json
-import os
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.db.rest_client import supabase
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-def save_interaction(
+# ----------------- INTERACTIONS -----------------
+def _save_interaction_request(
     slack_user_id: str,
     slack_user_name: str,
     organization: str,
@@ -20,7 +20,7 @@ def save_interaction(
     prompt_version: str = "GPT-3.5",  # Default version for prompt
     feedback: str = None, # Optional; e.g., 👍, 👎, ❌
     slack_ts: str = None
-):
+) -> dict:
     data = {
         "slack_user_id": slack_user_id,
         "slack_user_name": slack_user_name,
@@ -32,57 +32,71 @@ def save_interaction(
         "feedback": feedback,
         "slack_ts": slack_ts
     }
-
-    url = f"{SUPABASE_URL}/rest/v1/interactions"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=representation"
+    return {
+        "method": "POST",
+        "path": "/rest/v1/interactions",
+        "json": data,
+        "headers": {"Prefer": "return=representation"},
     }
 
-    response = requests.post(url, json=data, headers=headers)
 
+def _save_interaction_result(response):
     if response.status_code == 201:
         print("✅ Interaction saved to Supabase.")
+        rows = response.json()
+        return rows[0] if rows else None
     else:
         print("❌ Failed to save interaction:", response.status_code)
         print(response.text)
+        return None
 
 
-def update_feedback(message_ts, feedback):
-    url = f"{SUPABASE_URL}/rest/v1/interactions"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+def save_interaction(*args, **kwargs):
+    """Insert one interaction row; arguments as in _save_interaction_request. Returns the saved row or None."""
+    return _save_interaction_result(supabase.request(_save_interaction_request(*args, **kwargs)))
 
-    params = {"slack_ts": f"eq.{message_ts}"}
-    data = {"feedback": feedback}
 
-    response = requests.patch(url, params=params, json=data, headers=headers)
+async def save_interaction_async(*args, **kwargs):
+    return _save_interaction_result(await supabase.request_async(_save_interaction_request(*args, **kwargs)))
+
+
+def _update_feedback_request(message_ts, feedback) -> dict:
+    return {
+        "method": "PATCH",
+        "path": "/rest/v1/interactions",
+        "params": {"slack_ts": f"eq.{message_ts}"},
+        "json": {"feedback": feedback},
+    }
+
 
+def _update_feedback_result(response):
     if response.status_code == 204:
         print("✅ Feedback updated.")
     else:
         print("❌ Failed to update feedback:", response.status_code, response.text)
 
 
-def get_user_interactions(slack_user_id: str, limit: int = 50):
-    url = f"{SUPABASE_URL}/rest/v1/interactions"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}"
-    }
+def update_feedback(message_ts, feedback):
+    return _update_feedback_result(supabase.request(_update_feedback_request(message_ts, feedback)))
+
 
-    params = {
-        "slack_user_id": f"eq.{slack_user_id}",
-        "order": "created_at.desc",
-        "limit": str(limit)
+async def update_feedback_async(message_ts, feedback):
+    return _update_feedback_result(await supabase.request_async(_update_feedback_request(message_ts, feedback)))
+
+
+def _get_user_interactions_request(slack_user_id: str, limit: int = 50) -> dict:
+    return {
+        "method": "GET",
+        "path": "/rest/v1/interactions",
+        "params": {
+            "slack_user_id": f"eq.{slack_user_id}",
+            "order": "created_at.desc",
+            "limit": str(limit)
+        },
     }
 
-    response = requests.get(url, headers=headers, params=params)
+
+def _get_user_interactions_result(response):
     if response.status_code == 200:
         return response.json()  # List of previous messages
     else:
@@ -90,19 +104,40 @@ def get_user_interactions(slack_user_id: str, limit: int = 50):
         return []
 
 
-# app/db/supabase_client.py
+def get_user_interactions(slack_user_id: str, limit: int = 50):
+    return _get_user_interactions_result(supabase.request(_get_user_interactions_request(slack_user_id, limit)))
 
-def clear_user_interactions(slack_user_id: str):
-    url = f"{SUPABASE_URL}/rest/v1/interactions"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
+
+async def get_user_interactions_async(slack_user_id: str, limit: int = 50):
+    return _get_user_interactions_result(await supabase.request_async(_get_user_interactions_request(slack_user_id, limit)))
+
+
+def _get_recent_interactions_request(limit: int) -> dict:
+    return {
+        "method": "GET",
+        "path": "/rest/v1/interactions",
+        "params": {
+            "select": "message_text,extracted_text",
+            "order": "created_at.desc",
+            "limit": str(limit)
+        },
     }
-    params = {"slack_user_id": f"eq.{slack_user_id}"}
 
-    response = requests.delete(url, headers=headers, params=params)
 
+def get_recent_interactions(limit: int = 1000):
+    """Latest interactions of all users (training data for the query router)."""
+    return _get_user_interactions_result(supabase.request(_get_recent_interactions_request(limit)))
+
+
+def _clear_user_interactions_request(slack_user_id: str) -> dict:
+    return {
+        "method": "DELETE",
+        "path": "/rest/v1/interactions",
+        "params": {"slack_user_id": f"eq.{slack_user_id}"},
+    }
+
+
+def _clear_user_interactions_result(response, slack_user_id: str):
     if response.status_code == 204:
         print(f"✅ Cleared history for user: {slack_user_id}")
         return True
@@ -111,18 +146,24 @@ def clear_user_interactions(slack_user_id: str):
         return False
 
 
-# app/db/supabase_client.py
+def clear_user_interactions(slack_user_id: str):
+    response = supabase.request(_clear_user_interactions_request(slack_user_id))
+    return _clear_user_interactions_result(response, slack_user_id)
 
-def clear_all_interactions():
-    url = f"{SUPABASE_URL}/rest/v1/interactions"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
+
+async def clear_user_interactions_async(slack_user_id: str):
+    response = await supabase.request_async(_clear_user_interactions_request(slack_user_id))
+    return _clear_user_interactions_result(response, slack_user_id)
+
+
+def _clear_all_interactions_request() -> dict:
+    return {
+        "method": "DELETE",
+        "path": "/rest/v1/interactions",
     }
 
-    response = requests.delete(url, headers=headers)
 
+def _clear_all_interactions_result(response):
     if response.status_code == 204:
         print("✅ All interactions cleared.")
         return True
@@ -131,51 +172,73 @@ def clear_all_interactions():
         return False
 
 
-def save_image_context(conversation_id: str, image_id: str, extracted_data: dict):
-    """
-    Save extracted image data (OCR + description + purpose) to Supabase.
-    """
-    url = f"{SUPABASE_URL}/rest/v1/image_contexts"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+def clear_all_interactions():
+    return _clear_all_interactions_result(supabase.request(_clear_all_interactions_request()))
 
-    data = {
-        "conversation_id": conversation_id,
-        "image_id": image_id,
-        "extracted_data": json.dumps(extracted_data)  # stored as JSON in Supabase
+
+async def clear_all_interactions_async():
+    return _clear_all_interactions_result(await supabase.request_async(_clear_all_interactions_request()))
+
+
+# ----------------- IMAGE CONTEXTS -----------------
+def _save_image_context_request(conversation_id: str, image_id: str, extracted_data: dict) -> dict:
+    return {
+        "method": "POST",
+        "path": "/rest/v1/image_contexts",
+        "json": {
+            "conversation_id": conversation_id,
+            "image_id": image_id,
+            "extracted_data": json.dumps(extracted_data)  # stored as JSON in Supabase
+        },
     }
 
-    response = requests.post(url, json=data, headers=headers)
 
+def _save_image_context_result(response):
     if response.status_code == 201:
         print("✅ Image context saved to Supabase.")
         return response.json()
     else:
         print("❌ Failed to save image context:", response.status_code, response.text)
         return None
-    
 
-def get_image_context(conversation_id: str, image_id: str = None):
+
+def save_image_context(conversation_id: str, image_id: str, extracted_data: dict):
     """
-    Fetch previously saved image context for a conversation (and optionally a specific image).
+    Save extracted image data (OCR + description + purpose) to Supabase.
     """
-    url = f"{SUPABASE_URL}/rest/v1/image_contexts"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+    return _save_image_context_result(supabase.request(_save_image_context_request(conversation_id, image_id, extracted_data)))
+
+
+async def save_image_context_async(conversation_id: str, image_id: str, extracted_data: dict):
+    request = _save_image_context_request(conversation_id, image_id, extracted_data)
+    return _save_image_context_result(await supabase.request_async(request))
+
 
+def _get_image_context_request(conversation_id: str, image_id: str = None) -> dict:
     params = {"conversation_id": f"eq.{conversation_id}"}
     if image_id:
         params["image_id"] = f"eq.{image_id}"
+    return {
+        "method": "GET",
+        "path": "/rest/v1/image_contexts",
+        "params": params,
+    }
+
 
-    resp = requests.get(url, headers=headers, params=params)
+def _get_image_context_result(resp):
     if resp.status_code == 200:
         return resp.json()
     else:
         print("❌ Failed to fetch image context:", resp.status_code, resp.text)
-        return []    
\ No newline at end of file
+        return []
+
+
+def get_image_context(conversation_id: str, image_id: str = None):
+    """
+    Fetch previously saved image context for a conversation (and optionally a specific image).
+    """
+    return _get_image_context_result(supabase.request(_get_image_context_request(conversation_id, image_id)))
+
+
+async def get_image_context_async(conversation_id: str, image_id: str = None):
+    return _get_image_context_result(await supabase.request_async(_get_image_context_request(conversation_id, image_id)))
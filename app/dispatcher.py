@@ -0,0 +1,150 @@
+# app/dispatcher.py
+
+import time
+import threading
+from collections import deque
+
+from app.config import (
+    DISPATCH_MAX_WORKERS,
+    DISPATCH_MAX_PENDING,
+    DISPATCH_SUBMIT_TIMEOUT,
+)
+from app.utils import metrics
+
+
+class JobDispatcher:
+    """
+    Bounded worker pool for Slack message handling.
+    Jobs with the same key (a Slack user) run one at a time in submission order; different
+    keys run concurrently, taking turns so one busy user cannot starve the others.
+    When `max_pending` jobs are already waiting, submit() blocks for up to
+    `submit_timeout` seconds and then rejects the job (backpressure).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DISPATCH_MAX_WORKERS,
+        max_pending: int = DISPATCH_MAX_PENDING,
+        submit_timeout: float = DISPATCH_SUBMIT_TIMEOUT,
+        name: str = "dispatch",
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self.name = name
+
+        self._jobs = {}  # key -> deque of (fn, args, kwargs, submitted_at)
+        self._ready = deque()  # keys with queued jobs and no job running
+        self._pending = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._workers = []
+        self._stopping = False
+
+    # ----------------- PUBLIC API -----------------
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            self._stopping = False
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._work_loop, name=f"{self.name}-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self):
+        """Finish every queued job, then shut the workers down."""
+        with self._lock:
+            self._stopping = True
+            self._work.notify_all()
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.join()
+
+    def submit(self, key, fn, *args, **kwargs) -> bool:
+        """
+        Queue fn(*args, **kwargs) behind earlier jobs with the same key.
+        Returns False when the queue stayed full for `submit_timeout` seconds.
+        """
+        self.start()
+        with self._lock:
+            deadline = time.monotonic() + self.submit_timeout
+            while self._pending >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.incr(f"{self.name}.rejected")
+                    return False
+                self._space.wait(remaining)
+
+            jobs = self._jobs.get(key)
+            if jobs is None:
+                jobs = self._jobs[key] = deque()
+                self._ready.append(key)
+            jobs.append((fn, args, kwargs, time.perf_counter()))
+            self._pending += 1
+            self._publish_gauges()
+            self._work.notify()
+        metrics.incr(f"{self.name}.submitted")
+        return True
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until no job is queued or running (used by scripts and benchmarks)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending or self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "active": self._active, "keys": len(self._jobs)}
+
+    # ----------------- INTERNALS -----------------
+    def _publish_gauges(self):
+        metrics.gauge(f"{self.name}.queue_depth", self._pending)
+        metrics.gauge(f"{self.name}.active", self._active)
+
+    def _work_loop(self):
+        while True:
+            with self._lock:
+                while not self._ready and not self._stopping:
+                    self._work.wait()
+                if not self._ready:
+                    return  # stopping and drained
+                key = self._ready.popleft()
+                fn, args, kwargs, submitted_at = self._jobs[key].popleft()
+                self._pending -= 1
+                self._active += 1
+                self._publish_gauges()
+                self._space.notify()
+
+            start = time.perf_counter()
+            metrics.observe(f"{self.name}.wait", (start - submitted_at) * 1000)
+            try:
+                fn(*args, **kwargs)
+                metrics.incr(f"{self.name}.completed")
+            except Exception as e:
+                print(f"❌ Dispatched job for {key} failed: {e}")
+                metrics.incr(f"{self.name}.failed")
+            metrics.observe(f"{self.name}.run", (time.perf_counter() - start) * 1000)
+
+            with self._lock:
+                self._active -= 1
+                if self._jobs[key]:
+                    self._ready.append(key)  # next job of this key, behind the other keys
+                    self._work.notify()
+                else:
+                    del self._jobs[key]
+                self._publish_gauges()
+                if not self._pending and not self._active:
+                    self._idle.notify_all()
+
+
+# Global dispatcher for incoming Slack messages
+message_dispatcher = JobDispatcher()
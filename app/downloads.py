@@ -0,0 +1,206 @@
+# app/downloads.py
+#
+# Slack file downloads: streamed in blocks, kept in memory up to DOWNLOAD_SPOOL_MB and
+# spooled to a temp file beyond that, rejected early from Slack's declared `size` (and
+# again while streaming) past DOWNLOAD_MAX_MB. The files of one message are fetched
+# concurrently over a pooled keep-alive session (or the pooled httpx client when async).
+
+import io
+import os
+import time
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import (
+    DOWNLOAD_MAX_BYTES,
+    DOWNLOAD_SPOOL_BYTES,
+    DOWNLOAD_CONCURRENCY,
+    DOWNLOAD_CONNECT_TIMEOUT,
+    DOWNLOAD_READ_TIMEOUT,
+)
+from app.utils import metrics
+from app.utils.http import get_async_client
+
+BLOCK_BYTES = 64 * 1024
+
+
+class DownloadError(RuntimeError):
+    """Slack answered with something other than 200."""
+
+
+class FileTooLargeError(ValueError):
+    """Declared or streamed size is over DOWNLOAD_MAX_BYTES."""
+
+
+class DownloadedFile:
+    """
+    A downloaded file, in memory (`data`) or spooled to disk (`path`). `source` is what the
+    extractors accept (bytes or path); `sha256` is the content hash, computed while
+    streaming. close() removes the spool file.
+    """
+
+    def __init__(self, name: str = None):
+        self.name = name
+        self.size = 0
+        self.data = None
+        self.path = None
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._file = None
+
+    def write(self, block: bytes):
+        self.size += len(block)
+        if self.size > DOWNLOAD_MAX_BYTES:
+            raise FileTooLargeError(f"{self.name} is over {DOWNLOAD_MAX_BYTES} bytes")
+        if self._file is None and self.size > DOWNLOAD_SPOOL_BYTES:
+            self._file = tempfile.NamedTemporaryFile(prefix="slack-", delete=False)
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+            metrics.incr("download.spooled")
+        (self._file or self._buffer).write(block)
+        self._hash.update(block)
+
+    def finish(self) -> "DownloadedFile":
+        if self._file is not None:
+            self._file.close()
+            self.path = self._file.name
+        else:
+            self.data = self._buffer.getvalue()
+        self.sha256 = self._hash.hexdigest()
+        self._buffer = self._file = None
+        return self
+
+    @property
+    def source(self):
+        return self.path or self.data
+
+    def read(self) -> bytes:
+        if self.path is None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self.path = self._file.name
+            self._file = None
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=DOWNLOAD_CONCURRENCY,
+        pool_maxsize=DOWNLOAD_CONCURRENCY,
+        max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = _session()
+_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY, thread_name_prefix="download")
+
+
+def _headers() -> dict:
+    return {"Authorization": f"Bearer {os.getenv('SLACK_BOT_TOKEN')}"}
+
+
+def _check_declared(f: dict, declared=None):
+    """Reject from Slack's `size` field (or the response's Content-Length) before reading the body."""
+    declared = int(declared or f.get("size") or 0)
+    if declared > DOWNLOAD_MAX_BYTES:
+        raise FileTooLargeError(f"{f.get('name')} is {declared} bytes (limit {DOWNLOAD_MAX_BYTES})")
+
+
+def _done(download: DownloadedFile, start: float):
+    metrics.observe("download.latency", (time.perf_counter() - start) * 1000)
+    metrics.incr("download.files")
+    metrics.incr("download.bytes", download.size)
+
+
+# ----------------- PUBLIC API -----------------
+def download(f: dict) -> DownloadedFile:
+    """Stream one Slack file (a files[] entry of the message event)."""
+    start = time.perf_counter()
+    download = DownloadedFile(f.get("name"))
+    try:
+        _check_declared(f)
+        with session.get(
+            f.get("url_private_download"),
+            headers=_headers(),
+            stream=True,
+            timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT),
+        ) as resp:
+            if resp.status_code != 200:
+                raise DownloadError(f"{f.get('name')}: status {resp.status_code}")
+            _check_declared(f, resp.headers.get("content-length"))
+            for block in resp.iter_content(BLOCK_BYTES):
+                download.write(block)
+        _done(download.finish(), start)
+        return download
+    except Exception as e:
+        download.close()
+        metrics.incr("download.rejected" if isinstance(e, FileTooLargeError) else "download.failed")
+        raise
+
+
+def download_all(files: list[dict]) -> list:
+    """
+    Download the files concurrently; one DownloadedFile or the exception it raised per
+    file, in order. Close the downloads when done with them.
+    """
+    futures = [_pool.submit(download, f) for f in files]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+async def download_async(f: dict) -> DownloadedFile:
+    start = time.perf_counter()
+    download = DownloadedFile(f.get("name"))
+    try:
+        _check_declared(f)
+        async with get_async_client().stream(
+            "GET", f.get("url_private_download"), headers=_headers(), timeout=DOWNLOAD_READ_TIMEOUT
+        ) as resp:
+            if resp.status_code != 200:
+                raise DownloadError(f"{f.get('name')}: status {resp.status_code}")
+            _check_declared(f, resp.headers.get("content-length"))
+            async for block in resp.aiter_bytes(BLOCK_BYTES):
+                download.write(block)
+        _done(download.finish(), start)
+        return download
+    except Exception as e:
+        download.close()
+        metrics.incr("download.rejected" if isinstance(e, FileTooLargeError) else "download.failed")
+        raise
+
+
+def close():
+    _pool.shutdown(wait=False, cancel_futures=True)
+    session.close()
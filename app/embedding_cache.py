@@ -0,0 +1,167 @@
+# app/embedding_cache.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.utils import metrics
+
+
+def text_hash(text: str, model: str = "") -> str:
+    """Content address of a chunk: sha256 over model name + chunk text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk (SQLite) vector cache keyed by text_hash, evicting least recently used
+    entries once the stored vectors exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            for start in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+                part = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()]
+        with self._lock:
+            existing = 0  # bytes of entries about to be overwritten
+            for start in range(0, len(rows), 500):
+                part = [r[0] for r in rows[start:start + 500]]
+                existing += self._db.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchone()[0]
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._bytes += sum(len(r[1]) for r in rows) - existing
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            victims = self._db.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not victims:
+                self._bytes = 0
+                return
+            self._db.executemany("DELETE FROM embeddings WHERE key = ?", [(k,) for k, _ in victims])
+            self._bytes -= sum(size for _, size in victims)
+            metrics.incr("embed_cache.evictions", len(victims))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends cache misses to the underlying backend.
+    Hit/miss counters are published as embed_cache.* metrics.
+    """
+
+    def __init__(self, backend: Embeddings, cache: EmbeddingCache):
+        self.backend = backend
+        self.cache = cache
+        self.model = getattr(backend, "model", type(backend).__name__)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [text_hash(t, self.model) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        metrics.incr("embed_cache.hits", len(texts) - sum(1 for k in keys if k in missing))
+        metrics.incr("embed_cache.misses", len(missing))
+
+        if missing:
+            vectors = self.backend.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+            metrics.incr("embed_cache.embedded_chars", sum(len(t) for t in missing.values()))
+
+        saved = sum(len(t) for k, t in zip(keys, texts) if k not in missing)
+        metrics.incr("embed_cache.saved_chars", saved)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.backend.embed_query(text)
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU of query embeddings (vector_store_utils.embed_query), so repeated
+    questions and follow-ups worded the same skip the embedding request. Published as
+    query_embed_cache.* metrics.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+        metrics.incr("query_embed_cache.hits" if vector is not None else "query_embed_cache.misses")
+        return vector
+
+    def put(self, key: str, vector: list[float]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+    def __len__(self):
+        return len(self._vectors)
@@ -0,0 +1,59 @@
+# app/embeddings.py
+
+import time
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain.embeddings.openai import OpenAIEmbeddings
+
+from app.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIM,
+    EMBED_CACHE_ENABLED,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MAX_MB,
+)
+from app.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic local embedder: every text maps to a fixed pseudo-random unit vector.
+    Optional `latency` (seconds per call) simulates a remote API for throughput benchmarks.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.model = f"fake-{dim}"
+
+    def _vector(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        vec /= np.linalg.norm(vec)
+        return vec.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def get_embedding_model(backend: str = EMBEDDING_BACKEND, cache: bool = EMBED_CACHE_ENABLED) -> Embeddings:
+    """
+    Build the configured embedding backend, wrapped in the on-disk embedding cache.
+    """
+    if backend == "openai":
+        model = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    elif backend == "fake":
+        model = FakeEmbeddings()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+    if cache:
+        return CachedEmbeddings(model, EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_MAX_MB * 1024 * 1024))
+    return model
@@ -0,0 +1,168 @@
+# app/extraction.py
+#
+# Document text extraction as generators: text files in decoded blocks, DOCX body
+# elements (paragraphs and tables, in document order), PDF pages. PDFs with many pages are
+# extracted in page ranges across a process pool; pages are still yielded in order as soon
+# as each range is done. Byte, page and character limits bound the work per file.
+
+import io
+import os
+import codecs
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import fitz
+from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from app.config import (
+    EXTRACT_MAX_BYTES,
+    EXTRACT_MAX_PAGES,
+    EXTRACT_MAX_CHARS,
+    EXTRACT_PROCESSES,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_PAGES_PER_TASK,
+)
+from app.utils import metrics
+
+# Text files are decoded and yielded in blocks of this many bytes
+TEXT_BLOCK_BYTES = 1024 * 1024
+
+_pool = None
+
+
+class ExtractionLimitError(ValueError):
+    """The file is larger than EXTRACT_MAX_BYTES."""
+
+
+def _size(source) -> int:
+    return len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+
+
+def _pdf_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs FAISS / HTTP client threads is not safe
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ----------------- FORMATS -----------------
+def _text_sections(source) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else open(source, "rb")
+    with stream:
+        while True:
+            block = stream.read(TEXT_BLOCK_BYTES)
+            if not block:
+                break
+            yield decoder.decode(block)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _table_text(table: Table) -> str:
+    rows = []
+    for row in table.rows:
+        cells, previous = [], None
+        for cell in row.cells:
+            # Merged cells repeat the same cell object across the span
+            if cell._tc is not previous:
+                cells.append(cell.text.strip())
+            previous = cell._tc
+        rows.append(" | ".join(cells))
+    return "\n".join(rows)
+
+
+def _docx_sections(source) -> Iterator[str]:
+    doc = Document(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    for element in doc.element.body.iterchildren():
+        if element.tag.endswith("}p"):
+            yield Paragraph(element, doc).text + "\n"
+        elif element.tag.endswith("}tbl"):
+            yield _table_text(Table(element, doc)) + "\n\n"
+
+
+def _pdf_page_range(path: str, start: int, stop: int) -> list[str]:
+    """Worker: text of pages [start, stop)."""
+    with fitz.open(path) as pdf:
+        return [pdf[i].get_text() for i in range(start, stop)]
+
+
+def _pdf_sections(source) -> Iterator[str]:
+    pdf = fitz.open(stream=source, filetype="pdf") if isinstance(source, (bytes, bytearray)) else fitz.open(source)
+    with pdf:
+        pages = min(pdf.page_count, EXTRACT_MAX_PAGES)
+        if pages < PDF_PARALLEL_MIN_PAGES or EXTRACT_PROCESSES <= 1:
+            for i in range(pages):
+                yield pdf[i].get_text()
+        else:
+            yield from _pdf_parallel(source, pages)
+        if pdf.page_count > pages:
+            metrics.incr("extract.truncated")
+            yield f"\n[Extraction stopped after {pages} of {pdf.page_count} pages]\n"
+
+
+def _pdf_parallel(source, pages: int) -> Iterator[str]:
+    metrics.incr("extract.parallel_pdfs")
+    path, temp = source, None
+    if isinstance(source, (bytes, bytearray)):
+        # Workers open the file themselves instead of receiving a pickled copy each
+        temp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        with temp:
+            temp.write(source)
+        path = temp.name
+    try:
+        starts = range(0, pages, PDF_PAGES_PER_TASK)
+        stops = [min(start + PDF_PAGES_PER_TASK, pages) for start in starts]
+        for texts in _pdf_pool().map(_pdf_page_range, [path] * len(stops), starts, stops):
+            yield from texts
+    finally:
+        if temp is not None:
+            os.unlink(temp.name)
+
+
+_EXTRACTORS = {
+    "text": _text_sections,
+    "docx": _docx_sections,
+    "pdf": _pdf_sections,
+}
+
+
+# ----------------- PUBLIC API -----------------
+def iter_sections(kind: str, source) -> Iterator[str]:
+    """
+    Text of a "text", "docx" or "pdf" file, as it is extracted: decoded blocks, DOCX
+    paragraphs and tables, or PDF pages. `source` is the file's bytes or a path.
+    Raises ExtractionLimitError for files over EXTRACT_MAX_BYTES; output stops with a note
+    after EXTRACT_MAX_PAGES PDF pages or EXTRACT_MAX_CHARS characters.
+    """
+    if kind not in _EXTRACTORS:
+        raise ValueError(f"Not a document type: {kind}")
+    size = _size(source)
+    if size > EXTRACT_MAX_BYTES:
+        metrics.incr("extract.rejected")
+        raise ExtractionLimitError(f"{size} bytes is over the {EXTRACT_MAX_BYTES}-byte extraction limit")
+
+    chars = 0
+    with metrics.timed(f"extract.{kind}"):
+        for section in _EXTRACTORS[kind](source):
+            if chars + len(section) > EXTRACT_MAX_CHARS:
+                metrics.incr("extract.truncated")
+                yield section[:EXTRACT_MAX_CHARS - chars]
+                yield f"\n[Extraction stopped after {EXTRACT_MAX_CHARS} characters]\n"
+                return
+            chars += len(section)
+            yield section
+    metrics.incr("extract.bytes", size)
@@ -0,0 +1,174 @@
+# app/extraction_cache.py
+
+import json
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import EXTRACT_CACHE_ENABLED, EXTRACT_CACHE_BYTES, EXTRACT_CACHE_REMOTE_MAX_CHARS
+from app.db.supabase_client import (
+    save_image_context,
+    get_image_context,
+    get_image_context_async,
+)
+from app.utils import metrics
+
+# image_contexts rows of the cache: image_id "<file id>" -> {"sha256", "size", "kind"},
+# image_id "sha256:<hash>" -> {"kind", "text"}
+CACHE_CONVERSATION_ID = "extraction-cache"
+
+
+def _row_data(rows: list[dict]) -> dict | None:
+    if not rows:
+        return None
+    data = rows[-1].get("extracted_data")
+    return json.loads(data) if isinstance(data, str) else data
+
+
+class ExtractionCache:
+    """
+    Text extracted from Slack files (documents) and vision output (images), so that a file
+    shared again, or referenced in a follow-up, is neither downloaded nor parsed nor sent to
+    the vision model again.
+    get(f) looks a file up by its Slack id before download; get(f, sha256) by content hash
+    after download (the same bytes uploaded as another file). Entries live in an in-process
+    LRU bounded by text size and in Supabase image_contexts, written in the background.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = EXTRACT_CACHE_BYTES,
+        remote_max_chars: int = EXTRACT_CACHE_REMOTE_MAX_CHARS,
+        enabled: bool = EXTRACT_CACHE_ENABLED,
+    ):
+        self.max_bytes = max_bytes
+        self.remote_max_chars = remote_max_chars
+        self.enabled = enabled
+
+        self._texts = OrderedDict()  # sha256 -> (kind, text), least recently used first
+        self._files = {}  # file id -> (sha256, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extract-cache")
+
+    # ----------------- PUBLIC API -----------------
+    def get(self, f: dict, sha256: str = None) -> str | None:
+        """Cached text of a Slack file: by file id, or by content hash when `sha256` is given."""
+        if not self.enabled:
+            return None
+        text = self._local(f, sha256)
+        if text is None:
+            try:
+                text = self._remote(f, sha256)
+            except Exception:
+                traceback.print_exc()
+                metrics.incr("extract_cache.errors")
+        return self._counted(text, sha256)
+
+    async def get_async(self, f: dict, sha256: str = None) -> str | None:
+        if not self.enabled:
+            return None
+        text = self._local(f, sha256)
+        if text is None:
+            try:
+                text = await self._remote_async(f, sha256)
+            except Exception:
+                traceback.print_exc()
+                metrics.incr("extract_cache.errors")
+        return self._counted(text, sha256)
+
+    def put(self, f: dict, sha256: str, kind: str, text: str):
+        """Store a file's extracted text; the Supabase write happens in the background."""
+        if not self.enabled or not isinstance(text, str):
+            return
+        self._put_local(f.get("id"), sha256, f.get("size"), kind, text)
+        self._writer.submit(self._put_remote, f.get("id"), sha256, f.get("size"), kind, text)
+
+    def clear(self):
+        with self._lock:
+            self._texts.clear()
+            self._files.clear()
+            self._bytes = 0
+
+    # ----------------- INTERNALS -----------------
+    def _counted(self, text: str | None, sha256: str = None) -> str | None:
+        # hits / misses: lookups by file id; content_hits: a downloaded file matched by hash
+        if sha256 is None:
+            metrics.incr("extract_cache.hits" if text is not None else "extract_cache.misses")
+        elif text is not None:
+            metrics.incr("extract_cache.content_hits")
+        return text
+
+    def _local(self, f: dict, sha256: str = None) -> str | None:
+        with self._lock:
+            if sha256 is None:
+                sha256, size = self._files.get(f.get("id"), (None, None))
+                if sha256 is None or (f.get("size") and size and f.get("size") != size):
+                    return None
+            entry = self._texts.get(sha256)
+            if entry is None:
+                return None
+            self._texts.move_to_end(sha256)
+            if f.get("id"):
+                self._files[f.get("id")] = (sha256, f.get("size"))
+        metrics.incr("extract_cache.local_hits")
+        return entry[1]
+
+    def _remote(self, f: dict, sha256: str) -> str | None:
+        file_id = f.get("id")
+        if sha256 is None:
+            pointer = _row_data(get_image_context(CACHE_CONVERSATION_ID, file_id)) if file_id else None
+            if not pointer or (f.get("size") and pointer.get("size") and f.get("size") != pointer["size"]):
+                return None
+            sha256 = pointer["sha256"]
+        entry = _row_data(get_image_context(CACHE_CONVERSATION_ID, f"sha256:{sha256}"))
+        if not entry:
+            return None
+        self._put_local(file_id, sha256, f.get("size"), entry.get("kind"), entry["text"])
+        metrics.incr("extract_cache.remote_hits")
+        return entry["text"]
+
+    async def _remote_async(self, f: dict, sha256: str) -> str | None:
+        file_id = f.get("id")
+        if sha256 is None:
+            pointer = _row_data(await get_image_context_async(CACHE_CONVERSATION_ID, file_id)) if file_id else None
+            if not pointer or (f.get("size") and pointer.get("size") and f.get("size") != pointer["size"]):
+                return None
+            sha256 = pointer["sha256"]
+        entry = _row_data(await get_image_context_async(CACHE_CONVERSATION_ID, f"sha256:{sha256}"))
+        if not entry:
+            return None
+        self._put_local(file_id, sha256, f.get("size"), entry.get("kind"), entry["text"])
+        metrics.incr("extract_cache.remote_hits")
+        return entry["text"]
+
+    def _put_local(self, file_id: str, sha256: str, size: int, kind: str, text: str):
+        with self._lock:
+            if file_id:
+                self._files[file_id] = (sha256, size)
+            if sha256 not in self._texts:
+                self._texts[sha256] = (kind, text)
+                self._bytes += len(text)
+            self._texts.move_to_end(sha256)
+            while self._bytes > self.max_bytes and len(self._texts) > 1:
+                _, (_, evicted_text) = self._texts.popitem(last=False)
+                self._bytes -= len(evicted_text)
+            if len(self._files) > 4 * len(self._texts) + 1024:
+                self._files = {k: v for k, v in self._files.items() if v[0] in self._texts}
+            metrics.gauge("extract_cache.bytes", self._bytes)
+
+    def _put_remote(self, file_id: str, sha256: str, size: int, kind: str, text: str):
+        if len(text) > self.remote_max_chars:
+            return
+        try:
+            if not _row_data(get_image_context(CACHE_CONVERSATION_ID, f"sha256:{sha256}")):
+                save_image_context(CACHE_CONVERSATION_ID, f"sha256:{sha256}", {"kind": kind, "text": text})
+            if file_id:
+                save_image_context(CACHE_CONVERSATION_ID, file_id, {"sha256": sha256, "size": size, "kind": kind})
+        except Exception:
+            traceback.print_exc()
+            metrics.incr("extract_cache.errors")
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,193 @@
+# app/history.py
+
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import (
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_TURN_MAX_TOKENS,
+    HISTORY_SUMMARY_TOKENS,
+    HISTORY_FETCH_LIMIT,
+    HISTORY_CACHE_USERS,
+    HISTORY_CACHE_TTL,
+)
+from app.db.supabase_client import get_user_interactions, get_user_interactions_async
+from app.utils import metrics
+from app.utils.tokens import count_tokens, truncate_tokens
+
+
+def format_turn(interaction: dict) -> str:
+    """One interactions row as prompt text; attached document text is capped."""
+    extracted = interaction.get("extracted_text")
+    extracted_part = f"\nExtracted Info: {truncate_tokens(extracted, HISTORY_TURN_MAX_TOKENS)}" if extracted else ""
+    return (
+        f"User: {interaction.get('message_text')}\n"
+        f"Assistant: {interaction.get('response_text')}{extracted_part}\n"
+    )
+
+
+def summarize_turns(summary: str, turns: list[str]) -> str:
+    """Fold older turns into the running summary with the chat model."""
+    from app.openai_utils import client  # openai_utils imports this module
+
+    earlier = f"Summary so far:\n{summary}\n\n" if summary else ""
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": (
+                "You maintain a running summary of a conversation between a user and an assistant. "
+                "Merge the new turns into the summary. Keep names, numbers, decisions, open questions "
+                f"and documents the user referred to. Stay under {HISTORY_SUMMARY_TOKENS} tokens."
+            )},
+            {"role": "user", "content": f"{earlier}New turns:\n{''.join(turns)}"},
+        ],
+        temperature=0,
+        max_tokens=HISTORY_SUMMARY_TOKENS,
+    )
+    return response.choices[0].message.content.strip()
+
+
+class _Conversation:
+    def __init__(self, interactions: list[dict]):
+        self.turns = []  # (text, tokens), oldest first
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarizing = False
+        self.loaded_at = time.monotonic()
+        for interaction in interactions:
+            self.append(interaction)
+
+    def append(self, interaction: dict):
+        text = format_turn(interaction)
+        self.turns.append((text, count_tokens(text)))
+
+
+class ConversationHistory:
+    """
+    Per-user conversation history for prompts.
+    A user's recent interactions are fetched from Supabase once and then kept current by
+    append() after each saved interaction, instead of being refetched for every message.
+    render() packs the newest turns that fit the token budget after the running summary;
+    turns that no longer fit are folded into that summary on a background thread, so the
+    history part of the prompt stays bounded however long the conversation gets.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = HISTORY_TOKEN_BUDGET,
+        fetch_limit: int = HISTORY_FETCH_LIMIT,
+        max_users: int = HISTORY_CACHE_USERS,
+        ttl: float = HISTORY_CACHE_TTL,
+        summarize=summarize_turns,
+    ):
+        self.budget_tokens = budget_tokens
+        self.fetch_limit = fetch_limit
+        self.max_users = max_users
+        self.ttl = ttl
+        self.summarize = summarize
+
+        self._conversations = OrderedDict()  # user id -> _Conversation, least recently used first
+        self._lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+
+    # ----------------- PUBLIC API -----------------
+    def render(self, user_id: str) -> str:
+        """History text for the user's next prompt (fetches it on first use)."""
+        conversation = self._cached(user_id)
+        if conversation is None:
+            metrics.incr("history_cache.misses")
+            rows = get_user_interactions(user_id, limit=self.fetch_limit)
+            conversation = self._store(user_id, rows)
+        return self._render(conversation)
+
+    async def render_async(self, user_id: str) -> str:
+        conversation = self._cached(user_id)
+        if conversation is None:
+            metrics.incr("history_cache.misses")
+            rows = await get_user_interactions_async(user_id, limit=self.fetch_limit)
+            conversation = self._store(user_id, rows)
+        return self._render(conversation)
+
+    def append(self, user_id: str, interaction: dict | None):
+        """
+        Add a saved interaction row (None, from a failed insert, is ignored). Users not
+        cached yet get it with the rest of their history on first use.
+        """
+        if not interaction:
+            return
+        with self._lock:
+            conversation = self._conversations.get(user_id)
+            if conversation is not None:
+                conversation.append(interaction)
+
+    def clear(self, user_id: str = None):
+        """Forget one user's history (after /clear) or everyone's (after /clear_all)."""
+        with self._lock:
+            if user_id is None:
+                self._conversations.clear()
+            else:
+                self._conversations.pop(user_id, None)
+
+    # ----------------- INTERNALS -----------------
+    def _cached(self, user_id: str):
+        with self._lock:
+            conversation = self._conversations.get(user_id)
+            if conversation is None or time.monotonic() - conversation.loaded_at > self.ttl:
+                return None
+            self._conversations.move_to_end(user_id)
+            metrics.incr("history_cache.hits")
+            return conversation
+
+    def _store(self, user_id: str, rows: list[dict]) -> _Conversation:
+        # Supabase returns newest first
+        conversation = _Conversation(list(reversed(rows)))
+        with self._lock:
+            self._conversations[user_id] = conversation
+            self._conversations.move_to_end(user_id)
+            while len(self._conversations) > self.max_users:
+                self._conversations.popitem(last=False)
+        return conversation
+
+    def _render(self, conversation: _Conversation) -> str:
+        with self._lock:
+            remaining = self.budget_tokens - conversation.summary_tokens
+            start = len(conversation.turns)
+            while start > 0 and conversation.turns[start - 1][1] <= remaining:
+                start -= 1
+                remaining -= conversation.turns[start][1]
+            recent = [text for text, _ in conversation.turns[start:]]
+            summary = conversation.summary
+            if start > 0 and not conversation.summarizing:
+                conversation.summarizing = True
+                self._summarizer.submit(self._fold, conversation, start)
+
+        metrics.gauge("history.tokens", self.budget_tokens - remaining)  # last rendered size
+        if summary:
+            return f"Summary of earlier conversation:\n{summary}\n\n" + "".join(recent)
+        return "".join(recent)
+
+    def _fold(self, conversation: _Conversation, count: int):
+        """Summarize the `count` oldest turns and drop them from the conversation."""
+        try:
+            with self._lock:
+                summary = conversation.summary
+                turns = [text for text, _ in conversation.turns[:count]]
+            with metrics.timed("history.summarize"):
+                new_summary = truncate_tokens(self.summarize(summary, turns), HISTORY_SUMMARY_TOKENS)
+            with self._lock:
+                # Turns are only ever appended, so the summarized ones are still the prefix
+                del conversation.turns[:count]
+                conversation.summary = new_summary
+                conversation.summary_tokens = count_tokens(new_summary)
+            metrics.incr("history.summarized_turns", count)
+        except Exception:
+            traceback.print_exc()
+            metrics.incr("history.summary_errors")
+        finally:
+            conversation.summarizing = False
+
+
+conversation_history = ConversationHistory()
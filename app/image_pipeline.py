@@ -0,0 +1,169 @@
+# app/image_pipeline.py
+#
+# Tiered image reading. Images are normalized (EXIF rotation, grayscale, scaled to a size
+# Tesseract reads well) and OCR'd locally in a process pool; text that is confident and
+# plentiful enough is the result. Photos, diagrams and poor scans fall back to the GPT-4o
+# vision model, sent a downscaled JPEG instead of the original upload.
+
+import io
+import time
+import asyncio
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+from app.config import (
+    OCR_ENABLED,
+    OCR_PROCESSES,
+    OCR_MAX_SIDE,
+    OCR_MIN_SIDE,
+    OCR_MIN_CONFIDENCE,
+    OCR_MIN_WORDS,
+    OCR_TIMEOUT,
+    VISION_MAX_SIDE,
+)
+from app.utils import metrics
+
+_pool = None
+
+
+class OcrResult(NamedTuple):
+    text: str
+    confidence: float  # mean word confidence, 0-100
+    words: int
+    vision_image: bytes | None  # downscaled JPEG for the vision model, when OCR fell short
+
+
+def _ocr_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs FAISS / HTTP client threads is not safe
+        _pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ----------------- WORKER -----------------
+def _scaled(image: Image.Image, max_side: int, min_side: int = 0) -> Image.Image:
+    longest = max(image.size)
+    scale = max_side / longest if longest > max_side else (min_side / longest if longest < min_side else 1)
+    if scale == 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _vision_jpeg(image: Image.Image) -> bytes:
+    out = io.BytesIO()
+    _scaled(image.convert("RGB"), VISION_MAX_SIDE).save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+def _ocr_words(image: Image.Image) -> tuple[str, float, int]:
+    """Text (one line per OCR line), mean word confidence and word count."""
+    import pytesseract
+
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    lines, confidences = {}, []
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if confidence < 0 or not word.strip():
+            continue
+        confidences.append(confidence)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+    text = "\n".join(" ".join(words) for words in lines.values())
+    mean = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, mean, len(confidences)
+
+
+def _read_image(img_bytes: bytes, min_confidence: float, min_words: int) -> OcrResult:
+    """Worker: normalize and OCR; also returns the vision image when the text does not pass."""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(img_bytes)))
+    gray = ImageOps.autocontrast(_scaled(image.convert("L"), OCR_MAX_SIDE, OCR_MIN_SIDE))
+    try:
+        text, confidence, words = _ocr_words(gray)
+    except Exception:  # Tesseract missing or failing on this image: vision only
+        traceback.print_exc()
+        text, confidence, words = "", 0.0, 0
+    if confidence >= min_confidence and words >= min_words:
+        return OcrResult(text, confidence, words, None)
+    return OcrResult(text, confidence, words, _vision_jpeg(image))
+
+
+# ----------------- PUBLIC API -----------------
+_counts_lock = threading.Lock()
+_counts = {"local": 0, "vision": 0}
+
+
+def _handled(tier: str):
+    """Count an image as handled locally or by the vision model; keep the local fraction gauge current."""
+    with _counts_lock:
+        _counts[tier] += 1
+        fraction = _counts["local"] / (_counts["local"] + _counts["vision"])
+    metrics.incr(f"image.{tier}")
+    metrics.gauge("image.local_fraction", round(fraction, 3))
+
+
+def _ocr_outcome(result: OcrResult, start: float) -> str | None:
+    metrics.observe("image.ocr", (time.perf_counter() - start) * 1000)
+    if result.vision_image is not None:
+        return None
+    _handled("local")
+    return f"Text in the image (OCR):\n{result.text}"
+
+
+def analyze_image(img_bytes: bytes) -> str:
+    """Text and description of an image: local OCR when it reads well, else the vision model."""
+    from app.openai_utils import analyze_image_with_llm  # kept out of the OCR worker processes
+
+    vision_image = img_bytes
+    if OCR_ENABLED:
+        start = time.perf_counter()
+        try:
+            result = _ocr_pool().submit(_read_image, img_bytes, OCR_MIN_CONFIDENCE, OCR_MIN_WORDS).result(OCR_TIMEOUT)
+            text = _ocr_outcome(result, start)
+            if text is not None:
+                return text
+            vision_image = result.vision_image
+        except Exception:
+            traceback.print_exc()
+            metrics.incr("image.ocr_errors")
+
+    with metrics.timed("image.vision"):
+        text = analyze_image_with_llm(vision_image)
+    _handled("vision")
+    return text
+
+
+async def analyze_image_async(img_bytes: bytes) -> str:
+    from app.openai_utils import analyze_image_with_llm_async
+
+    vision_image = img_bytes
+    if OCR_ENABLED:
+        start = time.perf_counter()
+        try:
+            future = _ocr_pool().submit(_read_image, img_bytes, OCR_MIN_CONFIDENCE, OCR_MIN_WORDS)
+            result = await asyncio.wait_for(asyncio.wrap_future(future), OCR_TIMEOUT)
+            text = _ocr_outcome(result, start)
+            if text is not None:
+                return text
+            vision_image = result.vision_image
+        except Exception:
+            traceback.print_exc()
+            metrics.incr("image.ocr_errors")
+
+    with metrics.timed("image.vision"):
+        text = await analyze_image_with_llm_async(vision_image)
+    _handled("vision")
+    return text
@@ -0,0 +1,204 @@
+# app/index_persistence.py
+#
+# Crash-safe on-disk layout for the vector store:
+#
+#   faiss_index/
+#     CURRENT                 JSON {"snapshot": "snapshot-00000007-1a2b3c4d" | null, "wal_seq": 7}
+#     snapshot-00000007-*/    immutable base snapshot covering WAL segments <= wal_seq
+#     wal/wal-00000008.log    append-only segments with everything added since
+#
+# CURRENT is only ever replaced with os.replace(), so a crash leaves either the old or the
+# new snapshot published, never a half-written one. Records in a segment are
+# [u32 payload length][u32 crc32][payload]; a torn tail is detected by the CRC and dropped.
+
+import os
+import json
+import uuid
+import zlib
+import shutil
+import struct
+import numpy as np
+
+CURRENT_FILE = "CURRENT"
+WAL_DIR = "wal"
+RECORD_HEADER = struct.Struct("<II")
+META_LENGTH = struct.Struct("<I")
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # not supported on every platform/filesystem
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes):
+    """Write `data` to a temp file, fsync it and rename it over `path`."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def encode_record(meta: dict, vector=None) -> bytes:
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    vector_bytes = b"" if vector is None else np.asarray(vector, dtype=np.float32).tobytes()
+    payload = META_LENGTH.pack(len(meta_bytes)) + meta_bytes + vector_bytes
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload: bytes):
+    (meta_len,) = META_LENGTH.unpack_from(payload)
+    start = META_LENGTH.size
+    meta = json.loads(payload[start:start + meta_len].decode("utf-8"))
+    vector_bytes = payload[start + meta_len:]
+    vector = np.frombuffer(vector_bytes, dtype=np.float32) if vector_bytes else None
+    return meta, vector
+
+
+def read_current(folder: str) -> dict | None:
+    try:
+        with open(os.path.join(folder, CURRENT_FILE), "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def write_file(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_snapshot(folder: str, writer, wal_seq: int) -> str:
+    """
+    Durably write an (unpublished) snapshot directory; returns its name.
+    `writer(tmp_dir)` writes and fsyncs the snapshot files.
+    """
+    name = f"snapshot-{wal_seq:08d}-{uuid.uuid4().hex[:8]}"  # never reuses the published name
+    tmp_dir = os.path.join(folder, f"{name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    writer(tmp_dir)
+    _fsync_dir(tmp_dir)
+    os.rename(tmp_dir, os.path.join(folder, name))
+    _fsync_dir(folder)
+    return name
+
+
+def publish(folder: str, snapshot: str | None, wal_seq: int):
+    """
+    Atomically point CURRENT at `snapshot` (None = empty store) covering WAL segments
+    <= wal_seq, then remove the snapshots it supersedes.
+    """
+    os.makedirs(folder, exist_ok=True)
+    atomic_write(
+        os.path.join(folder, CURRENT_FILE),
+        json.dumps({"snapshot": snapshot, "wal_seq": wal_seq}).encode("utf-8"),
+    )
+    for entry in os.listdir(folder):
+        if entry.startswith("snapshot-") and entry != snapshot:
+            shutil.rmtree(os.path.join(folder, entry), ignore_errors=True)
+
+
+def snapshot_bytes(folder: str, snapshot: str | None) -> int:
+    if snapshot is None:
+        return 0
+    path = os.path.join(folder, snapshot)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class WriteAheadLog:
+    """
+    Append-only segment files. Writers must be serialized by the caller.
+    """
+
+    def __init__(self, folder: str, fsync: bool = True):
+        self.folder = folder
+        self.fsync = fsync
+        self._file = None
+        self.seq = None
+
+    def segments(self) -> list[tuple[int, str]]:
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            if name.startswith("wal-") and name.endswith(".log"):
+                segments.append((int(name[4:-4]), os.path.join(self.folder, name)))
+        return sorted(segments)
+
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(path) for _, path in self.segments())
+
+    def _open_next(self, min_seq: int = 0):
+        os.makedirs(self.folder, exist_ok=True)
+        existing = self.segments()
+        self.seq = max([min_seq] + [seq for seq, _ in existing]) + 1
+        self._file = open(os.path.join(self.folder, f"wal-{self.seq:08d}.log"), "ab")
+        _fsync_dir(self.folder)
+
+    def append(self, records: list[bytes], min_seq: int = 0) -> int:
+        """Durably append encoded records; returns bytes written."""
+        if self._file is None:
+            self._open_next(min_seq)
+        data = b"".join(records)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        return len(data)
+
+    def rotate(self) -> int | None:
+        """Close the active segment; returns its seq (None if nothing was written)."""
+        if self._file is None:
+            return None
+        self._file.close()
+        self._file = None
+        return self.seq
+
+    def close(self):
+        self.rotate()
+
+    def replay(self, after_seq: int = 0):
+        """
+        Yield (meta, vector) for every intact record in segments newer than `after_seq`.
+        A torn or corrupt tail (crash mid-append) is truncated away.
+        """
+        for seq, path in self.segments():
+            if seq <= after_seq:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            offset = 0
+            while offset < len(data):
+                if offset + RECORD_HEADER.size > len(data):
+                    break
+                length, crc = RECORD_HEADER.unpack_from(data, offset)
+                payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                yield decode_record(payload)
+                offset += RECORD_HEADER.size + length
+            if offset < len(data):
+                print(f"⚠️ Dropping {len(data) - offset} torn bytes at the end of {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+
+    def drop_through(self, seq: int):
+        """Delete every closed segment <= seq (already covered by a snapshot)."""
+        for s, path in self.segments():
+            if s <= seq and s != (self.seq if self._file else None):
+                os.remove(path)
@@ -0,0 +1,222 @@
+# app/ingestion.py
+
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import (
+    INGEST_BATCH_TOKENS,
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_INTERVAL,
+    INGEST_MAX_WORKERS,
+)
+from app.vector_store_utils import manager, embedding_model
+from app.chunk_store import fingerprint, namespace_key
+from app.utils import metrics
+
+# Number of finished uploads whose status is kept around for lookups
+MAX_TRACKED_UPLOADS = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) used for batch budgeting."""
+    return len(text) // 4 + 1
+
+
+class IngestionQueue:
+    """
+    Background embedding pipeline.
+    Chunks from any number of uploads are coalesced into batches (bounded by a token
+    budget and a chunk count), embedded concurrently on a bounded worker pool and
+    appended to the FAISS store.
+    """
+
+    def __init__(
+        self,
+        store_manager,
+        embeddings,
+        batch_tokens: int = INGEST_BATCH_TOKENS,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+        max_workers: int = INGEST_MAX_WORKERS,
+    ):
+        self.store_manager = store_manager
+        self.embeddings = embeddings
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_workers = max_workers
+
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_workers)  # caps batches in flight
+        self._executor = None
+        self._thread = None
+        self._pending = set()  # fingerprints of chunks queued but not yet in the store
+        self._status = OrderedDict()
+        self._status_lock = threading.Lock()
+        self._idle = threading.Condition(self._status_lock)
+
+    # ----------------- PUBLIC API -----------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed")
+        self._thread = threading.Thread(target=self._batch_loop, name="ingestion-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush everything still queued, then shut the workers down."""
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._thread = None
+
+    def submit(self, chunks: list[str], upload_id: str = None, metadatas: list[dict] = None) -> str:
+        """
+        Queue chunks for embedding and return immediately with the upload id.
+        `metadatas` (one dict per chunk: user, channel, team, file_id, uploaded_at) places
+        each chunk in its uploader's namespace. Submitting again with the same upload id
+        adds to that upload (documents are queued batch by batch while being extracted).
+        """
+        upload_id = upload_id or uuid.uuid4().hex
+        metadatas = metadatas or [None] * len(chunks)
+        items = [(c, m) for c, m in zip(chunks, metadatas) if c and c.strip()]
+        with self._status_lock:
+            # Skip chunks already stored or already waiting to be embedded (re-uploads)
+            keys = [(chunk, namespace_key(metadata)) for chunk, metadata in items]
+            fresh = []
+            for pos in self.store_manager.new_positions(keys):
+                fp = fingerprint(*keys[pos])
+                if fp not in self._pending:
+                    self._pending.add(fp)
+                    fresh.append(items[pos])
+            duplicates = len(items) - len(fresh)
+            items = fresh
+            metrics.incr("ingest.duplicate_chunks", duplicates)
+
+            status = self._status.get(upload_id)
+            if status is None:
+                self._status[upload_id] = {
+                    "upload_id": upload_id,
+                    "state": "queued" if items else "done",
+                    "total": len(items),
+                    "embedded": 0,
+                    "failed": 0,
+                    "duplicates": duplicates,
+                    "error": None,
+                    "submitted_at": time.time(),
+                    "finished_at": None if items else time.time(),
+                }
+                while len(self._status) > MAX_TRACKED_UPLOADS:
+                    self._status.popitem(last=False)
+            else:
+                # More chunks of an upload that is still being extracted (streamed in batches)
+                status["total"] += len(items)
+                status["duplicates"] += duplicates
+                if items and status["state"] in ("done", "failed"):
+                    status["state"] = "queued"
+                    status["finished_at"] = None
+
+        if items:
+            self.start()
+            for chunk, metadata in items:
+                self._queue.put((upload_id, chunk, metadata))
+        return upload_id
+
+    def get_status(self, upload_id: str) -> dict | None:
+        with self._status_lock:
+            status = self._status.get(upload_id)
+            return dict(status) if status else None
+
+    def wait(self, upload_id: str, timeout: float = None) -> dict | None:
+        """Block until the upload is done or failed (used by scripts and benchmarks)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while True:
+                status = self._status.get(upload_id)
+                if status is None or status["state"] in ("done", "failed"):
+                    return dict(status) if status else None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return dict(status)
+                self._idle.wait(remaining)
+
+    # ----------------- INTERNALS -----------------
+    def _batch_loop(self):
+        batch, batch_tokens, first_at = [], 0, None
+        stopping = False
+
+        while not stopping:
+            timeout = None if first_at is None else max(0.0, first_at + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                stopping = True
+            elif item:
+                tokens = estimate_tokens(item[1])
+                if batch and batch_tokens + tokens > self.batch_tokens:
+                    self._dispatch(batch)
+                    batch, batch_tokens = [], 0
+                if not batch:
+                    first_at = time.monotonic()
+                batch.append(item)
+                batch_tokens += tokens
+
+            full = len(batch) >= self.batch_size or batch_tokens >= self.batch_tokens
+            expired = first_at is not None and time.monotonic() - first_at >= self.flush_interval
+            if batch and (full or expired or stopping):
+                self._dispatch(batch)
+                batch, batch_tokens, first_at = [], 0, None
+
+    def _dispatch(self, batch):
+        # Blocks the batcher when max_workers batches are already embedding (backpressure)
+        self._slots.acquire()
+        self._mark(batch, state="embedding")
+        future = self._executor.submit(self._embed_batch, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def _embed_batch(self, batch):
+        texts = [text for _, text, _ in batch]
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+            self.store_manager.add_embeddings(list(zip(texts, vectors)), [metadata for _, _, metadata in batch])
+            self._mark(batch, embedded=True)
+        except Exception as e:
+            print(f"❌ Failed to embed batch of {len(batch)} chunks: {e}")
+            self._mark(batch, error=str(e))
+
+    def _mark(self, batch, state: str = None, embedded: bool = False, error: str = None):
+        counts = {}
+        for upload_id, _, _ in batch:
+            counts[upload_id] = counts.get(upload_id, 0) + 1
+
+        with self._status_lock:
+            if embedded or error:
+                self._pending.difference_update(fingerprint(text, namespace_key(m)) for _, text, m in batch)
+            for upload_id, n in counts.items():
+                status = self._status.get(upload_id)
+                if status is None:
+                    continue
+                if state and status["state"] == "queued":
+                    status["state"] = state
+                if embedded:
+                    status["embedded"] += n
+                if error:
+                    status["failed"] += n
+                    status["error"] = error
+                if status["embedded"] + status["failed"] >= status["total"]:
+                    status["state"] = "failed" if status["failed"] else "done"
+                    status["finished_at"] = time.time()
+            self._idle.notify_all()
+
+
+# Global ingestion queue
+ingestion_queue = IngestionQueue(manager, embedding_model)
@@ -0,0 +1,145 @@
+# app/lexical_index.py
+#
+# In-memory BM25 inverted index over chunk texts, kept next to the FAISS index by the vector
+# store manager: chunks are added as they are applied (uploads, WAL replay), and the base
+# snapshot is indexed in the background after a load. Dense retrieval misses exact
+# identifiers (invoice and contract numbers, codes) that users paste into questions; this
+# index finds them, and answers identifier lookups without an embedding call.
+#
+# Postings are per-term arrays of chunk ids and term frequencies. Deleted chunks are not
+# removed here; searches filter them out, and the next load rebuilds the index.
+
+import re
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from app.config import BM25_K1, BM25_B
+
+# Words, numbers and compounds such as INV-2024-0042, v1.2.3 or PO#7781
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_/.:#][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+# Query terms in more than this fraction of chunks score next to nothing (idf < log 2) but
+# cost a pass over huge postings; they are skipped when the query has rarer terms
+COMMON_TERM_RATIO = 0.5
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms; a compound is indexed whole and by its parts (inv-2024-0042, inv, 2024, 0042)."""
+    terms = []
+    for token in _TOKEN.findall((text or "").lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(_PART.findall(token))
+    return terms
+
+
+def identifiers(text: str) -> list[str]:
+    """
+    Terms of `text` that look like identifiers: at least 3 characters with a digit, and
+    letters or separators too unless 4+ digits long (INV-2024-0042, A17B, 889213; not 15).
+    """
+    return [
+        token for token in dict.fromkeys(_TOKEN.findall((text or "").lower()))
+        if len(token) >= 3 and any(c.isdigit() for c in token) and (not token.isdigit() or len(token) >= 4)
+    ]
+
+
+class LexicalIndex:
+    """
+    BM25 (Okapi, Lucene idf) over chunks addressed by chunk id. Thread-safe; `ready` is set
+    once every chunk of the store has been added (see VectorStoreManager).
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.ready = threading.Event()
+        self._postings = {}  # term -> (array of chunk ids, array of term frequencies)
+        self._lengths = array("I")  # terms per chunk, by chunk id
+        self._docs = 0
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._docs
+
+    def add(self, chunk_id: int, text: str):
+        self.add_many([(chunk_id, text)])
+
+    def add_many(self, items):
+        """Index (chunk id, text) pairs; tokenization happens outside the lock."""
+        counted = [(chunk_id, Counter(tokenize(text))) for chunk_id, text in items if text]
+        with self._lock:
+            for chunk_id, counts in counted:
+                if chunk_id >= len(self._lengths):
+                    self._lengths.extend([0] * (chunk_id + 1 - len(self._lengths)))
+                length = sum(counts.values())
+                self._lengths[chunk_id] = length
+                self._docs += 1
+                self._total_length += length
+                for term, tf in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("q"), array("H"))
+                    postings[0].append(chunk_id)
+                    postings[1].append(min(tf, 65535))
+
+    def search(self, query: str, k: int, allowed: np.ndarray = None, exclude=None) -> list[tuple[int, float]]:
+        """
+        (chunk id, BM25 score) of the k best chunks containing any query term, best first.
+        `allowed`: sorted ids to restrict to; `exclude(id)`: True for chunks to skip.
+        """
+        terms = set(tokenize(query))
+        gathered = []
+        with self._lock:
+            if not self._docs:
+                return []
+            docs, avg_length = self._docs, self._total_length / self._docs
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            found = [self._postings[term] for term in terms if term in self._postings]
+            rare = [postings for postings in found if len(postings[0]) <= COMMON_TERM_RATIO * docs]
+            for postings in rare or found:
+                ids = np.array(postings[0], dtype=np.int64)
+                gathered.append((ids, np.array(postings[1], dtype=np.float32), lengths[ids].astype(np.float32)))
+            del lengths  # release the buffer so the lengths array can grow again
+        if not gathered:
+            return []
+
+        all_ids, all_scores = [], []
+        for ids, tfs, lengths in gathered:
+            idf = np.log(1 + (docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lengths / avg_length)))
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if allowed is not None:
+            keep = np.isin(ids, allowed, assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+
+        hits = []
+        for pos in np.argsort(-scores, kind="stable"):
+            chunk_id = int(ids[pos])
+            if exclude is not None and exclude(chunk_id):
+                continue
+            hits.append((chunk_id, float(scores[pos])))
+            if len(hits) == k:
+                break
+        return hits
+
+    def containing(self, terms: list[str], chunk_ids) -> set[int]:
+        """The given chunk ids whose text contains every one of `terms`."""
+        matching = set(int(i) for i in chunk_ids)
+        with self._lock:
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    return set()
+                ids = np.array(postings[0], dtype=np.int64)
+                matching &= set(ids[np.isin(ids, list(matching))].tolist())
+                if not matching:
+                    break
+        return matching
@@ -2,18 +2,57 @@
 
 from dotenv import load_dotenv
 import asyncio
-from fastapi import FastAPI
-from .slack_listener import start_socket_mode
+from fastapi import FastAPI, HTTPException
+from .config import SLACK_ASYNC_MODE
+from .vector_store_utils import load_vector_store, manager as vector_store_manager
+from .ingestion import ingestion_queue
+from .dispatcher import message_dispatcher
+from .utils import metrics
+from .utils.http import close_async_client
+from .db.rest_client import supabase
+from .extraction import shutdown_pool as shutdown_extraction_pool
+from .image_pipeline import shutdown_pool as shutdown_ocr_pool
+from .downloads import close as close_downloads
 
 load_dotenv()
 
 app = FastAPI()
+socket_handler = None
 
 
 @app.on_event("startup")
 async def startup_event():
+    print("📚 Loading vector store...")
+    load_vector_store()
+    vector_store_manager.start_compactor()
+    ingestion_queue.start()
+    global socket_handler
     print("⚡ Starting Slack Socket Mode listener...")
-    asyncio.create_task(start_socket_mode())
+    if SLACK_ASYNC_MODE:
+        from .async_slack_listener import start_async_socket_mode
+        socket_handler = await start_async_socket_mode()
+    else:
+        # The threaded listener authenticates against Slack at import; keep it off the loop
+        message_dispatcher.start()
+        from .slack_listener import start_socket_mode
+        socket_handler = await asyncio.to_thread(start_socket_mode)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if socket_handler is not None:
+        if SLACK_ASYNC_MODE:
+            await socket_handler.close_async()
+        else:
+            socket_handler.close()
+    await close_async_client()
+    supabase.close()
+    close_downloads()
+    shutdown_extraction_pool()
+    shutdown_ocr_pool()
+    message_dispatcher.stop()
+    ingestion_queue.stop()
+    vector_store_manager.stop_compactor()
 
 
 @app.get("/")
@@ -21,3 +60,25 @@ def root():
     return {"message": "StakeholderBot API is running"}
 
 
+@app.get("/metrics")
+def get_metrics():
+    data = metrics.snapshot()
+    data["hit_rates"] = {
+        "embed_cache": metrics.hit_rate("embed_cache"),
+        "prompt_cache": metrics.hit_rate("prompt_cache"),
+        "history_cache": metrics.hit_rate("history_cache"),
+        "extract_cache": metrics.hit_rate("extract_cache"),
+        "slack_cache": metrics.hit_rate("slack_cache"),
+        "answer_cache": metrics.hit_rate("answer_cache"),
+        "query_embed_cache": metrics.hit_rate("query_embed_cache"),
+    }
+    return data
+
+
+@app.get("/ingestion/{upload_id}")
+def ingestion_status(upload_id: str):
+    status = ingestion_queue.get_status(upload_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown upload id")
+    return status
+
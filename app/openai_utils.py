@@ -4,33 +4,40 @@ import base64
 import mimetypes
 # import imghdr
 import filetype
-import openai
+import time
+import asyncio
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator
 from dotenv import load_dotenv
 from pathlib import Path
-from io import BytesIO
-from PIL import Image
-import pytesseract  # OCR
 
-from app.db.prompt_repo import get_system_prompt
-from app.db.supabase_client import get_user_interactions
-from app.vector_store_utils import query_vector_store
+from app.db.prompt_repo import SystemPrompt, get_system_prompt_record, get_system_prompt_record_async
+from app.history import conversation_history
+from app.config import DISPATCH_MAX_WORKERS
+from app.vector_store_utils import embed_query, manager, retrieve, is_lookup
+from app.answer_cache import answer_cache
+from app.query_router import uses_rag
+from app.utils import metrics
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 # Load environment variables
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 # openai.api_key = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Retrieval (query embedding + search) runs here while ask_gpt_stream fetches prompt and history
+_retrieval_pool = ThreadPoolExecutor(max_workers=DISPATCH_MAX_WORKERS, thread_name_prefix="retrieval")
 
 
 
-def analyze_image_with_llm(img_bytes: bytes) -> str:
+
+def image_analysis_messages(img_bytes: bytes) -> list[dict]:
     """
-    Analyze an image using GPT-4o and extract text + entities.
-    Returns only the extracted response.
+    Chat messages asking GPT-4o to extract text + entities from an image.
     """
     # # Detect image format
     # detected_format = imghdr.what(None, h=img_bytes)
@@ -52,7 +59,7 @@ def analyze_image_with_llm(img_bytes: bytes) -> str:
     )
 
     # User message with text + image
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {
             "role": "user",
@@ -63,10 +70,16 @@ def analyze_image_with_llm(img_bytes: bytes) -> str:
         },
     ]
 
+
+def analyze_image_with_llm(img_bytes: bytes) -> str:
+    """
+    Analyze an image using GPT-4o and extract text + entities.
+    Returns only the extracted response.
+    """
     # Call GPT-4o
     response = client.chat.completions.create(
         model="gpt-4o",
-        messages=messages,
+        messages=image_analysis_messages(img_bytes),
         temperature=0.5
     )
 
@@ -74,140 +87,238 @@ def analyze_image_with_llm(img_bytes: bytes) -> str:
     return response.choices[0].message.content.strip()
 
 
+async def analyze_image_with_llm_async(img_bytes: bytes) -> str:
+    response = await async_client.chat.completions.create(
+        model="gpt-4o",
+        messages=image_analysis_messages(img_bytes),
+        temperature=0.5
+    )
+    return response.choices[0].message.content.strip()
+
+
+# --- Main GPT handler ---
+def build_chat_messages(
+    base_system_prompt: str, user_message: str, file_text: str, history_text: str, rag_context: str
+) -> list[dict]:
+    """
+    System + user messages from the admin-managed base prompt (/update), the query,
+    file text, conversation history (token-budgeted, see app/history.py) and RAG context.
+    """
+    # --- Build final extracted text ---
+    combined_extracted_text = ""
+    if file_text and file_text.strip():
+        combined_extracted_text += file_text.strip()
+
+    # --- System prompt with context ---
+    # --- System prompt ---
+    if rag_context.strip():
+        system_prompt = f"""
+    {base_system_prompt}
+    Use all available context to answer queries accurately.
+    - Use the vector store context when relevant.
+    - Focus on document or file content if the query relates to a file.
+    - Combine conversation history and context intelligently.
+    - Always be polite, professional, and clear.
+    - Avoid mentioning internal system details.
+    Vector Store Context:
+    {rag_context}
+    """
+    else:
+        system_prompt = f"""
+    {base_system_prompt}
+    - Answer general queries using your knowledge and conversation history.
+    - Provide polite and friendly greetings when appropriate.
+    - Keep answers clear, accurate, and professional.
+    - Avoid referring to vector stores or documents unless they exist.
+    """
+
+
+    # --- Final user prompt to GPT ---
+    final_prompt = f"""
+    Conversation History:
+    {history_text}
+
+    User Query:
+    {user_message}
 
+    Extracted Text:
+    {combined_extracted_text}
+    """
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": final_prompt},
+    ]
 
 
-# ----------------- QUERY CLASSIFIER -----------------
-def llm_classify(user_message: str) -> str:
+def context_for(user_message: str, slack_user_id: str, team_id: str, route: str, has_file_text: bool, cacheable: bool):
     """
-    Use GPT for classification when heuristics are uncertain.
+    (query vector, chunk ids, RAG context) for an answer. Routes that need no retrieval
+    (see query_router.uses_rag) get no context, and a query vector only for the answer cache.
+    Identifier lookups are not embedded up front, so the keyword index can answer them
+    without an embedding call; the vector is None then and the answer is not cached.
     """
+    lookup = uses_rag(route, has_file_text) and is_lookup(user_message)
+    vector = embed_query(user_message) if cacheable and not lookup else None
+    if not uses_rag(route, has_file_text):
+        metrics.incr("rag.skipped")
+        return vector, [], ""
+    return retrieve(user_message, user_id=slack_user_id, team_id=team_id, vector=vector)
+
+
+def ask_gpt_stream(
+    user_message: str,
+    file_text: str,
+    slack_user_id: str,
+    team_id: str = None,
+    system_prompt: SystemPrompt = None,
+    route: str = None,
+) -> Iterator[str]:
+    """
+    ask_gpt() as a stream of text deltas, as the model produces them. A question without
+    file text that retrieved document chunks is answered from those chunks without the
+    conversation history, so the answer can be cached for the workspace, and from the
+    answer cache when it was asked before (one delta).
+    Timers: llm.first_token (call to first delta, retrieval included) and llm.completion.
+    """
+    start = time.perf_counter()
     try:
-        resp = openai.chat.completions.create(
+        # --- RAG Context (only the caller's own uploads; skipped where the route needs none) ---
+        # Started first: the query embedding overlaps the prompt and history lookups below
+        has_file_text = bool(file_text and file_text.strip())
+        cacheable = answer_cache.enabled and not has_file_text
+        context = _retrieval_pool.submit(context_for, user_message, slack_user_id, team_id, route, has_file_text, cacheable)
+
+        # --- Get system prompt (cached; see prompt_repo) ---
+        system_prompt = system_prompt or get_system_prompt_record()
+
+        # --- User conversation history (cached, summarized past the token budget) ---
+        history_text = conversation_history.render(slack_user_id)
+
+        query_vector, chunk_ids, rag_context = context.result()
+        cacheable = cacheable and query_vector is not None and bool(chunk_ids)
+        if cacheable:
+            history_text = ""  # shared across the workspace: question and documents only
+
+        # --- Same question, same context, same prompt: answered before ---
+        if cacheable:
+            cache_key = (answer_cache.group(team_id, system_prompt.version, chunk_ids), query_vector, manager.generation)
+            cached = answer_cache.get(*cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        # --- GPT API Call (streamed) ---
+        stream = client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a classifier. Return only one word: general, document, image, or mixed."},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0
+            messages=build_chat_messages(system_prompt.text, user_message, file_text, history_text, rag_context),
+            temperature=0.4,
+            max_tokens=1000,
+            stream=True,
         )
-        label = resp.choices[0].message.content.strip().lower()
-        if label in ["general", "document", "image", "mixed"]:
-            return label
-    except Exception:
-        pass
-    return "general"
+        parts = []
+        for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                if not parts:
+                    metrics.observe("llm.first_token", (time.perf_counter() - start) * 1000)
+                parts.append(delta)
+                yield delta
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe("llm.completion", elapsed_ms)
+        if cacheable:
+            answer_cache.put(*cache_key, "".join(parts).strip(), elapsed_ms)
+
+    except Exception as e:
+        traceback.print_exc()
+        yield f"⚠️ Error in ask_gpt: {str(e)}"
 
 
-def classify_query(user_message: str, file_text: str, images: list[bytes]) -> str:
+def ask_gpt(
+    user_message: str,
+    file_text: str,
+    slack_user_id: str,
+    team_id: str = None,
+    system_prompt: SystemPrompt = None,
+    route: str = None,
+) -> str:
     """
-    Hybrid classifier: Heuristic first, GPT fallback for ambiguous queries.
+    Handles GPT response generation using user message, file text, and RAG context.
+    Pass `system_prompt` to answer with the same prompt version the caller records, and
+    `route` (query_router.route_query) to skip retrieval where the route needs none.
     """
-    text = user_message.lower().strip()
+    return "".join(ask_gpt_stream(user_message, file_text, slack_user_id, team_id, system_prompt, route)).strip()
 
-    # --- Explicit signals from inputs ---
-    if images and file_text:
-        return "mixed"
-    if images:
-        if any(word in text for word in ["see", "picture", "image", "photo", "screenshot", "visual"]):
-            return "image"
-        return "image"
-    if file_text and file_text.strip():
-        if any(word in text for word in ["document", "file", "pdf", "report", "text inside"]):
-            return "document"
-        return "document"
-
-    # --- General by default ---
-    label = "general"
-
-    # If ambiguous phrasing, let GPT decide
-    if any(word in text for word in ["this", "that", "above", "attached", "uploaded", "shown"]):
-        label = llm_classify(user_message)
 
-    return label
+async def _system_prompt_async(system_prompt: SystemPrompt = None) -> SystemPrompt:
+    return system_prompt or await get_system_prompt_record_async()  # cached
 
 
-# --- Main GPT handler ---
-def ask_gpt(user_message: str, file_text: str, slack_user_id: str) -> str:
+async def ask_gpt_stream_async(
+    user_message: str,
+    file_text: str,
+    slack_user_id: str,
+    team_id: str = None,
+    system_prompt: SystemPrompt = None,
+    route: str = None,
+) -> AsyncIterator[str]:
     """
-    Handles GPT response generation using user message, file text, and RAG context.
+    ask_gpt_stream() for the async app: the prompt and history lookups and retrieval (query
+    embedding, then the CPU-bound FAISS search on a worker thread) run concurrently.
     """
-
+    start = time.perf_counter()
     try:
-        # --- Get system prompt ---
-        base_system_prompt = get_system_prompt()
-
-        # --- Fetch user conversation history ---
-        past_interactions = get_user_interactions(slack_user_id)
-        history_text = ""
-        if past_interactions:
-            for inter in past_interactions[-50:]:  # ✅ keep last 50 interactions
-                extracted_part = f"\nExtracted Info: {inter['extracted_text']}" if inter.get("extracted_text") else ""
-                history_text += (
-                    f"User: {inter['message_text']}\n"
-                    f"Assistant: {inter['response_text']}{extracted_part}\n"
-                )
-
-        # --- RAG Context ---
-        rag_context = query_vector_store(user_message)
-
-        # --- Build final extracted text ---
-        combined_extracted_text = ""
-        if file_text and file_text.strip():
-            combined_extracted_text += file_text.strip()
-
-        # --- System prompt with context ---
-        # --- System prompt ---
-        if rag_context.strip():
-            system_prompt = f"""
-        You are a professional and friendly AI assistant. Use all available context to answer queries accurately. 
-        - Use the vector store context when relevant.
-        - Focus on document or file content if the query relates to a file.
-        - Combine conversation history and context intelligently.
-        - Always be polite, professional, and clear.
-        - Avoid mentioning internal system details.
-        Vector Store Context:
-        {rag_context}
-        """
-        else:
-            system_prompt = f"""
-        You are a professional and friendly AI assistant. 
-        - Answer general queries using your knowledge and conversation history.
-        - Provide polite and friendly greetings when appropriate.
-        - Keep answers clear, accurate, and professional.
-        - Avoid referring to vector stores or documents unless they exist.
-        """
-
-
-        # --- Final user prompt to GPT ---
-        final_prompt = f"""
-        Conversation History:
-        {history_text}
-
-        User Query:
-        {user_message}
-
-        Extracted Text:
-        {combined_extracted_text}
-        """
-
-
-        # --- GPT API Call (new SDK style) ---
-        response = client.chat.completions.create(
+        has_file_text = bool(file_text and file_text.strip())
+        cacheable = answer_cache.enabled and not has_file_text
+        history_text, (query_vector, chunk_ids, rag_context), system_prompt = await asyncio.gather(
+            conversation_history.render_async(slack_user_id),
+            asyncio.to_thread(context_for, user_message, slack_user_id, team_id, route, has_file_text, cacheable),
+            _system_prompt_async(system_prompt),
+        )
+        cacheable = cacheable and query_vector is not None and bool(chunk_ids)
+        if cacheable:
+            history_text = ""  # shared across the workspace: question and documents only
+
+        if cacheable:
+            cache_key = (answer_cache.group(team_id, system_prompt.version, chunk_ids), query_vector, manager.generation)
+            cached = answer_cache.get(*cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        stream = await async_client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": final_prompt},
-            ],
+            messages=build_chat_messages(system_prompt.text, user_message, file_text, history_text, rag_context),
             temperature=0.4,
             max_tokens=1000,
+            stream=True,
         )
-
-        return response.choices[0].message.content.strip()
+        parts = []
+        async for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                if not parts:
+                    metrics.observe("llm.first_token", (time.perf_counter() - start) * 1000)
+                parts.append(delta)
+                yield delta
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe("llm.completion", elapsed_ms)
+        if cacheable:
+            answer_cache.put(*cache_key, "".join(parts).strip(), elapsed_ms)
 
     except Exception as e:
         traceback.print_exc()
-        return f"⚠️ Error in ask_gpt: {str(e)}"
-
-
-
+        yield f"⚠️ Error in ask_gpt: {str(e)}"
+
+
+async def ask_gpt_async(
+    user_message: str,
+    file_text: str,
+    slack_user_id: str,
+    team_id: str = None,
+    system_prompt: SystemPrompt = None,
+    route: str = None,
+) -> str:
+    """ask_gpt() for the async app (see ask_gpt_stream_async)."""
+    parts = [delta async for delta in ask_gpt_stream_async(user_message, file_text, slack_user_id, team_id, system_prompt, route)]
+    return "".join(parts).strip()
@@ -1,55 +1,208 @@
-import tiktoken
-from app.openai_utils import ask_gpt  # ✅ Ensure this is your custom function
+# app/process_response.py
+#
+# Map-reduce question answering over documents too large for one chat request.
+# Map: every chunk is asked the question on its own, concurrently. Reduce: partial answers
+# are merged in groups that fit one request, level by level, until one group is left; the
+# final request adds the conversation history and RAG context, fetched once per document.
 
-# Choose appropriate tokenizer for your model
-encoding = tiktoken.encoding_for_model("gpt-4")  # or "gpt-3.5-turbo"
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-def split_text_into_chunks(text: str, max_tokens: int = 6000) -> list[str]:
+import openai
+
+from app.chunking import split_text
+from app.config import (
+    DOC_QA_TRIGGER_TOKENS,
+    DOC_QA_CHUNK_TOKENS,
+    DOC_QA_REDUCE_TOKENS,
+    DOC_QA_CONCURRENCY,
+    DOC_QA_MAX_RETRIES,
+)
+from app.db.prompt_repo import SystemPrompt, get_system_prompt_record
+from app.history import conversation_history
+from app.openai_utils import build_chat_messages, client
+from app.utils import metrics
+from app.utils.tokens import count_tokens
+from app.vector_store_utils import query_vector_store
+
+NO_ANSWER = "NONE"
+
+
+def needs_map_reduce(file_text: str) -> bool:
+    """True when the extracted text is too large to send with one chat request."""
+    # A token covers at least one character, so short texts need no encoding
+    if not file_text or len(file_text) <= DOC_QA_TRIGGER_TOKENS:
+        return False
+    return count_tokens(file_text) > DOC_QA_TRIGGER_TOKENS
+
+
+def chat_complete(messages: list[dict], max_tokens: int = 1000) -> str:
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=0.2,
+        max_tokens=max_tokens,
+    )
+    return response.choices[0].message.content.strip()
+
+
+class _RateGate:
+    """Holds every caller back while the API is rate limiting (429 + retry-after)."""
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def _retry_after(error: openai.RateLimitError, attempt: int) -> float:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return min(30.0, 2.0 ** attempt)
+
+
+class DocumentQA:
     """
-    Splits the input text into chunks, each within the token limit.
+    Map-reduce answering engine. One shared pool of `concurrency` threads bounds the chat
+    requests in flight across all documents; a rate-limited request pauses the whole pool
+    for the server's retry-after before it is retried.
     """
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
 
-    for word in words:
-        token_count = len(encoding.encode(word))
-        if current_tokens + token_count > max_tokens:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
-            current_tokens = token_count
-        else:
-            current_chunk.append(word)
-            current_tokens += token_count
+    def __init__(
+        self,
+        complete=chat_complete,
+        concurrency: int = DOC_QA_CONCURRENCY,
+        chunk_tokens: int = DOC_QA_CHUNK_TOKENS,
+        reduce_tokens: int = DOC_QA_REDUCE_TOKENS,
+        max_retries: int = DOC_QA_MAX_RETRIES,
+    ):
+        self.complete = complete
+        self.chunk_tokens = chunk_tokens
+        self.reduce_tokens = reduce_tokens
+        self.max_retries = max_retries
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="doc-qa")
+        self._gate = _RateGate()
+
+    # ----------------- PUBLIC API -----------------
+    def answer(
+        self,
+        document_text: str,
+        user_query: str,
+        base_prompt: str,
+        history_text: str = "",
+        rag_context: str = "",
+    ) -> str:
+        with metrics.timed("doc_qa.split"):
+            chunks = split_text(document_text, self.chunk_tokens)
+        metrics.incr("doc_qa.documents")
+        metrics.incr("doc_qa.chunks", len(chunks))
+
+        with metrics.timed("doc_qa.map"):
+            partials = list(self._pool.map(
+                lambda args: self._map(base_prompt, user_query, *args), enumerate(chunks, 1)
+            ))
+        partials = [p for p in partials if p] or [
+            "No part of the document addresses the question."
+        ]
+
+        with metrics.timed("doc_qa.reduce"):
+            while True:
+                groups = self._groups(partials)
+                if len(groups) == 1:
+                    break
+                metrics.incr("doc_qa.reduce_levels")
+                partials = list(self._pool.map(lambda group: self._reduce(base_prompt, user_query, group), groups))
+
+        # Final answer: the merged findings stand in for the document text
+        messages = build_chat_messages(base_prompt, user_query, "\n\n".join(groups[0]), history_text, rag_context)
+        return self._call(messages)
 
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
+    # ----------------- INTERNALS -----------------
+    def _map(self, base_prompt: str, user_query: str, index: int, chunk: str) -> str | None:
+        messages = [
+            {"role": "system", "content": (
+                f"{base_prompt}\n"
+                "You are reading one part of a longer document. Answer the question using only "
+                f"this part, quoting names, figures and dates exactly. Reply {NO_ANSWER} if this "
+                "part does not help answer it."
+            )},
+            {"role": "user", "content": f"Question:\n{user_query}\n\nDocument part {index}:\n{chunk}"},
+        ]
+        answer = self._call(messages)
+        if answer.strip().rstrip(".").upper() == NO_ANSWER:
+            return None
+        return f"From part {index}:\n{answer}"
 
-    return chunks
+    def _reduce(self, base_prompt: str, user_query: str, partials: list[str]) -> str:
+        messages = [
+            {"role": "system", "content": (
+                f"{base_prompt}\n"
+                "Merge these findings from different parts of a document into one answer to the "
+                "question. Keep every specific fact, drop repetition, and note contradictions."
+            )},
+            {"role": "user", "content": f"Question:\n{user_query}\n\nFindings:\n\n" + "\n\n".join(partials)},
+        ]
+        return self._call(messages)
 
+    def _groups(self, partials: list[str]) -> list[list[str]]:
+        """Consecutive partial answers packed into groups of at most `reduce_tokens`."""
+        groups, current, used = [], [], 0
+        for partial in partials:
+            tokens = count_tokens(partial)
+            if current and used + tokens > self.reduce_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(partial)
+            used += tokens
+        groups.append(current)
+        if len(groups) > 1 and len(groups) == len(partials):
+            # Every answer fills a group on its own: merge pairwise so the reduce terminates
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        return groups
 
-def process_document_in_chunks(document_text: str, user_query: str, slack_user_id: str) -> str:
+    def _call(self, messages: list[dict]) -> str:
+        for attempt in range(self.max_retries + 1):
+            self._gate.wait()
+            try:
+                with metrics.timed("doc_qa.llm"):
+                    return self.complete(messages)
+            except openai.RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                metrics.incr("doc_qa.rate_limited")
+                self._gate.pause(_retry_after(e, attempt))
+
+
+document_qa = DocumentQA()
+
+
+def process_document_in_chunks(
+    document_text: str,
+    user_query: str,
+    slack_user_id: str,
+    team_id: str = None,
+    system_prompt: SystemPrompt = None,
+) -> str:
     """
-    Splits the document into chunks, runs ask_gpt() on each chunk, then summarizes all answers.
+    Answer a question about a document larger than the chat context (see DocumentQA).
+    System prompt, history and RAG context are fetched once for the whole document.
     """
-    print("📄 Splitting document into chunks...")
-    chunks = split_text_into_chunks(document_text)
-
-    chunk_answers = []
-    for i, chunk in enumerate(chunks):
-        print(f"🤖 Processing chunk {i+1}/{len(chunks)}...")
-        response = ask_gpt(user_message=user_query, file_text=chunk, slack_user_id=slack_user_id)
-        chunk_answers.append(f"Answer from chunk {i+1}:\n{response}")
-
-    combined_answers = "\n\n".join(chunk_answers)
-
-    print("🧠 Sending combined answers for final summary...")
-    final_summary = ask_gpt(
-        user_message=f"""Here are the answers from different parts of a document based on the same question: "{user_query}".
-Please summarize or provide a final unified answer from all the responses.""",
-        file_text=combined_answers,
-        slack_user_id=slack_user_id
-    )
-
-    return final_summary
+    try:
+        system_prompt = system_prompt or get_system_prompt_record()
+        history_text = conversation_history.render(slack_user_id)
+        rag_context = query_vector_store(user_query, user_id=slack_user_id, team_id=team_id)
+        return document_qa.answer(document_text, user_query, system_prompt.text, history_text, rag_context)
+    except Exception as e:
+        traceback.print_exc()
+        return f"⚠️ Error in process_document_in_chunks: {str(e)}"
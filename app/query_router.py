@@ -0,0 +1,174 @@
+# app/query_router.py
+#
+# Local query routing, replacing the gpt-4o-mini classifier. A message is labeled general,
+# document, image or mixed from what was attached and, for text-only messages, from a
+# nearest-centroid model over hashed word / bigram features plus keyword features. The
+# label decides whether the answer searches the vector store: general chat and image
+# questions do not, questions about an attached document use that document only.
+# A text-only message is only routed "general" when the model is clearly sure (greetings,
+# small talk); anything else keeps retrieval on, and the relevance gate (app/retrieval.py)
+# drops context that does not match.
+
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+from app.config import ROUTER_MODEL_PATH, ROUTER_GENERAL_MARGIN
+from app.utils import metrics
+
+LABELS = ("general", "document", "image", "mixed")
+
+FEATURE_DIM = 2048
+KEYWORD_WEIGHT = 3.0
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+KEYWORDS = {
+    "greeting": {"hi", "hello", "hey", "thanks", "thank", "morning", "evening", "bye", "cheers", "ok", "okay", "cool"},
+    "document": {
+        "document", "documents", "doc", "docs", "file", "files", "pdf", "report", "contract", "policy",
+        "section", "clause", "page", "uploaded", "attached", "attachment", "invoice", "agreement", "spreadsheet",
+    },
+    "image": {"image", "picture", "photo", "screenshot", "scan", "diagram", "logo", "visual", "chart"},
+}
+
+# Fits the default model when no trained one is at ROUTER_MODEL_PATH
+SEED_EXAMPLES = [
+    ("hi", "general"),
+    ("hello there", "general"),
+    ("hey, how are you?", "general"),
+    ("thanks a lot!", "general"),
+    ("good morning", "general"),
+    ("what can you do?", "general"),
+    ("who are you", "general"),
+    ("tell me a joke", "general"),
+    ("what is the capital of france", "general"),
+    ("explain how photosynthesis works", "general"),
+    ("write an email to my team about friday's offsite", "general"),
+    ("translate good night into spanish", "general"),
+    ("how do I write a for loop in python", "general"),
+    ("what's the difference between a loan and a lease", "general"),
+    ("summarize the document I uploaded", "document"),
+    ("what does the contract say about termination", "document"),
+    ("find the payment terms in the agreement", "document"),
+    ("what is our leave policy", "document"),
+    ("which section covers liability", "document"),
+    ("list the key dates in the report", "document"),
+    ("what was the total on the invoice", "document"),
+    ("according to the file, who signed it", "document"),
+    ("what does page 3 say about refunds", "document"),
+    ("compare the two pdfs I sent", "document"),
+    ("what's the notice period in my contract", "document"),
+    ("what does the attached spreadsheet show", "document"),
+    ("what is in this picture", "image"),
+    ("describe the screenshot", "image"),
+    ("read the text in the photo", "image"),
+    ("what does the chart in the image show", "image"),
+    ("is the logo in the scan ours", "image"),
+    ("what is written on this receipt photo", "image"),
+    ("does the screenshot match the contract", "mixed"),
+    ("compare the photo with the report", "mixed"),
+    ("check the picture against the invoice in the pdf", "mixed"),
+    ("is the signature in the image the same as in the document", "mixed"),
+]
+
+
+def _features(text: str) -> np.ndarray:
+    """Hashed unigram + bigram counts and weighted keyword indicators, L2-normalized."""
+    words = _WORDS.findall(text.lower())
+    keys = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    index = [zlib.crc32(key.encode("utf-8")) % FEATURE_DIM for key in keys]
+    vector = np.bincount(index, minlength=FEATURE_DIM).astype(np.float32) if index else np.zeros(FEATURE_DIM, np.float32)
+    for name, vocabulary in KEYWORDS.items():
+        if any(word in vocabulary for word in words):
+            vector[zlib.crc32(f"kw:{name}".encode("utf-8")) % FEATURE_DIM] += KEYWORD_WEIGHT
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class QueryRouter:
+    """
+    Nearest-centroid text classifier over LABELS. fit() takes (text, label) pairs, e.g.
+    logged messages labeled by the LLM classifier (benchmarks/bench_router.py).
+    """
+
+    def __init__(self, centroids: np.ndarray = None, labels: tuple = LABELS):
+        self.labels = tuple(labels)
+        self.centroids = centroids
+
+    def fit(self, examples: list[tuple[str, str]]) -> "QueryRouter":
+        centroids = np.zeros((len(self.labels), FEATURE_DIM), dtype=np.float32)
+        for text, label in examples:
+            centroids[self.labels.index(label)] += _features(text)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1, norms)
+        return self
+
+    def predict(self, text: str) -> str:
+        return self.predict_margin(text)[0]
+
+    def predict_margin(self, text: str) -> tuple[str, float]:
+        """The nearest label and its lead in cosine similarity over the runner-up."""
+        scores = self.centroids @ _features(text)
+        second, first = np.argsort(scores)[-2:]
+        return self.labels[int(first)], float(scores[first] - scores[second])
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, centroids=self.centroids, labels=np.array(self.labels))
+
+    @classmethod
+    def load(cls, path: str) -> "QueryRouter":
+        data = np.load(path)
+        return cls(data["centroids"], tuple(str(label) for label in data["labels"]))
+
+
+def _default_router() -> QueryRouter:
+    if ROUTER_MODEL_PATH and os.path.exists(ROUTER_MODEL_PATH):
+        return QueryRouter.load(ROUTER_MODEL_PATH)
+    return QueryRouter().fit(SEED_EXAMPLES)
+
+
+router = _default_router()
+
+
+# ----------------- PUBLIC API -----------------
+def route_query(user_message: str, has_documents: bool = False, has_images: bool = False) -> str:
+    """
+    "general", "document", "image" or "mixed". Attachments decide when present; text-only
+    messages are classified. A text-only message about an earlier image is answered from
+    the indexed image text, so it routes as "document", as does one the model does not
+    label "general" by at least ROUTER_GENERAL_MARGIN: skipping retrieval for a question
+    the store could answer costs more than searching for small talk.
+    """
+    start = time.perf_counter()
+    if has_images and has_documents:
+        label = "mixed"
+    elif has_images:
+        label = "image"
+    elif has_documents:
+        label = "document"
+    else:
+        label, margin = router.predict_margin(user_message or "")
+        if label != "general" or margin < ROUTER_GENERAL_MARGIN:
+            label = "document"
+    metrics.observe("router.classify", (time.perf_counter() - start) * 1000)
+    metrics.incr(f"router.{label}")
+    return label
+
+
+def uses_rag(route: str | None, has_file_text: bool) -> bool:
+    """
+    Whether an answer searches the vector store: not for general chat or questions about
+    an attached image, and not for a question about an attached document (document only).
+    Unrouted calls (None) always do.
+    """
+    if route in ("general", "image"):
+        return False
+    if route == "document":
+        return not has_file_text
+    return True
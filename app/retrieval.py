@@ -0,0 +1,104 @@
+# app/retrieval.py
+#
+# Score-aware selection of the chunks injected as RAG context (vector_store_utils.retrieve).
+# Candidates from the vector index are scored by cosine similarity with the query; those
+# under RAG_MIN_SCORE are dropped, the rest are diversified with maximal marginal relevance
+# and packed into RAG_CONTEXT_TOKENS tokens. A query nothing relevant matches gets no
+# context at all, so its prompt is the short general-chat one. With hybrid search the
+# ranking is the reciprocal-rank fusion of the dense and BM25 lists (app/lexical_index.py).
+
+from typing import NamedTuple
+
+import numpy as np
+
+from app.config import RAG_TOP_K, RAG_MMR_LAMBDA, RAG_CONTEXT_TOKENS, RRF_K
+from app.utils.tokens import count_tokens, truncate_tokens
+
+
+class Selection(NamedTuple):
+    chunk_ids: list[int]
+    scores: list[float]  # relevance of each selected chunk (cosine, or fused when hybrid)
+    context: str
+    tokens: int
+
+
+def cosine_scores(query, vectors: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of `vectors` with `query`."""
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+    return (vectors @ query) / np.where(norms == 0, 1.0, norms)
+
+
+def mmr(vectors: np.ndarray, scores: np.ndarray, k: int, lambda_: float = RAG_MMR_LAMBDA) -> list[int]:
+    """
+    Positions of up to k rows picked by maximal marginal relevance: each pick maximizes
+    lambda * relevance - (1 - lambda) * (max similarity to the rows already picked).
+    lambda = 1 is plain top-k by score.
+    """
+    if not len(scores) or k <= 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1.0, norms)
+    picked = [int(np.argmax(scores))]
+    redundancy = unit @ unit[picked[0]]
+    while len(picked) < min(k, len(scores)):
+        gain = lambda_ * scores - (1 - lambda_) * redundancy
+        gain[picked] = -np.inf
+        best = int(np.argmax(gain))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return picked
+
+
+def pack(texts: list[str], max_tokens: int = RAG_CONTEXT_TOKENS) -> tuple[int, int]:
+    """
+    (chunks that fit, their tokens): texts are taken in order until the next one would
+    exceed `max_tokens`. A first text over the budget on its own counts as 1 and is cut
+    by the caller.
+    """
+    used = 0
+    for n, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            return (1, max_tokens) if n == 0 else (n, used)
+        used += tokens
+    return len(texts), used
+
+
+def rrf(rankings, k: int = RRF_K) -> dict[int, float]:
+    """Reciprocal-rank fusion: sum over rankings of 1 / (k + rank), rank counted from 1."""
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def select(
+    candidate_ids: list[int],
+    candidate_vectors: np.ndarray,
+    relevance: np.ndarray,
+    get_texts,
+    k: int = RAG_TOP_K,
+    lambda_: float = RAG_MMR_LAMBDA,
+    max_tokens: int = RAG_CONTEXT_TOKENS,
+) -> Selection:
+    """
+    The context from candidates that passed the relevance gate, `relevance` in [0, 1]
+    per candidate. `get_texts(ids)` loads chunk texts; only the selected chunks are read.
+    """
+    if not candidate_ids:
+        return Selection([], [], "", 0)
+    order = mmr(candidate_vectors, relevance, k, lambda_)
+    texts = get_texts([candidate_ids[i] for i in order])
+    count, tokens = pack(texts, max_tokens)
+    texts = texts[:count]
+    if count == 1 and count_tokens(texts[0]) > max_tokens:
+        texts[0] = truncate_tokens(texts[0], max_tokens)
+    order = order[:count]
+    return Selection(
+        [candidate_ids[i] for i in order],
+        [round(float(relevance[i]), 4) for i in order],
+        "\n\n".join(texts),
+        tokens,
+    )
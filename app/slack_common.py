@@ -0,0 +1,145 @@
+# app/slack_common.py
+#
+# Pieces of the message pipeline shared by the threaded listener (slack_listener.py) and
+# the async one (async_slack_listener.py): file classification and parsing, chunking and
+# ingestion metadata, and the answer message layout.
+
+import time
+
+from app.chunking import iter_chunks, split_text
+from app.config import STREAM_UPDATE_TOKENS, STREAM_UPDATE_INTERVAL
+from app.extraction import iter_sections
+from app.utils import metrics
+
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+FEEDBACK_MAP = {
+    "feedback_like": "👍",
+    "feedback_dislike": "👎",
+    "feedback_error": "❌"
+}
+
+BUSY_TEXT = "⏳ I'm handling a lot of messages right now. Please try again in a moment."
+ERROR_TEXT = "❌ Something went wrong while processing your message."
+
+# Shown at the end of an answer while it is still streaming
+STREAM_CURSOR = " ▍"
+
+# Chunks written to the vector store
+INGEST_CHUNK_TOKENS = 5000
+INGEST_CHUNK_OVERLAP = 300
+
+
+def file_kind(f: dict) -> str | None:
+    """"text", "docx", "pdf", "image", or None for unsupported Slack files."""
+    filetype = (f.get("filetype") or "").lower()
+    mimetype = (f.get("mimetype") or "").lower()
+    if filetype == "text" or mimetype in ["text/plain"]:
+        return "text"
+    if filetype == "docx" or mimetype in [DOCX_MIMETYPE]:
+        return "docx"
+    if filetype == "pdf" or mimetype == "application/pdf":
+        return "pdf"
+    if filetype in ["png", "jpg", "jpeg"] or mimetype.startswith("image/"):
+        return "image"
+    return None
+
+
+def extract_document_text(kind: str, source, on_chunks=None) -> str:
+    """
+    Plain text of a downloaded text/docx/pdf file (bytes or path; CPU-bound, run off the
+    event loop). With `on_chunks`, vector store chunks are handed to it batch by batch
+    while extraction is still running, instead of after the whole file is parsed.
+    """
+    sections = []
+
+    def collect():
+        for section in iter_sections(kind, source):
+            sections.append(section)
+            yield section
+
+    if on_chunks is None:
+        for _ in collect():
+            pass
+    else:
+        for chunks in iter_chunks(collect(), INGEST_CHUNK_TOKENS, INGEST_CHUNK_OVERLAP):
+            on_chunks(chunks)
+    return "".join(sections)
+
+
+def chunk_metadata(user_id, channel_id, team_id, file_id, uploaded_at) -> dict:
+    """Vector store metadata of one uploaded file's chunks (namespace = team + user)."""
+    return {
+        "user": user_id,
+        "channel": channel_id,
+        "team": team_id,
+        "file_id": file_id,
+        "uploaded_at": uploaded_at,
+    }
+
+
+def upload_chunks(uploaded_files, user_id, channel_id, team_id, uploaded_at):
+    """
+    Chunks of every uploaded file plus per-chunk metadata for the ingestion queue.
+    `uploaded_files` holds (file id, extracted text).
+    """
+    chunks, metadatas = [], []
+    for file_id, file_text in uploaded_files:
+        if isinstance(file_text, str) and file_text.strip():
+            file_chunks = split_text(file_text, chunk_tokens=INGEST_CHUNK_TOKENS, overlap_tokens=INGEST_CHUNK_OVERLAP)
+            chunks.extend(file_chunks)
+            metadatas.extend([chunk_metadata(user_id, channel_id, team_id, file_id, uploaded_at)] * len(file_chunks))
+    return chunks, metadatas
+
+
+def answer_blocks(text: str) -> list[dict]:
+    """Answer section followed by the feedback buttons."""
+    return [
+        {"type": "section", "text": {"type": "mrkdwn", "text": text}},
+        {"type": "actions", "elements": [
+            {"type": "button", "text": {"type": "plain_text", "text": "👍"}, "value": "thumbs_up", "action_id": "feedback_like"},
+            {"type": "button", "text": {"type": "plain_text", "text": "👎"}, "value": "thumbs_down", "action_id": "feedback_dislike"},
+            {"type": "button", "text": {"type": "plain_text", "text": "❌"}, "value": "irrelevant", "action_id": "feedback_error"}
+        ]}
+    ]
+
+
+class StreamThrottle:
+    """
+    Paces chat_update calls for an answer streamed into a Slack message: the first delta
+    is shown at once, later ones every `every_tokens` deltas or `interval` seconds. A
+    `ratelimited` reply from Slack holds updates back for its Retry-After.
+    """
+
+    def __init__(self, every_tokens: int = STREAM_UPDATE_TOKENS, interval: float = STREAM_UPDATE_INTERVAL):
+        self.every_tokens = every_tokens
+        self.interval = interval
+        self.updates = 0
+        self._started = time.perf_counter()
+        self._pending = 0
+        self._last = 0.0
+        self._blocked_until = 0.0
+
+    def add(self) -> bool:
+        """Count one streamed delta; True when the message should be updated now."""
+        self._pending += 1
+        now = time.perf_counter()
+        if now < self._blocked_until:
+            return False
+        return self.updates == 0 or self._pending >= self.every_tokens or now - self._last >= self.interval
+
+    def sent(self):
+        if self.updates == 0:
+            metrics.observe("stream.first_update", (time.perf_counter() - self._started) * 1000)
+        self.updates += 1
+        self._pending = 0
+        self._last = time.perf_counter()
+        metrics.incr("stream.updates")
+
+    def rate_limited(self, err) -> bool:
+        """Back off after a `ratelimited` SlackApiError; False for any other error."""
+        if err.response.get("error") != "ratelimited":
+            return False
+        self._blocked_until = time.perf_counter() + float(err.response.headers.get("Retry-After", 1))
+        metrics.incr("stream.rate_limited")
+        return True
@@ -1,63 +1,85 @@
 # app/slack_listener.py
+#
+# Threaded Bolt app (SLACK_ASYNC_MODE=false); async_slack_listener.py is the asyncio twin.
 
 import os
-import requests
-from io import BytesIO
-from docx import Document
-from PIL import Image
-import pytesseract
-import fitz
+import threading
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from app.utils.slack_utils import is_admin
-from .openai_utils import ask_gpt, analyze_image_with_llm
+from app.utils.slack_utils import is_admin, slack_directory
+from .openai_utils import ask_gpt, ask_gpt_stream
+from .image_pipeline import analyze_image
 from dotenv import load_dotenv
-from app.db.supabase_client import get_user_interactions, save_interaction
+from app.db.supabase_client import save_interaction, update_feedback
 from slack_sdk.errors import SlackApiError
-from .db.prompt_repo import update_system_prompt
+from .db.prompt_repo import update_system_prompt, get_system_prompt_record
 from slack_bolt.context.respond import Respond
 from slack_sdk.web import WebClient
 from app.db.supabase_client import clear_user_interactions
 from app.db.supabase_client import clear_all_interactions
-
-# ------------------ LangChain RAG implementation ----------------
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.config import STREAM_ANSWERS, SLACK_CACHE_PREWARM, SLACK_ADMIN_TTL, QUERY_ROUTING
+from app.slack_common import (
+    BUSY_TEXT,
+    ERROR_TEXT,
+    FEEDBACK_MAP,
+    STREAM_CURSOR,
+    StreamThrottle,
+    answer_blocks,
+    chunk_metadata,
+    extract_document_text,
+    file_kind,
+    upload_chunks,
+)
 
 # ----------------------------------- #
 # Vector store
-from app.vector_store_utils import add_to_vector_store, clear_vector_store, load_vector_store
+from app.vector_store_utils import clear_vector_store
+from app.ingestion import ingestion_queue
+from app.extraction import ExtractionLimitError
+from app.downloads import DownloadError, FileTooLargeError, download_all
+from app.extraction_cache import extraction_cache
+from app.process_response import needs_map_reduce, process_document_in_chunks
+from app.query_router import route_query
+from app.history import conversation_history
+from app.dispatcher import message_dispatcher
 
 load_dotenv()
 
 slack_app = App(token=os.getenv("SLACK_BOT_TOKEN"))
 
-# Tokenizer-aware chunking function
-def split_text_into_chunks(text, chunk_size=3000, chunk_overlap=200):
-    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4",
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    return splitter.split_text(text)
-
 
 # ----------------- SLACK LISTENER -----------------
 @slack_app.event("message")
 def handle_user_message(body, client, logger):
+    """
+    Bolt acks the event as soon as this returns; the actual work runs on the dispatcher's
+    worker pool, one message at a time per user.
+    """
+    event = body.get("event", {})
+    if event.get("subtype", "") == "bot_message":
+        return
+
+    key = (body.get("team_id") or event.get("team"), event.get("user"))
+    if not message_dispatcher.submit(key, process_user_message, body, client, logger):
+        logger.warning(f"⚠️ Dispatcher full, rejecting message from {event.get('user')}")
+        client.chat_postMessage(
+            channel=event.get("channel"),
+            thread_ts=event.get("thread_ts", event.get("ts")),
+            text=BUSY_TEXT
+        )
+
+
+def process_user_message(body, client, logger):
     try:
-        load_vector_store()
         event = body.get("event", {})
-        subtype = event.get("subtype", "")
         user_id = event.get("user")
         raw_text = event.get("text", "")
         message_text = raw_text.strip() if isinstance(raw_text, str) else ""
-        files = event.get("files", [])
+        files = event.get("files") or []
         channel_id = event.get("channel")
+        team_id = body.get("team_id") or event.get("team")
         thread_ts = event.get("thread_ts", event.get("ts"))
 
-        if subtype == "bot_message":
-            return
-
         thinking_msg = client.chat_postMessage(
             channel=channel_id,
             thread_ts=thread_ts,
@@ -66,104 +88,147 @@ def handle_user_message(body, client, logger):
         thinking_ts = thinking_msg["ts"]
 
         extracted_texts = []
-        headers = {"Authorization": f"Bearer {os.getenv('SLACK_BOT_TOKEN')}"}
-
-        for f in files or []:
+        uploaded_files = []  # (file id, text) for the vector store; parsed documents stream in instead
+
+        # Files read before come from the extraction cache; the rest are downloaded
+        # concurrently, then read in message order
+        kinds = [file_kind(f) for f in files]
+        cached = [extraction_cache.get(f) if kind else None for f, kind in zip(files, kinds)]
+        downloads = iter(download_all([f for f, kind, text in zip(files, kinds, cached) if kind and text is None]))
+
+        for f, kind, file_text in zip(files, kinds, cached):
+            filename = f.get("name")
+            if not kind:
+                unsupported = f.get("filetype") or f.get("mimetype")
+                logger.warning(f"⚠️ Unsupported file type: {unsupported}")
+                extracted_texts.append(f"[Unsupported file type: {unsupported}]")
+                continue
+
+            download = next(downloads) if file_text is None else None
             try:
-                file_url = f.get("url_private_download")
-                filetype = (f.get("filetype") or "").lower()
-                mimetype = (f.get("mimetype") or "").lower()
-                filename = f.get("name")
-                logger.info(f"📥 Downloading: {filename}")
-                resp = requests.get(file_url, headers=headers)
-                if resp.status_code != 200:
-                    logger.error(f"❌ Failed to download {filename} (status {resp.status_code})")
-                    continue
-
-                is_image = filetype in ["png", "jpg", "jpeg"] or mimetype.startswith("image/")
-
-                if filetype == "text" or mimetype in ["text/plain"]:
-                    extracted_texts.append(resp.text)
-
-                elif filetype == "docx" or mimetype in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-                    doc = Document(BytesIO(resp.content))
-                    extracted_texts.append("\n".join(p.text for p in doc.paragraphs))
-
-                elif filetype == "pdf" or mimetype == "application/pdf":
-                    import fitz
-                    pdf = fitz.open(stream=BytesIO(resp.content), filetype="pdf")
-                    extracted_texts.append("".join([page.get_text() for page in pdf]))
-
-                elif is_image:
-                    # --- GPT Vision analysis ---
-                    print(resp.content)
-                    gpt_image_text = analyze_image_with_llm(resp.content)
-                    print(gpt_image_text)
-                    print("*************---------------------*************")
-                    extracted_texts.append(gpt_image_text)
-
-                    user_info = client.users_info(user=user_id)
-                    team_info = client.team_info()
-                    save_interaction(
+                if isinstance(download, Exception):
+                    raise download
+                if download is not None:
+                    logger.info(f"📥 Downloaded: {filename} ({download.size} bytes)")
+                    # The same content may have been read before under another file id
+                    file_text = extraction_cache.get(f, download.sha256)
+
+                streamed = False
+                if file_text is not None:
+                    logger.info(f"♻️ Cached text for: {filename}")
+                elif kind == "image":
+                    # --- Local OCR, GPT Vision when OCR falls short ---
+                    file_text = analyze_image(download.read())
+                    extraction_cache.put(f, download.sha256, kind, file_text)
+                else:
+                    # Chunks are queued for embedding while the document is still being parsed
+                    metadata = chunk_metadata(user_id, channel_id, team_id, f.get("id"), event.get("ts"))
+                    file_text = extract_document_text(
+                        kind,
+                        download.source,
+                        on_chunks=lambda chunks, m=metadata: ingestion_queue.submit(
+                            chunks, upload_id=thinking_ts, metadatas=[m] * len(chunks)
+                        ),
+                    )
+                    extraction_cache.put(f, download.sha256, kind, file_text)
+                    streamed = True
+
+                extracted_texts.append(file_text)
+                if not streamed:
+                    uploaded_files.append((f.get("id"), file_text))
+
+                if kind == "image":
+                    saved = save_interaction(
                         slack_user_id=user_id,
-                        slack_user_name=user_info["user"]["real_name"],
-                        organization=team_info["team"]["name"],
-                        message_text=gpt_image_text,
+                        slack_user_name=slack_directory.user(client, user_id)["real_name"],
+                        organization=slack_directory.team(client)["name"],
+                        message_text=file_text,
                         extracted_text=None,
                         response_text=None,
                         prompt_version="RAG-GPT4",
                         slack_ts=thinking_ts
                     )
-                else:
-                    logger.warning(f"⚠️ Unsupported file type: {filetype or mimetype}")
-                    extracted_texts.append(f"[Unsupported file type: {filetype or mimetype}]")
+                    conversation_history.append(user_id, saved)
 
+            except (FileTooLargeError, ExtractionLimitError) as limit_err:
+                logger.warning(f"⚠️ Skipped {filename}: {limit_err}")
+                extracted_texts.append(f"[Skipped {filename}: file too large to read]")
+            except DownloadError as download_err:
+                logger.error(f"❌ Failed to download {download_err}")
             except Exception as file_err:
                 logger.error(f"❌ Error processing {filename}: {file_err}")
+            finally:
+                if download is not None and not isinstance(download, Exception):
+                    download.close()
 
         # Combine extracted text
         extracted_combined_text = "\n\n".join([t for t in extracted_texts if isinstance(t, str)])
 
-        # Add to vector store if we have text
-        if extracted_combined_text.strip():
-            chunks = split_text_into_chunks(extracted_combined_text, chunk_size=5000, chunk_overlap=300)
-            add_to_vector_store(chunks)
+        # Queue for background embedding if we have text (status: GET /ingestion/<thinking_ts>)
+        chunks, metadatas = upload_chunks(uploaded_files, user_id, channel_id, team_id, event.get("ts"))
+        if chunks:
+            ingestion_queue.submit(chunks, upload_id=thinking_ts, metadatas=metadatas)
+
+        # Route locally: decides whether the answer searches the vector store
+        route = None
+        if QUERY_ROUTING:
+            route = route_query(
+                message_text,
+                has_documents=any(kind and kind != "image" for kind in kinds),
+                has_images="image" in kinds,
+            )
 
-        # Ask GPT
-        final_response = ask_gpt(
-            user_message=message_text,
-            file_text=extracted_combined_text,
-            slack_user_id=user_id
-        )
+        # Ask GPT (the prompt version is recorded with the interaction)
+        system_prompt = get_system_prompt_record()
+        if needs_map_reduce(extracted_combined_text):
+            # Too large for one request: answer chunk by chunk (map-reduce)
+            final_response = process_document_in_chunks(
+                extracted_combined_text,
+                message_text,
+                user_id,
+                team_id=team_id,
+                system_prompt=system_prompt
+            )
+        elif STREAM_ANSWERS:
+            # Shown in the thinking message as it is generated
+            final_response = stream_answer(client, channel_id, thinking_ts, ask_gpt_stream(
+                user_message=message_text,
+                file_text=extracted_combined_text,
+                slack_user_id=user_id,
+                team_id=team_id,
+                system_prompt=system_prompt,
+                route=route
+            ))
+        else:
+            final_response = ask_gpt(
+                user_message=message_text,
+                file_text=extracted_combined_text,
+                slack_user_id=user_id,
+                team_id=team_id,
+                system_prompt=system_prompt,
+                route=route
+            )
 
         # Update Slack message
         client.chat_update(
             channel=channel_id,
             ts=thinking_ts,
             text=final_response,
-            blocks=[
-                {"type": "section", "text": {"type": "mrkdwn", "text": final_response}},
-                {"type": "actions", "elements": [
-                    {"type": "button", "text": {"type": "plain_text", "text": "👍"}, "value": "thumbs_up", "action_id": "feedback_like"},
-                    {"type": "button", "text": {"type": "plain_text", "text": "👎"}, "value": "thumbs_down", "action_id": "feedback_dislike"},
-                    {"type": "button", "text": {"type": "plain_text", "text": "❌"}, "value": "irrelevant", "action_id": "feedback_error"}
-                ]}
-            ]
+            blocks=answer_blocks(final_response)
         )
 
         # Save full interaction
-        user_info = client.users_info(user=user_id)
-        team_info = client.team_info()
-        save_interaction(
+        saved = save_interaction(
             slack_user_id=user_id,
-            slack_user_name=user_info["user"]["real_name"],
-            organization=team_info["team"]["name"],
+            slack_user_name=slack_directory.user(client, user_id)["real_name"],
+            organization=slack_directory.team(client)["name"],
             message_text=message_text,
             extracted_text=extracted_combined_text,
             response_text=final_response,
-            prompt_version="RAG-GPT4",
+            prompt_version=f"RAG-GPT4:{system_prompt.version}",
             slack_ts=thinking_ts
         )
+        conversation_history.append(user_id, saved)
 
     except Exception as e:
         logger.error(f"❌ Error handling message: {e}")
@@ -171,13 +236,28 @@ def handle_user_message(body, client, logger):
             client.chat_postMessage(
                 channel=channel_id,
                 thread_ts=thread_ts,
-                text="❌ Something went wrong while processing your message."
+                text=ERROR_TEXT
             )
         except Exception as inner:
             logger.error(f"❌ Failed to send fallback message: {inner}")
 
 
 
+def stream_answer(client, channel_id, ts, deltas) -> str:
+    """Write the answer into the message at `ts` while it streams in; returns the full answer."""
+    throttle, parts = StreamThrottle(), []
+    for delta in deltas:
+        parts.append(delta)
+        if throttle.add():
+            try:
+                client.chat_update(channel=channel_id, ts=ts, text="".join(parts) + STREAM_CURSOR)
+                throttle.sent()
+            except SlackApiError as e:
+                if not throttle.rate_limited(e):
+                    raise
+    return "".join(parts).strip()
+
+
 @slack_app.command("/update")
 def handle_update_prompt_command(ack, body, respond: Respond, client: WebClient):
     ack()
@@ -189,10 +269,10 @@ def handle_update_prompt_command(ack, body, respond: Respond, client: WebClient)
         respond("⚠️ Please provide a new prompt.")
         return
     try:
-        # Fetch user info from Slack
-        user_info = client.users_info(user=user_id)
-        is_admin = user_info["user"]["is_admin"]
-        is_owner = user_info["user"].get("is_owner", False)
+        # Fetch user info from Slack (admin flags no older than SLACK_ADMIN_TTL)
+        user_info = slack_directory.user(client, user_id, max_age=SLACK_ADMIN_TTL)
+        is_admin = user_info["is_admin"]
+        is_owner = user_info.get("is_owner", False)
 
         if not (is_admin or is_owner):
             respond("❌ You are not authorized to update the system prompt.")
@@ -217,19 +297,12 @@ def handle_update_prompt_command(ack, body, respond: Respond, client: WebClient)
 def handle_feedback(ack, body, action, client, logger):
     ack()  # Acknowledge the button click
 
-    feedback_map = {
-        "feedback_like": "👍",
-        "feedback_dislike": "👎",
-        "feedback_error": "❌"
-    }
-
-    feedback = feedback_map[action["action_id"]]
+    feedback = FEEDBACK_MAP[action["action_id"]]
     user_id = body["user"]["id"]
     message_ts = body["message"]["ts"]
 
     try:
         # Update the record in Supabase using `message_ts` as a key
-        from app.db.supabase_client import update_feedback
         update_feedback(message_ts, feedback)
 
         client.chat_postEphemeral(
@@ -247,10 +320,11 @@ def handle_clear_command(ack, body, respond):
 
     user_id = body["user_id"]
     success = clear_user_interactions(user_id)
-    clearVector = clear_vector_store()
+    conversation_history.clear(user_id)
+    clearVector = clear_vector_store(user_id=user_id, team_id=body.get("team_id"))
 
     if success and clearVector:
-        respond(f"🧹 Your chat history has been cleared from memory.")
+        respond(f"🧹 Your chat history and uploaded documents have been cleared from memory.")
     else:
         respond(f"❌ Failed to clear your chat history. Please try again later.")
 
@@ -265,6 +339,7 @@ def handle_clear_all_command(ack, body, client, respond):
         return
 
     success = clear_all_interactions()
+    conversation_history.clear()
     
 
     if success:
@@ -273,7 +348,29 @@ def handle_clear_all_command(ack, body, client, respond):
         respond("❌ Failed to clear all interactions. Please try again later.")
 
 
+# ----------------- DIRECTORY UPDATES -----------------
+@slack_app.event("user_change")
+def handle_user_change(event):
+    slack_directory.put_user(event["user"])
+
+
+@slack_app.event("team_rename")
+def handle_team_rename(event):
+    slack_directory.invalidate_team()
+
+
+def prewarm_directory():
+    try:
+        slack_directory.prewarm(slack_app.client)
+    except Exception as e:
+        print(f"❌ Failed to prewarm the Slack user cache: {e}")
+
+
 # 🔁 Start the socket mode handler
-def start_socket_mode():
+def start_socket_mode() -> SocketModeHandler:
+    """Connect and return; the handler keeps running on its own threads."""
     handler = SocketModeHandler(slack_app, os.getenv("SLACK_APP_TOKEN"))
-    handler.start()
+    handler.connect()
+    if SLACK_CACHE_PREWARM:
+        threading.Thread(target=prewarm_directory, name="slack-prewarm", daemon=True).start()
+    return handler
@@ -0,0 +1,86 @@
+# app/utils/metrics.py
+
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Samples kept per timer for percentile estimates
+MAX_SAMPLES = 1024
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timers = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "samples": deque(maxlen=MAX_SAMPLES)})
+
+
+def incr(name: str, value: int = 1):
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] += value
+
+
+def gauge(name: str, value: float):
+    """Set a point-in-time value (queue depth, jobs in flight, ...)."""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, ms: float):
+    """Record one latency sample (milliseconds)."""
+    with _lock:
+        t = _timers[name]
+        t["count"] += 1
+        t["total_ms"] += ms
+        t["max_ms"] = max(t["max_ms"], ms)
+        t["samples"].append(ms)
+
+
+@contextmanager
+def timed(name: str):
+    """Time the wrapped block into the named timer."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000)
+
+
+def hit_rate(prefix: str) -> float:
+    """Fraction of `<prefix>.hits` over `<prefix>.hits + <prefix>.misses`."""
+    with _lock:
+        hits = _counters.get(f"{prefix}.hits", 0)
+        misses = _counters.get(f"{prefix}.misses", 0)
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def snapshot() -> dict:
+    """All counters and timer summaries, e.g. for the /metrics endpoint."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        timers = {}
+        for name, t in _timers.items():
+            samples = list(t["samples"])
+            timers[name] = {
+                "count": t["count"],
+                "avg_ms": round(t["total_ms"] / t["count"], 3) if t["count"] else 0.0,
+                "p50_ms": round(_percentile(samples, 0.50), 3),
+                "p95_ms": round(_percentile(samples, 0.95), 3),
+                "max_ms": round(t["max_ms"], 3),
+            }
+    return {"counters": counters, "gauges": gauges, "timers": timers}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timers.clear()
@@ -1,11 +1,135 @@
+import time
+import threading
+from collections import OrderedDict
+
 from slack_sdk import WebClient
 
+from app.config import SLACK_CACHE_TTL, SLACK_CACHE_USERS, SLACK_ADMIN_TTL
+from app.utils import metrics
+
+
+class SlackDirectory:
+    """
+    Cached Slack user profiles (users_info) and workspace info (team_info). Entries expire
+    after `ttl` seconds; profiles are replaced on user_change events and can be loaded in
+    bulk with users_list at startup. Admin checks pass a much shorter `max_age`
+    (SLACK_ADMIN_TTL) so permissions are not served from an hour-old profile.
+    """
+
+    def __init__(self, ttl: float = SLACK_CACHE_TTL, max_users: int = SLACK_CACHE_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._users = OrderedDict()  # user id -> (profile, loaded at), least recently used first
+        self._team = None  # (team, loaded at)
+        self._lock = threading.Lock()
+
+    # ----------------- PUBLIC API -----------------
+    def user(self, client: WebClient, user_id: str, max_age: float = None) -> dict:
+        """The users_info `user` object, refetched when the cached one is older than `max_age` (default: ttl)."""
+        user = self._cached_user(user_id, max_age)
+        if user is None:
+            user = client.users_info(user=user_id)["user"]
+            self.put_user(user)
+        return user
+
+    async def user_async(self, client, user_id: str, max_age: float = None) -> dict:
+        user = self._cached_user(user_id, max_age)
+        if user is None:
+            user = (await client.users_info(user=user_id))["user"]
+            self.put_user(user)
+        return user
+
+    def team(self, client: WebClient) -> dict:
+        """The team_info `team` object of the bot's workspace."""
+        team = self._cached_team()
+        if team is None:
+            team = client.team_info()["team"]
+            self._team = (team, time.monotonic())
+        return team
+
+    async def team_async(self, client) -> dict:
+        team = self._cached_team()
+        if team is None:
+            team = (await client.team_info())["team"]
+            self._team = (team, time.monotonic())
+        return team
+
+    def put_user(self, user: dict):
+        """Store a full user object (users_info, users_list or a user_change event)."""
+        with self._lock:
+            self._users[user["id"]] = (user, time.monotonic())
+            self._users.move_to_end(user["id"])
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate_team(self):
+        self._team = None
+
+    def prewarm(self, client: WebClient):
+        """Load every workspace member with users_list (paginated)."""
+        cursor, count = None, 0
+        while True:
+            page = client.users_list(limit=200, cursor=cursor)
+            for user in page["members"]:
+                self.put_user(user)
+                count += 1
+            cursor = (page.get("response_metadata") or {}).get("next_cursor")
+            if not cursor or count >= self.max_users:
+                break
+        metrics.incr("slack_cache.prewarmed", count)
+
+    async def prewarm_async(self, client):
+        cursor, count = None, 0
+        while True:
+            page = await client.users_list(limit=200, cursor=cursor)
+            for user in page["members"]:
+                self.put_user(user)
+                count += 1
+            cursor = (page.get("response_metadata") or {}).get("next_cursor")
+            if not cursor or count >= self.max_users:
+                break
+        metrics.incr("slack_cache.prewarmed", count)
+
+    # ----------------- INTERNALS -----------------
+    def _cached_user(self, user_id: str, max_age: float = None) -> dict | None:
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or time.monotonic() - entry[1] >= max_age:
+                metrics.incr("slack_cache.misses")
+                return None
+            self._users.move_to_end(user_id)
+        metrics.incr("slack_cache.hits")
+        return entry[0]
+
+    def _cached_team(self) -> dict | None:
+        entry = self._team
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            metrics.incr("slack_cache.misses")
+            return None
+        metrics.incr("slack_cache.hits")
+        return entry[0]
+
+
+slack_directory = SlackDirectory()
+
+
+def _admin(user: dict) -> bool:
+    return bool(user.get("is_admin") or user.get("is_owner"))
+
 
 def is_admin(user_id: str, client: WebClient) -> bool:
+    """Admin or owner, from a profile at most SLACK_ADMIN_TTL seconds old (fresh by default)."""
+    try:
+        return _admin(slack_directory.user(client, user_id, max_age=SLACK_ADMIN_TTL))
+    except Exception as e:
+        print(f"❌ Failed to check user permissions: {e}")
+        return False
+
+
+async def is_admin_async(user_id: str, client) -> bool:
     try:
-        user_info = client.users_info(user=user_id)
-        is_admin = user_info["user"]["is_admin"] or user_info["user"]["is_owner"]
-        return is_admin
+        return _admin(await slack_directory.user_async(client, user_id, max_age=SLACK_ADMIN_TTL))
     except Exception as e:
         print(f"❌ Failed to check user permissions: {e}")
         return False
@@ -0,0 +1,25 @@
+# app/utils/tokens.py
+
+import tiktoken
+
+_encoding = None
+
+
+def encoding() -> tiktoken.Encoding:
+    """The chat model's tokenizer, loaded on first use."""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.encoding_for_model("gpt-4")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(encoding().encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """`text` cut to at most `max_tokens` tokens (marked with an ellipsis when cut)."""
+    tokens = encoding().encode(text or "", disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text or ""
+    return encoding().decode(tokens[:max_tokens]) + " …"
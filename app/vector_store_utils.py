@@ -1,93 +1,777 @@
 import os
-from langchain.vectorstores import FAISS
-from langchain.embeddings.openai import OpenAIEmbeddings
+import time
+import pickle
 import shutil
+import threading
+from contextlib import contextmanager
+import faiss
+import numpy as np
+
+from app.config import (
+    VECTOR_STORE_CHECK_INTERVAL,
+    WAL_FSYNC,
+    WAL_COMPACT_MIN_MB,
+    WAL_COMPACT_RATIO,
+    WAL_COMPACT_INTERVAL,
+    NAMESPACE_BRUTE_FORCE_MAX,
+    TOMBSTONE_REBUILD_RATIO,
+    RAG_TOP_K,
+    RAG_FETCH_K,
+    RAG_MIN_SCORE,
+    RAG_LOG_SCORES,
+    HYBRID_SEARCH,
+    LEXICAL_FAST_PATH,
+    LEXICAL_FAST_PATH_MAX_WORDS,
+    QUERY_EMBED_CACHE_SIZE,
+)
+from app.answer_cache import normalize_query
+from app.embedding_cache import QueryEmbeddingCache
+from app.embeddings import get_embedding_model
+from app.chunk_store import ChunkStore, SHARED_NAMESPACE, fingerprint, namespace_key
+from app.ann_index import (
+    ADD_BATCH,
+    build_index,
+    index_kind,
+    needs_rebuild,
+    new_index,
+    search_params,
+    supports_remove,
+    target_kind,
+    tune,
+)
+from app.index_persistence import (
+    CURRENT_FILE,
+    WAL_DIR,
+    WriteAheadLog,
+    encode_record,
+    read_current,
+    write_file,
+    write_snapshot,
+    publish,
+    snapshot_bytes,
+)
+from app.lexical_index import LexicalIndex, identifiers
+from app.retrieval import cosine_scores, rrf, select
+from app.utils import metrics
+
 # Path to save/load FAISS index
 FAISS_FOLDER = "faiss_index"
-
-# Global vector store
-vector_store = None
+INDEX_FILE = "index.faiss"
+# LangChain save_local() layout (FAISS index + pickled docstore); imported once, then rewritten
+INDEX_FILES = (INDEX_FILE, "index.pkl")
+# Snapshot chunks added to the keyword index per batch when it is rebuilt after a load
+LEXICAL_BUILD_BATCH = 4096
 
 # Embedding model
-embedding_model = OpenAIEmbeddings()
+embedding_model = get_embedding_model()
+query_embeddings = QueryEmbeddingCache(QUERY_EMBED_CACHE_SIZE)
 
-def load_vector_store():
+
+class VectorStoreManager:
     """
-    Load FAISS vector store from disk if it exists.
+    Process-wide owner of the FAISS index and its memory-mapped chunk store.
+    Loads the index once and only reloads it when the files on disk actually change.
+    New vectors are appended to a write-ahead log; a background compactor folds the
+    log into an atomically published base snapshot.
+    Vector ids are chunk ids: the text for a search hit is ChunkStore.get(id).
+    With HYBRID_SEARCH, a BM25 keyword index over the same chunk ids is kept alongside.
     """
-    global vector_store
-    if os.path.exists(os.path.join(FAISS_FOLDER, "index.faiss")):
-        vector_store = FAISS.load_local(
-            FAISS_FOLDER, 
-            embedding_model, 
-            allow_dangerous_deserialization=True
+
+    def __init__(
+        self,
+        folder: str,
+        embeddings,
+        check_interval: float = VECTOR_STORE_CHECK_INTERVAL,
+        fsync: bool = WAL_FSYNC,
+        compact_min_bytes: int = int(WAL_COMPACT_MIN_MB * 1024 * 1024),
+        compact_ratio: float = WAL_COMPACT_RATIO,
+    ):
+        self.folder = folder
+        self.embeddings = embeddings
+        self.check_interval = check_interval
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_ratio = compact_ratio
+        self.generation = 0  # bumped every time the in-memory store is replaced
+        self._index = None
+        self._chunks = ChunkStore()
+        self._lexical = self._empty_lexical()  # rebuilt on every load
+        self._migrate = False  # legacy pickle layout imported, not yet rewritten
+        self._disk_signature = None
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+        self._wal = WriteAheadLog(os.path.join(folder, WAL_DIR), fsync=fsync)
+        self._wal_seq = 0  # last WAL segment already folded into the base snapshot
+        self._wal_bytes = 0
+        self._snapshot_bytes = 0
+        self._epoch = 0  # bumped by clear() so an in-flight compaction is discarded
+        self._compact_lock = threading.Lock()
+        self._compact_requested = threading.Event()
+        self._compactor = None
+        self._stopping = threading.Event()
+
+    def _signature(self):
+        """Sizes/mtimes of CURRENT, legacy index files and WAL segments, or None if nothing is on disk."""
+        parts = []
+        for name in (CURRENT_FILE,) + INDEX_FILES:
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                continue
+            parts.append((name, st.st_mtime_ns, st.st_size))
+        for _, path in self._wal.segments():
+            try:
+                parts.append((os.path.basename(path), os.path.getsize(path)))
+            except FileNotFoundError:
+                continue
+        return tuple(parts) or None
+
+    # ----------------- LOAD / RECOVERY -----------------
+    def _load_base(self):
+        self._index, self._chunks, self._migrate = None, ChunkStore(), False
+        self._lexical = LexicalIndex() if HYBRID_SEARCH else None
+        current = read_current(self.folder)
+        if current is not None:
+            self._wal_seq = current["wal_seq"]
+            self._snapshot_bytes = snapshot_bytes(self.folder, current["snapshot"])
+            if current["snapshot"] is None:
+                return
+            path = os.path.join(self.folder, current["snapshot"])
+        elif all(os.path.exists(os.path.join(self.folder, name)) for name in INDEX_FILES):
+            self._wal_seq = 0
+            self._snapshot_bytes = sum(os.path.getsize(os.path.join(self.folder, n)) for n in INDEX_FILES)
+            path = self.folder
+        else:
+            self._wal_seq = 0
+            self._snapshot_bytes = 0
+            return
+
+        if os.path.exists(os.path.join(path, INDEX_FILES[1])):
+            self._import_legacy(path)
+        else:
+            self._index = tune(faiss.read_index(os.path.join(path, INDEX_FILE)))
+            self._chunks = ChunkStore(path)
+            if self._chunks.missing_vectors:
+                # Snapshot from before raw vectors were stored: recover them from the flat index
+                ids = faiss.vector_to_array(self._index.id_map)
+                vectors = faiss.downcast_index(self._index.index).reconstruct_n(0, self._index.ntotal)
+                self._chunks.set_base_vectors(vectors[np.argsort(ids)])
+                self._migrate = True
+
+    def _import_legacy(self, path: str):
+        """
+        One-time import of a LangChain save_local() snapshot (pickled docstore).
+        The next compaction rewrites it in the chunk-store format and deletes the pickle.
+        """
+        with open(os.path.join(path, INDEX_FILES[1]), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        flat = faiss.read_index(os.path.join(path, INDEX_FILE))
+        if flat.ntotal:
+            texts = [docstore.search(index_to_docstore_id[i]).page_content for i in range(flat.ntotal)]
+            vectors = flat.reconstruct_n(0, flat.ntotal)
+            self._apply([({"op": "add", "id": i, "text": t}, v) for i, (t, v) in enumerate(zip(texts, vectors))])
+        self._migrate = True
+        self._compact_requested.set()
+        print(f"📦 Imported {flat.ntotal} chunks from the legacy pickle docstore.")
+
+    def _new_index(self, dim: int):
+        # Types that need training start flat; compaction promotes them once there is enough data
+        return tune(new_index(target_kind(len(self._chunks)), dim))
+
+    def _apply(self, records):
+        """Apply (meta, vector) WAL records, adds and deletes, to the in-memory index and chunk store."""
+        adds = []
+        for meta, vector in records:
+            if meta["op"] == "delete":
+                self._apply_adds(adds)
+                adds = []
+                self._apply_delete(meta["ids"])
+            else:
+                adds.append((meta, vector))
+        self._apply_adds(adds)
+
+    def _apply_adds(self, records):
+        if not records:
+            return
+        next_id = self._chunks.next_id
+        for meta, _ in records:
+            if not isinstance(meta["id"], int):  # WAL written before chunk ids were integers
+                meta["id"] = next_id
+            next_id += 1
+        vectors = np.asarray([vector for _, vector in records], dtype=np.float32)
+        if self._index is None:
+            self._index = self._new_index(vectors.shape[1])
+        self._index.add_with_ids(vectors, np.array([meta["id"] for meta, _ in records], dtype=np.int64))
+        for (meta, _), vector in zip(records, vectors):
+            self._chunks.add(meta["id"], meta["text"], vector, meta.get("metadata"))
+        if self._lexical is not None:
+            self._lexical.add_many([(meta["id"], meta["text"]) for meta, _ in records])
+
+    def _apply_delete(self, chunk_ids):
+        self._chunks.delete(chunk_ids)
+        if self._index is not None and supports_remove(self._index):
+            self._index.remove_ids(np.asarray(chunk_ids, dtype=np.int64))
+
+    def load(self, force: bool = False):
+        """
+        Load the store from disk unless the in-memory copy is already up to date.
+        Recovery = base snapshot + replay of every newer WAL segment.
+        """
+        with self._lock:
+            signature = self._signature()
+            self._last_check = time.monotonic()
+            if not force and signature == self._disk_signature:
+                return self._index
+
+            self._wal.close()
+            self._load_base()
+            records = list(self._wal.replay(self._wal_seq))
+            if records:
+                self._apply(records)
+                print(f"🔁 Replayed {len(records)} WAL records into the vector store.")
+            self._wal_bytes = self._wal.size_bytes()
+
+            self._disk_signature = self._signature()
+            self.generation += 1
+            self._build_lexical()
+            return self._index
+
+    @staticmethod
+    def _empty_lexical() -> LexicalIndex | None:
+        if not HYBRID_SEARCH:
+            return None
+        lexical = LexicalIndex()
+        lexical.ready.set()
+        return lexical
+
+    def _build_lexical(self):
+        """
+        Add the base snapshot's chunks to the keyword index on a background thread (chunks
+        replayed from the WAL or written later are added as they are applied). Keyword
+        search is used once it is complete; a newer load abandons it.
+        """
+        lexical, chunks = self._lexical, self._chunks
+        if lexical is None:
+            return
+        if not chunks.base_count:
+            lexical.ready.set()
+            return
+
+        def build():
+            start = time.perf_counter()
+            for begin in range(0, chunks.base_count, LEXICAL_BUILD_BATCH):
+                if self._lexical is not lexical:
+                    return
+                ids = range(begin, min(begin + LEXICAL_BUILD_BATCH, chunks.base_count))
+                lexical.add_many(zip(ids, chunks.get_many(ids)))
+            elapsed = time.perf_counter() - start
+            metrics.observe("vector_store.lexical_build", elapsed * 1000)
+            print(f"🔤 Indexed {len(lexical)} chunks for keyword search in {elapsed:.1f}s.")
+            lexical.ready.set()
+
+        threading.Thread(target=build, name="lexical-index-build", daemon=True).start()
+
+    def filter_new(self, chunks: list[str], namespace: str = SHARED_NAMESPACE) -> list[str]:
+        """
+        Drop chunks that are already in the namespace or repeated within `chunks`.
+        """
+        return [chunks[pos] for pos in self.new_positions([(chunk, namespace) for chunk in chunks])]
+
+    def new_positions(self, keys: list[tuple[str, str]]) -> list[int]:
+        """Positions of (text, namespace) keys neither stored yet nor repeated earlier in `keys`."""
+        seen = set()
+        positions = []
+        for pos, (text, namespace) in enumerate(keys):
+            fp = fingerprint(text, namespace)
+            if fp not in seen and not self._chunks.contains(fp):
+                seen.add(fp)
+                positions.append(pos)
+        return positions
+
+    def get(self):
+        """
+        Return the resident index, re-checking the disk at most every `check_interval` seconds.
+        """
+        if time.monotonic() - self._last_check >= self.check_interval:
+            return self.load()
+        return self._index
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def namespaces(self, team_id: str = None) -> list[str]:
+        return self._chunks.namespaces(team_id)
+
+    def search(self, vector, k: int, namespaces: list[str] = None) -> list[tuple[int, float]]:
+        """
+        (chunk id, L2 distance) of the k nearest chunks, optionally only within `namespaces`.
+        Small namespaces are scanned exactly over their own vectors; larger ones search the
+        shared index restricted to the namespace's id set.
+        """
+        index = self.get()
+        if index is None or index.ntotal == 0:
+            return []
+        query = np.asarray([vector], dtype=np.float32)
+
+        with self._lock:
+            chunks = self._chunks
+            allowed = None if namespaces is None else chunks.ids_for(namespaces)
+            if allowed is None:
+                # HNSW still holds deleted vectors until its next rebuild: over-fetch past them
+                stale = max(0, self._index.ntotal - chunks.live_count)
+                distances, ids = self._index.search(query, min(self._index.ntotal, k + stale))
+            elif len(allowed) > NAMESPACE_BRUTE_FORCE_MAX:
+                params = search_params(self._index, faiss.IDSelectorBatch(allowed))
+                distances, ids = self._index.search(query, k, params=params)
+        if allowed is not None and len(allowed) <= NAMESPACE_BRUTE_FORCE_MAX:
+            if not len(allowed):
+                return []
+            with metrics.timed("vector_store.scoped_scan"):
+                distances = ((chunks.vectors(allowed) - query) ** 2).sum(axis=1)
+                top = np.argsort(distances)[:k]
+            return [(int(allowed[i]), float(distances[i])) for i in top]
+
+        hits = [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i != -1 and not chunks.is_deleted(int(i))]
+        return hits[:k]
+
+    def get_chunks(self, chunk_ids) -> list[str]:
+        """Texts for the given chunk ids; only these are paged in from the chunk store."""
+        chunks = self._chunks
+        return [t for t in chunks.get_many(chunk_ids) if t is not None]
+
+    def get_vectors(self, chunk_ids) -> np.ndarray:
+        """Stored (exact) vectors for the given chunk ids, one row each."""
+        return self._chunks.vectors(chunk_ids)
+
+    @property
+    def lexical_ready(self) -> bool:
+        lexical = self._lexical
+        return lexical is not None and lexical.ready.is_set()
+
+    def lexical_search(self, query: str, k: int, namespaces: list[str] = None) -> list[tuple[int, float]] | None:
+        """
+        (chunk id, BM25 score) of the k best keyword matches, optionally only within
+        `namespaces`; None while the keyword index is off or still being built.
+        """
+        self.get()
+        lexical = self._lexical
+        if lexical is None or not lexical.ready.is_set():
+            return None
+        with self._lock:
+            chunks = self._chunks
+            allowed = None if namespaces is None else chunks.ids_for(namespaces)
+        if allowed is not None and not len(allowed):
+            return []
+        with metrics.timed("vector_store.lexical_search"):
+            return lexical.search(query, k, allowed, exclude=chunks.is_deleted)
+
+    def lexical_containing(self, terms: list[str], chunk_ids) -> set[int]:
+        """The given chunk ids whose text contains every one of `terms`."""
+        lexical = self._lexical
+        return lexical.containing(terms, chunk_ids) if lexical is not None else set()
+
+    # ----------------- WRITES -----------------
+    def add_texts(self, chunks: list[str], metadatas: list[dict] = None):
+        metadatas = metadatas or [None] * len(chunks)
+        fresh = self.new_positions([(chunk, namespace_key(m)) for chunk, m in zip(chunks, metadatas)])
+        if fresh:
+            texts = [chunks[pos] for pos in fresh]
+            self.add_embeddings(list(zip(texts, self.embeddings.embed_documents(texts))), [metadatas[pos] for pos in fresh])
+
+    def add_embeddings(self, text_embeddings: list[tuple[str, list[float]]], metadatas: list[dict] = None):
+        """
+        Append pre-computed (text, vector) pairs, e.g. from the background ingestion queue,
+        with optional per-chunk metadata (user, channel, team, file id, upload time).
+        The pairs are made durable in the WAL before they become searchable.
+        """
+        metadatas = metadatas or [None] * len(text_embeddings)
+        with self._lock:
+            self.load()
+            keys = [(text, namespace_key(m)) for (text, _), m in zip(text_embeddings, metadatas)]
+            records = []
+            for pos in self.new_positions(keys):
+                text, vector = text_embeddings[pos]
+                meta = {"op": "add", "id": self._chunks.next_id + len(records), "text": text}
+                if metadatas[pos]:
+                    meta["metadata"] = metadatas[pos]
+                records.append((meta, vector))
+            if records:
+                self._write(records)
+
+    def delete_namespace(self, namespace: str) -> int:
+        """
+        Delete every chunk of one namespace; returns how many were removed.
+        Vectors are dropped from the index with remove_ids (HNSW filters them until its
+        next rebuild), so nothing else is re-embedded or rebuilt.
+        """
+        with self._lock:
+            self.load()
+            chunk_ids = self._chunks.ids_for([namespace])
+            if not len(chunk_ids):
+                return 0
+            self._write([({"op": "delete", "ids": chunk_ids.tolist()}, None)])
+            self.generation += 1
+            metrics.incr("vector_store.deleted_chunks", len(chunk_ids))
+            return len(chunk_ids)
+
+    def _write(self, records):
+        """Make records durable in the WAL, then apply them. Caller holds the lock."""
+        written = self._wal.append([encode_record(meta, vector) for meta, vector in records], min_seq=self._wal_seq)
+        self._wal_bytes += written
+        metrics.incr("vector_store.wal_bytes", written)
+
+        if self._index is None:
+            self.generation += 1
+        self._apply(records)
+        # Our own write must not trigger a reload on the next check
+        self._disk_signature = self._signature()
+
+        if self._needs_compaction():
+            self._compact_requested.set()
+
+    def _needs_rebuild(self) -> bool:
+        """
+        True when the index type should change, or when deleted chunks still held by the
+        index (HNSW cannot remove) exceed TOMBSTONE_REBUILD_RATIO of it.
+        """
+        if self._index is None:
+            return False
+        if needs_rebuild(self._index, self._chunks.live_count):
+            return True
+        stale = self._index.ntotal - self._chunks.live_count
+        return stale > 0 and stale > TOMBSTONE_REBUILD_RATIO * self._index.ntotal
+
+    def _needs_compaction(self) -> bool:
+        return (
+            self._migrate
+            or self._needs_rebuild()
+            or self._wal_bytes >= max(self.compact_min_bytes, self.compact_ratio * self._snapshot_bytes)
         )
-    else:
-        vector_store = None
+
+    def compact(self) -> bool:
+        """
+        Fold the WAL into a new base snapshot and publish it atomically.
+        When the chunk count calls for a different index type (or a retrained IVF), the
+        new index is built here from the stored vectors and swapped in on publish.
+        Only the index copy and the tail list are taken under the store lock; training and
+        file writes happen outside it while searches and appends continue.
+        """
+        with self._compact_lock:
+            with self._lock:
+                wal_seq = self._wal.rotate()
+                if wal_seq is None:
+                    segments = self._wal.segments()
+                    if not segments and not self._migrate and not self._needs_rebuild():
+                        return False
+                    wal_seq = max([self._wal_seq] + [seq for seq, _ in segments])
+                epoch = self._epoch
+                chunks = self._chunks
+                tail = chunks.tail_items()
+                deleted = chunks.deleted_ids()
+                covered = chunks.next_id
+                rebuild = self._needs_rebuild()
+                live = chunks.live_ids(covered - 1) if rebuild else None
+                index_bytes = None
+                if self._index is not None and not rebuild:
+                    index_bytes = faiss.serialize_index(self._index).tobytes()
+
+            start = time.perf_counter()
+            rebuilt = None
+            if rebuild:
+                kind = target_kind(len(live))
+                print(f"🏗️ Rebuilding vector index as {kind} for {len(live)} chunks...")
+                rebuilt = build_index(
+                    kind, chunks.dim, len(live),
+                    lambda size: chunks.sample_vectors(size, live),
+                    chunks.iter_vectors(live, ADD_BATCH),
+                )
+                index_bytes = faiss.serialize_index(rebuilt).tobytes()
+                metrics.observe("vector_store.index_rebuild", (time.perf_counter() - start) * 1000)
+
+            def writer(directory):
+                write_file(os.path.join(directory, INDEX_FILE), index_bytes)
+                chunks.write_snapshot(directory, tail, deleted)
+
+            name = write_snapshot(self.folder, writer, wal_seq) if index_bytes is not None else None
+
+            with self._lock:
+                if epoch != self._epoch:
+                    # clear() ran meanwhile; this snapshot must not resurrect the old data
+                    if name:
+                        shutil.rmtree(os.path.join(self.folder, name), ignore_errors=True)
+                    return False
+                publish(self.folder, name, wal_seq)
+                self._wal.drop_through(wal_seq)
+                self._remove_legacy_files()
+                if name:
+                    # Re-base on the new snapshot, keeping chunks added and deleted during the write
+                    rebased = self._chunks.rebase(os.path.join(self.folder, name))
+                    if rebuilt is not None:
+                        late = [item for item in rebased.tail_items() if item[0] >= covered]
+                        if late:
+                            rebuilt.add_with_ids(
+                                np.asarray([v for _, _, v, _ in late], dtype=np.float32),
+                                np.array([i for i, _, _, _ in late], dtype=np.int64),
+                            )
+                        late_deleted = rebased.deleted_ids()
+                        if late_deleted and supports_remove(rebuilt):
+                            rebuilt.remove_ids(np.fromiter(late_deleted, dtype=np.int64))
+                        self._index = rebuilt
+                        print(f"✅ Vector index is now {index_kind(rebuilt)}.")
+                    self._chunks = rebased
+                self._migrate = False
+                self._wal_seq = wal_seq
+                self._wal_bytes = self._wal.size_bytes()
+                self._snapshot_bytes = snapshot_bytes(self.folder, name)
+                self._disk_signature = self._signature()
+
+            metrics.observe("vector_store.compaction", (time.perf_counter() - start) * 1000)
+            print(f"🗜️ Compacted vector store into {name or 'an empty snapshot'}.")
+            return True
+
+    def _remove_legacy_files(self):
+        for name in INDEX_FILES:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+
+    def save(self):
+        """Force a snapshot of everything written so far."""
+        self.compact()
+
+    def clear(self) -> bool:
+        """
+        Publish an empty store atomically, then drop the old snapshot and WAL segments.
+        """
+        with self._lock:
+            try:
+                self._epoch += 1
+                self._wal.rotate()
+                wal_seq = max([self._wal_seq] + [seq for seq, _ in self._wal.segments()])
+                publish(self.folder, None, wal_seq)
+                self._wal.drop_through(wal_seq)
+                self._remove_legacy_files()
+            except Exception as e:
+                print(f"⚠️ Failed to clear vector store: {e}")
+                return False
+
+            self._index = None
+            self._chunks = ChunkStore()
+            self._lexical = self._empty_lexical()
+            self._migrate = False
+            self._wal_seq = wal_seq
+            self._wal_bytes = 0
+            self._snapshot_bytes = 0
+            self._disk_signature = self._signature()
+            self.generation += 1
+            print("✅ Vector store cleared successfully.")
+            return True
+
+    # ----------------- BACKGROUND COMPACTION -----------------
+    def start_compactor(self, interval: float = WAL_COMPACT_INTERVAL):
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._stopping.clear()
+
+        def run():
+            while not self._stopping.is_set():
+                self._compact_requested.wait(interval)
+                self._compact_requested.clear()
+                if self._stopping.is_set():
+                    break
+                try:
+                    if self._needs_compaction():
+                        self.compact()
+                except Exception as e:
+                    print(f"⚠️ Vector store compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=run, name="vector-store-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        self._stopping.set()
+        self._compact_requested.set()
+        if self._compactor:
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            self._wal.close()
+
+
+# Global vector store manager
+manager = VectorStoreManager(FAISS_FOLDER, embedding_model)
+
+
+def load_vector_store():
+    """
+    Load FAISS vector store from disk if it exists (no-op if already resident and unchanged).
+    """
+    return manager.load()
+
 
 def save_vector_store():
     """
-    Save FAISS vector store to disk.
+    Snapshot the FAISS vector store to disk (normally done by the background compactor).
     """
-    global vector_store
-    if vector_store:
-        vector_store.save_local(FAISS_FOLDER)
+    manager.save()
 
-def add_to_vector_store(chunks: list[str]):
+
+def add_to_vector_store(chunks: list[str], metadata: dict = None):
     """
     Append new chunks to the existing vector store instead of overwriting.
+    `metadata` (user, channel, team, file_id, uploaded_at) tags every chunk and decides its namespace.
     """
-    global vector_store
-
     if not chunks:
         return
 
-    # Ensure we have the existing store loaded
-    load_vector_store()
+    manager.add_texts(chunks, [metadata] * len(chunks) if metadata else None)
+
+
+def search_namespaces(user_id: str = None, team_id: str = None, scope: str = "user") -> list[str] | None:
+    """
+    Namespaces a caller may search: their own uploads ("user") or their whole workspace's
+    ("team"), plus chunks uploaded before namespaces existed. None = unscoped.
+    """
+    if not user_id and not team_id:
+        return None
+    if scope == "team" and team_id:
+        return manager.namespaces(team_id) + [SHARED_NAMESPACE]
+    return [namespace_key({"user": user_id, "team": team_id}), SHARED_NAMESPACE]
+
+
+def embed_query(query: str) -> list[float]:
+    """
+    Embedding of a user query, reused from the query embedding cache when the same
+    normalized text (case, punctuation, spacing) was embedded before.
+    """
+    key = normalize_query(query)
+    vector = query_embeddings.get(key)
+    if vector is None:
+        with metrics.timed("rag.embed_request"):
+            vector = embedding_model.embed_query(query)
+        query_embeddings.put(key, vector)
+    return vector
+
 
-    if vector_store:
-        # Append to existing index
-        vector_store.add_texts(chunks)
-    else:
-        # Create new index
-        vector_store = FAISS.from_texts(chunks, embedding_model)
+@contextmanager
+def _stage(stages: dict, name: str):
+    """Add the time spent in a retrieval stage to `stages[name]` (ms)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
 
-    save_vector_store()
 
-def query_vector_store(query: str, k: int = 10) -> str:
+def is_lookup(query: str) -> bool:
+    """A short query naming an identifier (invoice / contract number, code): see retrieve()."""
+    return LEXICAL_FAST_PATH and len(query.split()) <= LEXICAL_FAST_PATH_MAX_WORDS and bool(identifiers(query))
+
+
+def retrieve(query: str, k: int = RAG_TOP_K, user_id: str = None, team_id: str = None, scope: str = "user", vector=None):
     """
-    Retrieve top-k relevant chunks for a query.
+    (query vector, chunk ids, context text) for a query, from the caller's namespaces when
+    given. The RAG_FETCH_K nearest chunks and, with HYBRID_SEARCH, the RAG_FETCH_K best
+    BM25 matches are ranked by reciprocal-rank fusion; a candidate is relevant when its
+    cosine score reaches RAG_MIN_SCORE or it contains every identifier in the query. The
+    relevant ones are diversified and cut to the context token budget (app/retrieval.py).
+    A lookup (is_lookup) passed without `vector` whose identifiers are found verbatim is
+    answered from those keyword matches alone, without an embedding call (vector None).
+    Otherwise the query is embedded with embed_query() unless `vector` is passed.
+    No context when the store is empty or nothing is relevant. Stage timers: rag.embed,
+    rag.search (FAISS + BM25) and rag.fetch (chunk texts).
     """
-    global vector_store
+    if manager.get() is None:
+        metrics.incr("rag.empty_store")
+        return vector, [], ""
 
-    if vector_store is None:
-        load_vector_store()
+    namespaces = search_namespaces(user_id, team_id, scope)
+    fetch_k = max(k, RAG_FETCH_K)
+    stages = {}
 
-    if vector_store is None:
-        return "⚠️ Vector store is empty. Please upload documents first."
+    def fetch(chunk_ids):
+        with _stage(stages, "fetch"):
+            return manager.get_chunks(chunk_ids)
 
-    retriever = vector_store.as_retriever(search_kwargs={"k": k})
-    docs = retriever.get_relevant_documents(query)
-    return "\n\n".join([doc.page_content for doc in docs])
+    with metrics.timed("rag.retrieve"):
+        with _stage(stages, "search"):
+            lexical = manager.lexical_search(query, fetch_k, namespaces) or []
+            lexical_ids = [chunk_id for chunk_id, _ in lexical]
+            terms = identifiers(query)
+            exact = manager.lexical_containing(terms, lexical_ids) if terms and lexical_ids else set()
 
+        if exact and vector is None and is_lookup(query):
+            mode = "lexical"
+            bm25 = dict(lexical)
+            candidate_ids = [chunk_id for chunk_id in lexical_ids if chunk_id in exact]
+            relevance = np.array([bm25[chunk_id] for chunk_id in candidate_ids])
+            relevance /= relevance.max()
+            selection = select(candidate_ids, manager.get_vectors(candidate_ids), relevance, fetch, k=k)
+            cosine = {}
+        else:
+            if vector is None:
+                with _stage(stages, "embed"):
+                    vector = embed_query(query)
+            with _stage(stages, "search"):
+                dense_ids = [chunk_id for chunk_id, _ in manager.search(vector, fetch_k, namespaces)]
+            candidate_ids = list(dict.fromkeys(dense_ids + lexical_ids))
+            candidate_vectors = manager.get_vectors(candidate_ids) if candidate_ids else None
+            cosine = dict(zip(candidate_ids, cosine_scores(vector, candidate_vectors).tolist())) if candidate_ids else {}
+            if lexical_ids:
+                mode = "hybrid"
+                fused = rrf([sorted(dense_ids, key=cosine.get, reverse=True), lexical_ids])
+                relevance = np.array([fused[chunk_id] for chunk_id in candidate_ids])
+                relevance /= relevance.max()
+            else:
+                mode = "dense"
+                relevance = np.array([cosine[chunk_id] for chunk_id in candidate_ids])
+            keep = [pos for pos, chunk_id in enumerate(candidate_ids) if cosine[chunk_id] >= RAG_MIN_SCORE or chunk_id in exact]
+            selection = select(
+                [candidate_ids[pos] for pos in keep],
+                candidate_vectors[keep] if keep else None,
+                relevance[keep] if keep else None,
+                fetch,
+                k=k,
+            )
 
+    for name, ms in stages.items():
+        metrics.observe(f"rag.{name}", ms)
+    metrics.incr("rag.retrievals")
+    metrics.incr(f"rag.{mode}")
+    metrics.incr("rag.chunks", len(selection.chunk_ids))
+    metrics.incr("rag.context_tokens", selection.tokens)
+    if not selection.chunk_ids:
+        metrics.incr("rag.no_relevant")
+    if RAG_LOG_SCORES:
+        top = f"{max(cosine.values()):.3f}" if cosine else "-"
+        timing = ", ".join(f"{name} {stages.get(name, 0.0):.1f}" for name in ("embed", "search", "fetch"))
+        print(
+            f"🔎 Retrieval ({mode}): {len(candidate_ids)} candidates (best cosine {top}, {len(lexical_ids)} keyword, "
+            f"{len(exact)} with the identifiers), {len(selection.chunk_ids)} injected (scores {selection.scores}, "
+            f"min cosine {RAG_MIN_SCORE}), {selection.tokens} context tokens; ms: {timing}"
+        )
+    return vector, selection.chunk_ids, selection.context
 
 
-def clear_vector_store():
+def query_vector_store(query: str, k: int = RAG_TOP_K, user_id: str = None, team_id: str = None, scope: str = "user") -> str:
     """
-    Clear the FAISS vector store both in memory and on disk.
+    Context text of the relevant chunks for a query (see retrieve); empty when none are.
     """
-    global vector_store
-    vector_store = None  # Reset in-memory store
+    return retrieve(query, k, user_id, team_id, scope)[2]
 
-    if os.path.exists(FAISS_FOLDER):
+
+def clear_vector_store(user_id: str = None, team_id: str = None):
+    """
+    Delete one user's chunks (only their vectors are removed from the index), or clear the
+    whole FAISS vector store both in memory and on disk when no user is given.
+    """
+    if user_id:
         try:
-            shutil.rmtree(FAISS_FOLDER)  # Delete entire folder
-            print("✅ Vector store cleared successfully.")
-            return True
+            deleted = manager.delete_namespace(namespace_key({"user": user_id, "team": team_id}))
         except Exception as e:
-            print(f"⚠️ Failed to clear vector store: {e}")
+            print(f"⚠️ Failed to delete vectors for {user_id}: {e}")
             return False
-    else:
-        print("ℹ️ No vector store found to clear.")
+        print(f"🧹 Deleted {deleted} chunks uploaded by {user_id}.")
         return True
+    return manager.clear()
@@ -0,0 +1,78 @@
+# benchmarks/bench_ann_recall.py
+#
+# Recall@k vs. per-query latency of every index type against the exact flat baseline,
+# on synthetic clustered vectors (embeddings of real documents are far from uniform).
+#
+#   python -m benchmarks.bench_ann_recall --n 200000 --dim 1536 --queries 200
+
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+from app.ann_index import INDEX_TYPES, build_index, tune
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int):
+    latencies = []
+    found = 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len(set(ids[0].tolist()) & set(expected.tolist()))
+    return found / truth.size, float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = synthetic_vectors(args.n, args.dim, args.clusters, rng)
+    queries = synthetic_vectors(args.queries, args.dim, args.clusters, np.random.default_rng(1))
+    ids = np.arange(args.n, dtype=np.int64)
+
+    def sample(size):
+        return data[rng.choice(args.n, size, replace=False)]
+
+    print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'index':>10} {'param':>12} {'recall@k':>9} {'p50 ms':>8} {'size MiB':>9} {'build s':>8}")
+
+    truth = None
+    for kind in INDEX_TYPES:
+        start = time.perf_counter()
+        index = build_index(kind, args.dim, args.n, sample, [(ids, data)])
+        build_s = time.perf_counter() - start
+        size_mib = faiss.serialize_index(index).nbytes / 2**20
+
+        if kind == "flat":
+            _, truth = index.search(queries, args.k)
+            sweep = [("exact", {})]
+        elif kind == "hnsw":
+            sweep = [(f"ef={ef}", {"ef_search": ef}) for ef in (16, 32, 64, 128, 256)]
+        else:
+            sweep = [(f"nprobe={p}", {"nprobe": p}) for p in (1, 4, 16, 64)]
+
+        for label, params in sweep:
+            tune(index, **params)
+            recall, p50 = measure(index, queries, truth, args.k)
+            print(f"{kind:>10} {label:>12} {recall:>9.3f} {p50:>8.3f} {size_mib:>9.1f} {build_s:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_chunking.py
+#
+# Chunking throughput on synthetic documents: the old per-word encode loop from
+# process_response, the old LangChain RecursiveCharacterTextSplitter.from_tiktoken_encoder
+# used for ingestion, and app.chunking (batched segment counting + prefix-sum packing).
+#
+#   python -m benchmarks.bench_chunking --mb 10 100 --baselines per_word
+
+import time
+import random
+import argparse
+
+from app.chunking import chunk_text
+from app.utils.tokens import encoding
+
+WORDS = (
+    "the contract revenue quarter payment invoice schedule clause party agreement section "
+    "report forecast amount delivery period notice termination liability warranty"
+).split()
+
+
+def make_text(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    paragraphs, size, target = [], 0, int(megabytes * 1024 * 1024)
+    while size < target:
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + rng.choice(".!?")
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def per_word(text: str, chunk_tokens: int, overlap_tokens: int) -> int:
+    """process_response.split_text_into_chunks before app.chunking (no overlap)."""
+    enc = encoding()
+    chunks, current, current_tokens = [], [], 0
+    for word in text.split():
+        count = len(enc.encode(word))
+        if current_tokens + count > chunk_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [word], count
+        else:
+            current.append(word)
+            current_tokens += count
+    if current:
+        chunks.append(" ".join(current))
+    return len(chunks)
+
+
+def langchain(text: str, chunk_tokens: int, overlap_tokens: int) -> int:
+    """slack_common.split_text_into_chunks before app.chunking."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-4", chunk_size=chunk_tokens, chunk_overlap=overlap_tokens
+    )
+    return len(splitter.split_text(text))
+
+
+def shared(text: str, chunk_tokens: int, overlap_tokens: int) -> int:
+    chunks = chunk_text(text, chunk_tokens, overlap_tokens)
+    # Spans are exact: the first chunk starts the text, the last one ends it
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+    return len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, nargs="+", default=[10])
+    parser.add_argument("--chunk-tokens", type=int, default=5000)
+    parser.add_argument("--overlap", type=int, default=300)
+    parser.add_argument("--baselines", nargs="*", default=["per_word", "langchain"], choices=["per_word", "langchain"])
+    args = parser.parse_args()
+
+    encoding()  # load the tokenizer outside the timings
+    modes = [(name, {"per_word": per_word, "langchain": langchain}[name]) for name in args.baselines]
+    modes.append(("app.chunking", shared))
+
+    print(f"{args.chunk_tokens}-token chunks, {args.overlap}-token overlap")
+    print(f"{'MB':>6} {'mode':>14} {'seconds':>9} {'MB/s':>8} {'chunks':>8}")
+    for megabytes in args.mb:
+        text = make_text(megabytes)
+        for name, fn in modes:
+            start = time.perf_counter()
+            count = fn(text, args.chunk_tokens, args.overlap)
+            elapsed = time.perf_counter() - start
+            print(f"{megabytes:6.1f} {name:>14} {elapsed:9.2f} {megabytes / elapsed:8.2f} {count:8d}")
+
+
+if __name__ == "__main__":
+    main()
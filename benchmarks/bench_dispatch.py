@@ -0,0 +1,123 @@
+# benchmarks/bench_dispatch.py
+#
+# Message throughput with a fake Slack client: every message runs inline on Bolt's
+# listener threads (old path) vs. the listener only submitting it to the JobDispatcher.
+# The simulated handler makes the same calls as process_user_message (thinking message,
+# users_info/team_info, LLM call, chat_update), each sleeping for a configurable latency.
+#
+#   python -m benchmarks.bench_dispatch --messages 400 --users 40 --workers 32
+
+import time
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.dispatcher import JobDispatcher
+from app.utils import metrics
+
+
+class FakeSlackClient:
+    """The WebClient calls the message handler makes, with simulated API latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._ts = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        time.sleep(self.latency)
+
+    def chat_postMessage(self, **kwargs):
+        self._call()
+        with self._lock:
+            self._ts += 1
+            return {"ts": f"{self._ts}.000"}
+
+    def chat_update(self, **kwargs):
+        self._call()
+        return {"ok": True}
+
+    def users_info(self, user):
+        self._call()
+        return {"user": {"real_name": user}}
+
+    def team_info(self):
+        self._call()
+        return {"team": {"name": "bench"}}
+
+
+def make_handler(llm_latency: float, order: dict, lock: threading.Lock):
+    def handle(body, client):
+        event = body["event"]
+        thinking = client.chat_postMessage(channel=event["channel"], text="🤔")
+        time.sleep(llm_latency)  # retrieval + chat completion
+        client.chat_update(channel=event["channel"], ts=thinking["ts"], text="done")
+        client.users_info(user=event["user"])
+        client.team_info()
+        with lock:
+            order[event["user"]].append(event["seq"])
+    return handle
+
+
+def run(mode: str, events, client, args):
+    order, lock = defaultdict(list), threading.Lock()
+    handle = make_handler(args.llm_latency, order, lock)
+    listeners = ThreadPoolExecutor(max_workers=args.listener_threads)  # Bolt's listener pool
+    dispatcher = JobDispatcher(max_workers=args.workers, max_pending=len(events), name=f"bench_{mode}")
+    acks = []
+    received_order, submit_lock = defaultdict(list), threading.Lock()
+
+    def listener(body, received):
+        user = body["event"]["user"]
+        if mode == "inline":
+            with submit_lock:
+                received_order[user].append(body["event"]["seq"])
+            handle(body, client)
+        else:
+            with submit_lock:  # the order the dispatcher sees is the order to preserve
+                received_order[user].append(body["event"]["seq"])
+                dispatcher.submit(user, handle, body, client)
+        acks.append((time.perf_counter() - received) * 1000)
+
+    start = time.perf_counter()
+    for body in events:
+        listeners.submit(listener, body, time.perf_counter())
+    listeners.shutdown(wait=True)
+    dispatcher.wait_idle()
+    elapsed = time.perf_counter() - start
+    dispatcher.stop()
+
+    out_of_order = sum(order[user] != seqs for user, seqs in received_order.items())
+    acks.sort()
+    return elapsed, acks[len(acks) // 2], acks[int(len(acks) * 0.95)], out_of_order
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--listener-threads", type=int, default=10)
+    parser.add_argument("--slack-latency", type=float, default=0.05, help="seconds per Slack API call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM answer")
+    args = parser.parse_args()
+
+    events = [
+        {"team_id": "T1", "event": {"user": f"U{i % args.users}", "channel": "C1", "seq": i, "text": f"question {i}"}}
+        for i in range(args.messages)
+    ]
+    client = FakeSlackClient(args.slack_latency)
+
+    print(f"{args.messages} messages from {args.users} users, {args.listener_threads} listener threads, "
+          f"{args.workers} workers")
+    print(f"{'mode':>10} {'msg/s':>8} {'ack p50 ms':>11} {'ack p95 ms':>11} {'reordered users':>16}")
+    for mode in ("inline", "dispatch"):
+        elapsed, p50, p95, reordered = run(mode, events, client, args)
+        print(f"{mode:>10} {args.messages / elapsed:8.1f} {p50:11.1f} {p95:11.1f} {reordered:16d}")
+    wait = metrics.snapshot()["timers"].get("bench_dispatch.wait", {})
+    print(f"dispatch queue wait: p50 {wait.get('p50_ms', 0):.1f} ms, p95 {wait.get('p95_ms', 0):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_doc_qa.py
+#
+# Wall time of document QA vs. chunk count with a stubbed chat model: the old serial loop
+# (one request per chunk, then one summary request over all answers) vs. DocumentQA's
+# concurrent map and hierarchical reduce. The stub sleeps --llm-latency seconds per request.
+#
+#   python -m benchmarks.bench_doc_qa --chunks 10 50 200 --concurrency 8 --llm-latency 0.2
+
+import os
+import time
+import argparse
+import threading
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")  # the stub never calls the API
+
+from app.chunking import split_text
+from app.process_response import DocumentQA
+from app.utils import metrics
+
+WORDS = "revenue forecast contract clause signed amount payable quarterly report section".split()
+
+
+class StubLLM:
+    def __init__(self, latency: float, answer_words: int):
+        self.latency = latency
+        self.answer = " ".join(WORDS[i % len(WORDS)] for i in range(answer_words))
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, max_tokens: int = 1000) -> str:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return self.answer
+
+
+def make_document(chunks: int, chunk_tokens: int) -> str:
+    # Single-token words, so the document splits into `chunks` chunks
+    words = chunks * chunk_tokens
+    return " ".join(WORDS[i % len(WORDS)] for i in range(words))
+
+
+def run_serial(llm: StubLLM, document: str, chunk_tokens: int) -> None:
+    """process_document_in_chunks before the engine: one ask per chunk, then a summary."""
+    answers = [llm([{"role": "user", "content": chunk}]) for chunk in split_text(document, chunk_tokens)]
+    llm([{"role": "user", "content": "\n\n".join(answers)}])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--chunk-tokens", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per chat request")
+    parser.add_argument("--answer-words", type=int, default=300, help="length of each stub answer")
+    parser.add_argument("--reduce-tokens", type=int, default=12000)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{args.chunk_tokens}-token chunks, {args.llm_latency * 1000:.0f} ms per request, "
+          f"concurrency {args.concurrency}")
+    print(f"{'chunks':>7} {'serial s':>9} {'calls':>6} {'map-reduce s':>13} {'calls':>6} {'reduce levels':>14}")
+    for chunks in args.chunks:
+        document = make_document(chunks, args.chunk_tokens)
+
+        serial, serial_calls = float("nan"), 0
+        if not args.skip_serial:
+            llm = StubLLM(args.llm_latency, args.answer_words)
+            start = time.perf_counter()
+            run_serial(llm, document, args.chunk_tokens)
+            serial, serial_calls = time.perf_counter() - start, llm.calls
+
+        llm = StubLLM(args.llm_latency, args.answer_words)
+        engine = DocumentQA(
+            complete=llm,
+            concurrency=args.concurrency,
+            chunk_tokens=args.chunk_tokens,
+            reduce_tokens=args.reduce_tokens,
+        )
+        metrics.reset()
+        start = time.perf_counter()
+        engine.answer(document, "What does the contract say about payments?", "You are a helpful assistant.")
+        elapsed = time.perf_counter() - start
+        levels = metrics.snapshot()["counters"].get("doc_qa.reduce_levels", 0)
+        print(f"{chunks:7d} {serial:9.2f} {serial_calls:6d} {elapsed:13.2f} {llm.calls:6d} {levels:14d}")
+
+
+if __name__ == "__main__":
+    main()
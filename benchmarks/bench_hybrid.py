@@ -0,0 +1,176 @@
+# benchmarks/bench_hybrid.py
+#
+# Recall and latency of dense, BM25 and hybrid (reciprocal-rank fusion) retrieval, and of
+# the lexical fast path for identifier lookups, on a synthetic corpus of invoice-like
+# chunks of made-up words. The embedder is a local stand-in for a semantic model: synonyms
+# share a vector and tokens with digits carry little weight, as identifiers do in real
+# embeddings.
+# Three query sets, one target chunk each:
+#   id          "what is the status of invoice INV-2024-00042"
+#   paraphrase  words of the target in their other synonym (no word overlap)
+#   keyword     words of the target as written
+# Latency adds --embed-ms for every query embedding (the remote call the fast path skips).
+#
+#   python -m benchmarks.bench_hybrid --chunks 20000 --queries 200
+
+import os
+import time
+import argparse
+import tempfile
+import zlib
+
+import numpy as np
+
+os.environ["EMBEDDING_BACKEND"] = "fake"
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import RAG_FETCH_K
+from app.lexical_index import identifiers
+from app.retrieval import rrf
+from app.vector_store_utils import VectorStoreManager, is_lookup
+
+DIM = 256
+CONCEPTS = 3000
+TOPICS = 50
+WORDS_PER_CHUNK = 40
+
+
+def word(concept: int, synonym: int = 0) -> str:
+    """Letters-only surface form of a concept: ("bcd", "bcdq") are two synonyms of one concept."""
+    letters = ""
+    while True:
+        concept, digit = divmod(concept, 20)
+        letters += "bcdfghjklmnprstvwxyz"[digit]
+        if not concept:
+            break
+    return letters + ("", "q")[synonym]
+
+
+class ConceptEmbeddings(Embeddings):
+    """Sum of per-concept vectors; synonyms share one, identifiers (with digits) weigh 0.05."""
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+        self._vectors = {}
+
+    def _vector(self, token: str) -> np.ndarray:
+        vector = self._vectors.get(token)
+        if vector is None:
+            concept = token[:-1] if token.endswith("q") else token
+            weight = 0.05 if any(c.isdigit() for c in token) else 1.0
+            rng = np.random.default_rng(zlib.crc32(concept.encode("utf-8")))
+            vector = self._vectors[token] = weight * rng.standard_normal(self.dim).astype(np.float32)
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().replace("?", "").split():
+            vector += self._vector(token)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+def corpus(n: int, rng):
+    topics = [rng.choice(CONCEPTS, 60, replace=False) for _ in range(TOPICS)]
+    chunks, words = [], []
+    for i in range(n):
+        concepts = rng.choice(topics[rng.integers(TOPICS)], WORDS_PER_CHUNK)
+        words.append(concepts)
+        body = " ".join(word(c) for c in concepts)
+        chunks.append(f"invoice INV-2024-{i:05d} customer {word(CONCEPTS + rng.integers(500))} {body}")
+    return chunks, words
+
+
+def queries(n_chunks: int, words, count: int, rng) -> dict[str, list[tuple[str, int]]]:
+    targets = rng.choice(n_chunks, count, replace=False)
+    sample = lambda t: rng.choice(words[t], 8, replace=False)  # noqa: E731
+    return {
+        "id": [(f"what is the status of invoice INV-2024-{t:05d}", int(t)) for t in targets],
+        "paraphrase": [(" ".join(word(c, 1) for c in sample(t)), int(t)) for t in targets],
+        "keyword": [(" ".join(word(c) for c in sample(t)), int(t)) for t in targets],
+    }
+
+
+def run(manager, embedder, text: str, k: int, embed_ms: float) -> dict[str, tuple[list[int], float]]:
+    """Top-k ids and latency (ms) of each strategy for one query."""
+    results = {}
+
+    start = time.perf_counter()
+    vector = embedder.embed_query(text)
+    dense = [i for i, _ in manager.search(vector, RAG_FETCH_K)]
+    dense_ms = (time.perf_counter() - start) * 1000 + embed_ms
+    results["dense"] = (dense[:k], dense_ms)
+
+    start = time.perf_counter()
+    lexical = [i for i, _ in manager.lexical_search(text, RAG_FETCH_K)]
+    lexical_ms = (time.perf_counter() - start) * 1000
+    results["bm25"] = (lexical[:k], lexical_ms)
+
+    start = time.perf_counter()
+    fused = rrf([dense, lexical])
+    results["hybrid"] = (sorted(fused, key=fused.get, reverse=True)[:k], dense_ms + lexical_ms + (time.perf_counter() - start) * 1000)
+
+    # retrieve(): identifier lookups found verbatim skip the embedding, the rest go hybrid
+    start = time.perf_counter()
+    terms = identifiers(text)
+    exact = manager.lexical_containing(terms, lexical) if terms and is_lookup(text) else set()
+    if exact:
+        results["fast path"] = ([i for i in lexical if i in exact][:k], lexical_ms + (time.perf_counter() - start) * 1000)
+    else:
+        results["fast path"] = (results["hybrid"][0], results["hybrid"][1] + (time.perf_counter() - start) * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200, help="per query set")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-ms", type=float, default=100.0, help="modelled latency of one remote embedding call")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embedder = ConceptEmbeddings()
+    chunks, words = corpus(args.chunks, rng)
+    sets = queries(args.chunks, words, args.queries, rng)
+
+    with tempfile.TemporaryDirectory() as folder:
+        manager = VectorStoreManager(folder, embedder, fsync=False)
+        start = time.perf_counter()
+        for part in range(0, len(chunks), 4096):
+            texts = chunks[part:part + 4096]
+            manager.add_embeddings(list(zip(texts, embedder.embed_documents(texts))))
+        print(f"{len(chunks)} chunks indexed (FAISS + BM25) in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        manager.compact()
+        reloaded = VectorStoreManager(folder, embedder, fsync=False)
+        reloaded.load()
+        while not reloaded.lexical_ready:
+            time.sleep(0.01)
+        print(f"keyword index rebuilt from the snapshot in {time.perf_counter() - start:.1f}s")
+
+        print(f"\nrecall@{args.k} / mean latency per query (ms, {args.embed_ms:.0f} ms per embedding call)")
+        strategies = ("dense", "bm25", "hybrid", "fast path")
+        print(f"{'':>12} " + " ".join(f"{name:>18}" for name in strategies))
+        for name, items in sets.items():
+            found = dict.fromkeys(strategies, 0)
+            latency = dict.fromkeys(strategies, 0.0)
+            for text, target in items:
+                for strategy, (ids, ms) in run(reloaded, embedder, text, args.k, args.embed_ms).items():
+                    found[strategy] += target in ids
+                    latency[strategy] += ms
+            print(f"{name:>12} " + " ".join(
+                f"{found[s] / len(items):>8.3f} {latency[s] / len(items):>8.2f}ms" for s in strategies
+            ))
+        manager.stop_compactor()
+        reloaded.stop_compactor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_ingestion.py
+#
+# Embedding throughput: inline embedding per upload (old listener path) vs. the
+# background IngestionQueue, using the local FakeEmbeddings backend with a simulated
+# per-request latency.
+#
+#   python -m benchmarks.bench_ingestion --uploads 20 --chunks 50 --latency 0.2
+
+import os
+import time
+import argparse
+import tempfile
+
+os.environ["EMBEDDING_BACKEND"] = "fake"
+
+from app.embeddings import FakeEmbeddings
+from app.ingestion import IngestionQueue
+from app.vector_store_utils import VectorStoreManager
+
+
+def make_uploads(n_uploads: int, n_chunks: int) -> list[list[str]]:
+    return [[f"upload {u} chunk {c} " + "lorem ipsum " * 200 for c in range(n_chunks)] for u in range(n_uploads)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per embedding request")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    uploads = make_uploads(args.uploads, args.chunks)
+    total = args.uploads * args.chunks
+    embeddings = FakeEmbeddings(dim=256, latency=args.latency)
+
+    with tempfile.TemporaryDirectory() as folder:
+        manager = VectorStoreManager(folder, embeddings)
+        start = time.perf_counter()
+        for chunks in uploads:
+            # One request per upload, blocking the handler (what add_to_vector_store did)
+            manager.add_texts(chunks)
+        inline = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as folder:
+        manager = VectorStoreManager(folder, embeddings)
+        ingest = IngestionQueue(manager, embeddings, batch_size=args.batch_size, max_workers=args.workers)
+        start = time.perf_counter()
+        ids = [ingest.submit(chunks) for chunks in uploads]
+        handler_ms = (time.perf_counter() - start) * 1000 / len(uploads)
+        for upload_id in ids:
+            ingest.wait(upload_id)
+        queued = time.perf_counter() - start
+        ingest.stop()
+        assert len(manager) == total
+
+    print(f"chunks: {total}  (uploads={args.uploads}, chunks/upload={args.chunks}, latency={args.latency}s)")
+    print(f"inline : {inline:7.2f}s  {total / inline:8.1f} chunks/s")
+    print(f"queue  : {queued:7.2f}s  {total / queued:8.1f} chunks/s  handler blocked {handler_ms:.2f} ms/upload")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_namespaces.py
+#
+# Query latency of a global top-k search vs. a search scoped to one user's namespace,
+# and the cost of clearing one user (remove_ids) vs. rebuilding the store without them.
+#
+#   python -m benchmarks.bench_namespaces --users 50 --chunks 2000 --queries 200
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+os.environ["EMBEDDING_BACKEND"] = "fake"
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+
+from app.vector_store_utils import VectorStoreManager, embedding_model
+
+DIM = 1536
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks per user")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.random((args.queries, DIM), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as folder:
+        manager = VectorStoreManager(folder, embedding_model, fsync=False)
+        for u in range(args.users):
+            vectors = rng.random((args.chunks, DIM), dtype=np.float32)
+            metadata = {"user": f"U{u}", "team": "T1", "channel": "C1"}
+            manager.add_embeddings(
+                [(f"user {u} chunk {i}", vectors[i]) for i in range(args.chunks)],
+                [metadata] * args.chunks,
+            )
+        manager.compact()
+        total = len(manager)
+
+        rows = []
+        for label, namespaces in (("global", None), ("one user", ["T1:U0"])):
+            start = time.perf_counter()
+            for query in queries:
+                manager.search(query, args.k, namespaces)
+            rows.append((label, (time.perf_counter() - start) * 1000 / args.queries))
+
+        start = time.perf_counter()
+        deleted = manager.delete_namespace("T1:U1")
+        delete_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        remaining = manager._chunks.live_ids(total - 1)
+        rebuilt = VectorStoreManager(os.path.join(folder, "rebuild"), embedding_model, fsync=False)
+        for part in range(0, len(remaining), 65536):
+            ids = remaining[part:part + 65536]
+            rebuilt.add_embeddings(list(zip(manager.get_chunks(ids), manager._chunks.vectors(ids))))
+        rebuild_ms = (time.perf_counter() - start) * 1000
+        manager.stop_compactor()
+        rebuilt.stop_compactor()
+
+    print(f"{total} chunks in {args.users} namespaces, k={args.k}")
+    for label, ms in rows:
+        print(f"{label:>10} search : {ms:8.2f} ms/query")
+    print(f"clear one user ({deleted} chunks): remove_ids {delete_ms:8.1f} ms   full rebuild {rebuild_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
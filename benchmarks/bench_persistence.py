@@ -0,0 +1,82 @@
+# benchmarks/bench_persistence.py
+#
+# Ingestion I/O per upload: full save_local() rewrite (old path) vs. WAL append
+# (+ amortized compaction), starting from an index that already holds --base chunks.
+#
+#   python -m benchmarks.bench_persistence --base 50000 --uploads 20 --chunks 20
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+os.environ["EMBEDDING_BACKEND"] = "fake"
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+
+from langchain.vectorstores import FAISS
+from app.vector_store_utils import VectorStoreManager, embedding_model
+
+DIM = 1536
+
+
+def folder_bytes(folder: str) -> int:
+    total = 0
+    for root, _, files in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def random_pairs(rng, prefix: str, n: int):
+    vectors = rng.random((n, DIM), dtype=np.float32)
+    return [(f"{prefix} {i}", vectors[i]) for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base", type=int, default=50_000)
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = random_pairs(rng, "base", args.base)
+    uploads = [random_pairs(rng, f"upload {u}", args.chunks) for u in range(args.uploads)]
+
+    # Old path: append in memory, then save_local() rewrites both files
+    with tempfile.TemporaryDirectory() as folder:
+        store = FAISS.from_embeddings(base, embedding_model)
+        store.save_local(folder)
+        written, start = 0, time.perf_counter()
+        for pairs in uploads:
+            store.add_embeddings(pairs)
+            store.save_local(folder)
+            written += folder_bytes(folder)
+        rewrite_s = time.perf_counter() - start
+
+    # New path: WAL append per upload, compaction whenever the policy asks for it
+    with tempfile.TemporaryDirectory() as folder:
+        manager = VectorStoreManager(folder, embedding_model)
+        manager.add_embeddings(base)
+        manager.compact()
+        wal_written, compactions, start = 0, 0, time.perf_counter()
+        for pairs in uploads:
+            before = manager._wal_bytes
+            manager.add_embeddings(pairs)
+            wal_written += manager._wal_bytes - before
+            if manager._needs_compaction():
+                manager.compact()
+                wal_written += manager._snapshot_bytes
+                compactions += 1
+        wal_s = time.perf_counter() - start
+        manager.stop_compactor()
+
+    print(f"base={args.base} chunks, {args.uploads} uploads x {args.chunks} chunks")
+    print(f"full rewrite : {written / 2**20:9.1f} MiB written  {rewrite_s * 1000 / args.uploads:8.1f} ms/upload")
+    print(f"WAL append   : {wal_written / 2**20:9.1f} MiB written  {wal_s * 1000 / args.uploads:8.1f} ms/upload"
+          f"  ({compactions} compactions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/bench_router.py
+#
+# Accuracy and latency of the local query router (app/query_router.py) against labels from
+# the gpt-4o-mini classifier it replaced. Labeled messages come from a JSONL file of
+# {"text", "label"}, or from logged interactions labeled by the LLM (--from-supabase, needs
+# SUPABASE_* and OPENAI_API_KEY); without either, a small hand-labeled set is used. The
+# router is trained on part of the data and scored on the rest; --save-model writes the
+# trained centroids to ROUTER_MODEL_PATH for the app to load.
+#
+#   python -m benchmarks.bench_router --from-supabase 2000 --save-labels router/labels.jsonl --save-model
+#   python -m benchmarks.bench_router --data router/labels.jsonl
+
+import json
+import time
+import random
+import argparse
+from collections import Counter
+
+from app.config import ROUTER_MODEL_PATH, ROUTER_GENERAL_MARGIN
+from app.query_router import LABELS, SEED_EXAMPLES, QueryRouter
+
+# Not in SEED_EXAMPLES
+HAND_LABELED = [
+    ("hey!", "general"),
+    ("thank you so much", "general"),
+    ("how are you doing today", "general"),
+    ("what's 15% of 240", "general"),
+    ("give me three ideas for a team lunch", "general"),
+    ("what time zone is tokyo in", "general"),
+    ("can you help me rephrase this sentence to sound friendlier", "general"),
+    ("what is a good name for a slack channel about hiring", "general"),
+    ("what does the handbook say about remote work", "document"),
+    ("how many vacation days do new employees get per the policy", "document"),
+    ("what is the renewal date in the lease agreement", "document"),
+    ("summarize section 4 of the report", "document"),
+    ("who are the parties to the contract", "document"),
+    ("what is the late fee in the invoice terms", "document"),
+    ("find the warranty clause in the uploaded pdf", "document"),
+    ("what are the deliverables listed in the statement of work document", "document"),
+    ("what is shown in the screenshot", "image"),
+    ("read me the numbers from the photo", "image"),
+    ("what color is the logo in the picture", "image"),
+    ("transcribe the whiteboard photo", "image"),
+    ("does the chart in the screenshot agree with the report", "mixed"),
+    ("is the amount in the receipt photo the same as in the invoice pdf", "mixed"),
+]
+
+
+def llm_label(text: str) -> str:
+    """The classifier the router replaced (openai_utils.llm_classify)."""
+    from app.openai_utils import client
+
+    try:
+        resp = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a classifier. Return only one word: general, document, image, or mixed."},
+                {"role": "user", "content": text}
+            ],
+            temperature=0
+        )
+        label = resp.choices[0].message.content.strip().lower()
+        if label in LABELS:
+            return label
+    except Exception:
+        pass
+    return "general"
+
+
+def from_supabase(limit: int) -> tuple[list[tuple[str, str]], float]:
+    """Logged messages labeled by the LLM, and the mean LLM latency (ms)."""
+    from app.db.supabase_client import get_recent_interactions
+
+    texts = sorted({row["message_text"] for row in get_recent_interactions(limit) if (row.get("message_text") or "").strip()})
+    start = time.perf_counter()
+    examples = [(text, llm_label(text)) for text in texts]
+    return examples, (time.perf_counter() - start) * 1000 / max(1, len(texts))
+
+
+def report(name: str, router: QueryRouter, test: list[tuple[str, str]]):
+    predicted = [router.predict(text) for text, _ in test]
+    correct = sum(p == label for p, (_, label) in zip(predicted, test))
+    # What the route changes: whether a text-only message searches the vector store, which
+    # it skips only when "general" wins by ROUTER_GENERAL_MARGIN (route_query)
+    skipped = [p == "general" and margin >= ROUTER_GENERAL_MARGIN for p, margin in map(router.predict_margin, (t for t, _ in test))]
+    rag_agree = sum(skip == (label == "general") for skip, (_, label) in zip(skipped, test))
+    lost = sum(skip and label != "general" for skip, (_, label) in zip(skipped, test))
+    print(
+        f"{name:>12}: accuracy {correct / len(test):.3f}, RAG decision agreement {rag_agree / len(test):.3f}, "
+        f"retrieval wrongly skipped {lost} ({len(test)} messages)"
+    )
+    confusion = Counter((label, p) for p, (_, label) in zip(predicted, test))
+    print(f"{'LLM / router':>14} " +" ".join(f"{label:>9}" for label in LABELS))
+    for label in LABELS:
+        print(f"{label:>14} " + " ".join(f"{confusion[(label, p)]:9d}" for p in LABELS))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", help="JSONL of {\"text\", \"label\"}")
+    parser.add_argument("--from-supabase", type=int, default=0, help="label this many logged interactions with the LLM")
+    parser.add_argument("--save-labels", help="write the labeled messages as JSONL")
+    parser.add_argument("--test-fraction", type=float, default=0.3)
+    parser.add_argument("--save-model", action="store_true", help=f"train on all data and write {ROUTER_MODEL_PATH}")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    llm_ms = None
+    if args.data:
+        with open(args.data) as f:
+            examples = [(row["text"], row["label"]) for row in map(json.loads, f) if row.get("label") in LABELS]
+    elif args.from_supabase:
+        examples, llm_ms = from_supabase(args.from_supabase)
+    else:
+        examples = HAND_LABELED
+    if args.save_labels:
+        with open(args.save_labels, "w") as f:
+            for text, label in examples:
+                f.write(json.dumps({"text": text, "label": label}) + "\n")
+    print(f"{len(examples)} labeled messages: {dict(Counter(label for _, label in examples))}")
+
+    shuffled = examples[:]
+    random.Random(args.seed).shuffle(shuffled)
+    if examples is HAND_LABELED:
+        train, test = [], shuffled  # scored against the seed-only model
+    else:
+        cut = int(len(shuffled) * (1 - args.test_fraction))
+        train, test = shuffled[:cut], shuffled[cut:]
+
+    report("seed only", QueryRouter().fit(SEED_EXAMPLES), test)
+    if train:
+        report("trained", QueryRouter().fit(SEED_EXAMPLES + train), test)
+
+    router = QueryRouter().fit(SEED_EXAMPLES + train)
+    texts = [text for text, _ in test] * max(1, 20000 // len(test))
+    start = time.perf_counter()
+    for text in texts:
+        router.predict(text)
+    router_us = (time.perf_counter() - start) * 1e6 / len(texts)
+    llm = f", LLM classifier {llm_ms:.0f} ms" if llm_ms is not None else ""
+    print(f"latency per message: router {router_us:.1f} µs{llm}")
+
+    if args.save_model:
+        QueryRouter().fit(SEED_EXAMPLES + examples).save(ROUTER_MODEL_PATH)
+        print(f"saved {ROUTER_MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
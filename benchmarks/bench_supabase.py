@@ -0,0 +1,120 @@
+# benchmarks/bench_supabase.py
+#
+# Supabase call latency against a local PostgREST stand-in: a fresh connection per call
+# (bare requests.request, the old path) vs. the pooled SupabaseClient, blocking and async.
+# The stub charges --handshake-ms for every new connection (what TCP+TLS setup costs
+# against the hosted API) and answers 503 to every --fail-every'th request to exercise retries.
+#
+#   python -m benchmarks.bench_supabase --calls 200 --handshake-ms 30
+
+import json
+import time
+import asyncio
+import argparse
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.db.rest_client import SupabaseClient
+from app.utils import metrics
+from app.utils.http import close_async_client
+
+
+def make_stub(handshake_ms: float, fail_every: int):
+    state = {"connections": 0, "requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # no delayed-ACK stalls between headers and body
+
+        def setup(self):
+            super().setup()
+            with lock:
+                state["connections"] += 1
+            time.sleep(handshake_ms / 1000)
+
+        def do_GET(self):
+            with lock:
+                state["requests"] += 1
+                fail = fail_every and state["requests"] % fail_every == 0
+            body = json.dumps([{"prompt": "You are a helpful assistant."}]).encode()
+            self.send_response(503 if fail else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+SPEC = {"method": "GET", "path": "/rest/v1/system_prompt", "params": {"limit": "1"}}
+
+
+def run_bare(url, calls):
+    failed = 0
+    for _ in range(calls):
+        response = requests.request("GET", f"{url}{SPEC['path']}", params=SPEC["params"])
+        failed += response.status_code != 200
+    return failed
+
+
+def run_session(client, calls):
+    return sum(client.request(SPEC).status_code != 200 for _ in range(calls))
+
+
+async def run_async(client, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return (await client.request_async(SPEC)).status_code != 200
+
+    try:
+        return sum(await asyncio.gather(*(one() for _ in range(calls))))
+    finally:
+        await close_async_client()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer 503 to every n-th request (0 = never)")
+    parser.add_argument("--concurrency", type=int, default=16, help="async calls in flight")
+    args = parser.parse_args()
+
+    server, state = make_stub(args.handshake_ms, args.fail_every)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    client = SupabaseClient(url, "bench-key", backoff=0.01)
+
+    print(f"{args.calls} calls, {args.handshake_ms:.0f} ms per new connection, fail every {args.fail_every or '-'}")
+    print(f"{'mode':>14} {'calls/s':>9} {'ms/call':>8} {'connections':>12} {'failed':>7}")
+    runs = [
+        ("bare", lambda: run_bare(url, args.calls)),
+        ("session", lambda: run_session(client, args.calls)),
+        ("async", lambda: asyncio.run(run_async(client, args.calls, args.concurrency))),
+    ]
+    for mode, fn in runs:
+        before = state["connections"]
+        start = time.perf_counter()
+        failed = fn()
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>14} {args.calls / elapsed:9.1f} {elapsed * 1000 / args.calls:8.2f} "
+              f"{state['connections'] - before:12d} {failed:7d}")
+
+    timer = metrics.snapshot()["timers"].get("supabase.system_prompt.get", {})
+    print(f"client latency: p50 {timer.get('p50_ms', 0):.1f} ms, p95 {timer.get('p95_ms', 0):.1f} ms, "
+          f"retries (async) {metrics.snapshot()['counters'].get('supabase.retries', 0)}")
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
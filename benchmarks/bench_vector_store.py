@@ -0,0 +1,118 @@
+# benchmarks/bench_vector_store.py
+#
+# Per-message retrieval latency: reloading the FAISS index from disk on every message
+# vs. the resident VectorStoreManager. Columns:
+#   reload/msg   old code: load_local() of the LangChain index, then a search
+#   check/msg    what the manager adds per message: get(), the on-disk change check (run on
+#                every call here, check_interval=0), which should stay flat with size
+#   search/msg   search + text fetch on the resident index (flat, or the ANN index the
+#                store is promoted to at ANN_PROMOTE_THRESHOLD chunks, see ann_index.py)
+#   cold start   first load() of the compacted snapshot
+#
+# The snapshot is built through the store's own compaction, so above ANN_PROMOTE_THRESHOLD
+# it includes IVF training, which dominates the build. On one core: at the default 1536
+# dimensions, 100k chunks take ~4 min and 1M is impractical (hours, ~6 GB per index copy),
+# so sizes up to 100k are supported there; the 1M run is done at --dim 64 (~7 min).
+#
+#   python -m benchmarks.bench_vector_store --sizes 1000,10000,100000
+#   python -m benchmarks.bench_vector_store --sizes 1000,10000,100000,1000000 --dim 64
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+os.environ["EMBEDDING_BACKEND"] = "fake"  # nothing is embedded here; vectors are random
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+
+from langchain.vectorstores import FAISS
+from app.ann_index import index_kind
+from app.vector_store_utils import VectorStoreManager, embedding_model
+
+
+def random_batches(n: int, dim: int, batch: int = 50_000):
+    rng = np.random.default_rng(0)
+    for start in range(0, n, batch):
+        count = min(batch, n - start)
+        vectors = rng.random((count, dim), dtype=np.float32)
+        yield [(f"chunk {start + i}", vectors[i]) for i in range(count)]
+
+
+def build_legacy_index(folder: str, n: int, dim: int):
+    """LangChain save_local() layout that the old code reloaded on every message."""
+    store = None
+    for pairs in random_batches(n, dim):
+        if store is None:
+            store = FAISS.from_embeddings(pairs, embedding_model)
+        else:
+            store.add_embeddings(pairs)
+    store.save_local(folder)
+
+
+def build_snapshot(folder: str, n: int, dim: int):
+    manager = VectorStoreManager(folder, embedding_model, fsync=False)
+    for pairs in random_batches(n, dim):
+        manager.add_embeddings(pairs)
+    manager.compact()
+    manager.stop_compactor()
+
+
+def time_messages(fn, messages: int) -> float:
+    """Median milliseconds per simulated message."""
+    samples = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--messages", type=int, default=20)
+    args = parser.parse_args()
+
+    query = np.random.default_rng(1).random(args.dim, dtype=np.float32).tolist()
+    print(
+        f"{'chunks':>10} {'index':>9} {'build (s)':>10} {'reload/msg (ms)':>16} {'check/msg (ms)':>15} "
+        f"{'search/msg (ms)':>16} {'cold start (ms)':>16}"
+    )
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as legacy, tempfile.TemporaryDirectory() as folder:
+            start = time.perf_counter()
+            build_legacy_index(legacy, n, args.dim)
+            build_snapshot(folder, n, args.dim)
+            build_s = time.perf_counter() - start
+
+            def reload_every_message():
+                store = FAISS.load_local(legacy, embedding_model, allow_dangerous_deserialization=True)
+                store.similarity_search_by_vector(query, k=10)
+
+            start = time.perf_counter()
+            manager = VectorStoreManager(folder, embedding_model, check_interval=0)
+            manager.load()
+            cold_ms = (time.perf_counter() - start) * 1000
+
+            def search():
+                manager.get_chunks([chunk_id for chunk_id, _ in manager.search(query, 10)])
+
+            reload_ms = time_messages(reload_every_message, min(args.messages, 5) if n >= 500_000 else args.messages)
+            check_ms = time_messages(manager.get, args.messages)
+            search_ms = time_messages(search, args.messages)
+            print(
+                f"{n:>10} {index_kind(manager.get()):>9} {build_s:>10.1f} {reload_ms:>16.2f} {check_ms:>15.3f} "
+                f"{search_ms:>16.2f} {cold_ms:>16.2f}"
+            )
+            sys.stdout.flush()
+            manager.stop_compactor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# tests/conftest.py
+
+import os
+
+# Deterministic local embeddings, no on-disk cache: set before any app module is imported
+os.environ.setdefault("EMBEDDING_BACKEND", "fake")
+os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+os.environ.setdefault("OPENAI_API_KEY", "test")  # clients are built at import; tests never call the API
@@ -0,0 +1,97 @@
+# tests/test_answer_cache.py
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import openai_utils
+from app.answer_cache import AnswerCache
+from app.chunk_store import SHARED_NAMESPACE
+from app.db.prompt_repo import SystemPrompt
+from app.vector_store_utils import search_namespaces
+
+
+def make_cache() -> AnswerCache:
+    return AnswerCache(threshold=0.95, ttl=3600, max_entries=100, enabled=True)
+
+
+def test_answers_are_shared_within_a_workspace_only():
+    cache = make_cache()
+    vector = np.ones(8)
+    cache.put(cache.group("T1", "v1", [3, 1, 2]), vector, 1, "answer", 100.0)
+
+    assert cache.get(cache.group("T1", "v1", [1, 2, 3]), vector, 1) == "answer"
+    assert cache.get(cache.group("T2", "v1", [1, 2, 3]), vector, 1) is None
+
+
+def test_questions_without_retrieved_chunks_are_not_cached():
+    cache = make_cache()
+    vector = np.ones(8)
+    assert cache.group("T1", "v1", []) is None
+
+    cache.put(cache.group("T1", "v1", []), vector, 1, "what you said earlier", 100.0)
+    assert cache.get(cache.group("T1", "v1", []), vector, 1) is None
+
+
+def test_prompt_version_and_store_generation_invalidate():
+    cache = make_cache()
+    vector = np.ones(8)
+    cache.put(cache.group("T1", "v1", [1]), vector, 1, "answer", 100.0)
+
+    assert cache.get(cache.group("T1", "v2", [1]), vector, 1) is None
+    assert cache.get(cache.group("T1", "v1", [1]), vector, 2) is None
+    assert cache.get(cache.group("T1", "v1", [1]), vector, 1) is None  # dropped with generation 1
+
+
+def test_older_generation_neither_clears_nor_is_served():
+    cache = make_cache()
+    vector = np.ones(8)
+    group = cache.group("T1", "v1", [1])
+    cache.put(group, vector, 5, "answer", 100.0)
+
+    # A request that read the store before generation 5
+    assert cache.get(cache.group("T1", "v1", [2]), vector, 4) is None
+    assert cache.get(group, vector, 4) is None
+    cache.put(group, vector, 4, "stale answer", 100.0)
+    assert cache.get(group, vector, 5) == "answer"
+
+
+def test_dissimilar_question_misses():
+    cache = make_cache()
+    cache.put(cache.group("T1", "v1", [1]), np.array([1.0, 0.0]), 1, "answer", 100.0)
+    assert cache.get(cache.group("T1", "v1", [1]), np.array([0.0, 1.0]), 1) is None
+    assert cache.get(cache.group("T1", "v1", [1]), np.array([2.0, 0.01]), 1) == "answer"
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    """ask_gpt over shared-namespace chunks, with per-user histories and a recorded LLM."""
+    calls = []
+    monkeypatch.setattr(openai_utils, "answer_cache", make_cache())
+    monkeypatch.setattr(openai_utils, "manager", SimpleNamespace(generation=1))
+    monkeypatch.setattr(openai_utils.conversation_history, "render", lambda user_id: f"history of {user_id}")
+
+    def context_for(user_message, slack_user_id, team_id, route, has_file_text, cacheable):
+        # Both users search their own namespace plus the shared one; the hits are shared chunks
+        assert SHARED_NAMESPACE in search_namespaces(slack_user_id, team_id)
+        return np.ones(8), [7, 9], "Employees get 25 vacation days."
+
+    def create(messages, **kwargs):
+        calls.append(messages)
+        delta = SimpleNamespace(content="25 days.")
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=delta)])])
+
+    monkeypatch.setattr(openai_utils, "context_for", context_for)
+    monkeypatch.setattr(openai_utils.client.chat.completions, "create", create)
+    return calls
+
+
+def test_two_users_share_an_answer_over_the_shared_namespace(chat):
+    prompt = SystemPrompt("You are a helpful assistant.", "v1")
+    first = openai_utils.ask_gpt("How many vacation days do I get?", "", "U_A", "T1", prompt)
+    second = openai_utils.ask_gpt("how many vacation days do i get", "", "U_B", "T1", prompt)
+
+    assert first == second == "25 days."
+    assert len(chat) == 1
+    assert "history of U_A" not in str(chat[0])  # the shared answer is not built from A's history
@@ -0,0 +1,95 @@
+# tests/test_chunking.py
+
+import random
+
+import numpy as np
+import pytest
+
+from app import chunking
+
+# Byte-level vocabulary plus merges, some of which split a 4-byte emoji across tokens
+MERGES = [b"al", b"pha", b"be", b"ta", b"gam", b"ma", b". ", b" \xf0\x9f", b"\x98\x80 ", b"a b"]
+
+
+class FakeEncoding:
+    """Greedy longest-match byte tokenizer standing in for tiktoken."""
+
+    def __init__(self):
+        self.vocab = [bytes([b]) for b in range(256)] + MERGES
+        self.max_token_value = len(self.vocab) - 1
+        self._ids = {token: i for i, token in enumerate(self.vocab)}
+        self._longest = max(len(token) for token in self.vocab)
+
+    def encode_to_numpy(self, text: str, disallowed_special=()) -> np.ndarray:
+        data, ids, i = text.encode("utf-8"), [], 0
+        while i < len(data):
+            for size in range(min(self._longest, len(data) - i), 0, -1):
+                token = self._ids.get(data[i:i + size])
+                if token is not None:
+                    ids.append(token)
+                    i += size
+                    break
+        return np.array(ids, dtype=np.uint32)
+
+    def decode_single_token_bytes(self, token: int) -> bytes:
+        return self.vocab[token]
+
+
+@pytest.fixture(autouse=True)
+def fake_encoding(monkeypatch):
+    enc = FakeEncoding()
+    monkeypatch.setattr(chunking, "encoding", lambda: enc)
+    monkeypatch.setattr(chunking, "_token_bytes", None)
+    yield enc
+
+
+def sample_text(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(["alpha", "beta", "😀", "gamma."]) for _ in range(words))
+
+
+def assert_covers(text: str, chunks, chunk_tokens: int):
+    """Chunks are exact slices that, minus overlaps, cover every character in order."""
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(text)
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start:chunk.end]
+        assert 0 < chunk.tokens <= chunk_tokens
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.start < chunk.start <= previous.end
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunk_tokens, overlap_tokens", [(50, 0), (50, 10), (20, 5), (7, 3)])
+def test_chunks_cover_multibyte_text(seed, chunk_tokens, overlap_tokens):
+    text = sample_text(400, seed)
+    chunks = chunking.chunk_text(text, chunk_tokens, overlap_tokens)
+    assert_covers(text, chunks, chunk_tokens)
+    if not overlap_tokens:
+        assert "".join(chunk.text for chunk in chunks) == text
+
+
+def test_token_counts_match_the_chunk_text(fake_encoding):
+    text = sample_text(400)
+    for chunk in chunking.chunk_text(text, 50, 10):
+        # A chunk may start or end inside a token that straddles a character edge
+        assert abs(chunk.tokens - len(fake_encoding.encode_to_numpy(chunk.text))) <= 2
+
+
+@pytest.mark.parametrize("chunk_tokens, overlap_tokens", [(5, 4), (6, 2), (9, 3)])
+def test_overlap_inside_multibyte_runs(fake_encoding, chunk_tokens, overlap_tokens):
+    # Every emoji is 4 byte tokens: chunk and overlap edges fall inside characters
+    text = "😀" * 40
+    chunks = chunking.chunk_text(text, chunk_tokens, overlap_tokens)
+    assert_covers(text, chunks, chunk_tokens)
+    assert len(chunks) <= len(text)
+    for chunk in chunks:
+        assert chunk.tokens == len(fake_encoding.encode_to_numpy(chunk.text))
+
+
+def test_paragraphs_are_preferred_boundaries():
+    text = "\n\n".join(sample_text(8, seed) for seed in range(30))
+    chunks = chunking.chunk_text(text, 80)
+    assert len(chunks) > 1
+    for chunk in chunks[:-1]:
+        assert chunk.text.endswith("\n\n")
@@ -0,0 +1,113 @@
+# tests/test_ingestion.py
+
+import threading
+
+import pytest
+
+from app.embeddings import FakeEmbeddings
+from app.ingestion import IngestionQueue, estimate_tokens
+from app.vector_store_utils import VectorStoreManager
+
+DIM = 16
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    """FakeEmbeddings that records each batch; `gate` holds batches until set, `error` fails them."""
+
+    def __init__(self, gate: threading.Event = None, error: Exception = None):
+        super().__init__(dim=DIM)
+        self.batches = []
+        self.gate = gate
+        self.error = error
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues, managers = [], []
+
+    def make_queue(embeddings, **kwargs):
+        manager = VectorStoreManager(str(tmp_path), embeddings, fsync=False)
+        kwargs.setdefault("flush_interval", 0.02)
+        ingestion = IngestionQueue(manager, embeddings, **kwargs)
+        queues.append(ingestion)
+        managers.append(manager)
+        return ingestion
+
+    yield make_queue
+    for ingestion in queues:
+        ingestion.stop()
+    for manager in managers:
+        manager.stop_compactor()
+
+
+def chunks(upload: int, count: int = 3) -> list[str]:
+    return [f"upload {upload} chunk {i}: the leave policy grants 25 days a year" for i in range(count)]
+
+
+def test_uploads_are_batched_within_the_budgets(make_queue):
+    embeddings = RecordingEmbeddings()
+    ingestion = make_queue(embeddings, batch_tokens=3 * estimate_tokens(chunks(0)[0]), batch_size=4)
+    metadata = {"user": "U1", "team": "T1"}
+    upload_ids = [ingestion.submit(chunks(u), metadatas=[metadata] * 3) for u in range(5)]
+
+    for upload_id in upload_ids:
+        status = ingestion.wait(upload_id, timeout=5)
+        assert (status["state"], status["total"], status["embedded"], status["failed"]) == ("done", 3, 3, 0)
+    assert len(ingestion.store_manager) == 15
+    assert sorted(text for batch in embeddings.batches for text in batch) == sorted(sum((chunks(u) for u in range(5)), []))
+    for batch in embeddings.batches:
+        assert len(batch) <= 4
+        assert sum(map(estimate_tokens, batch)) <= ingestion.batch_tokens
+    assert len(embeddings.batches) < 15  # coalesced across uploads
+
+
+def test_duplicates_of_queued_and_stored_chunks_are_skipped(make_queue):
+    gate = threading.Event()
+    embeddings = RecordingEmbeddings(gate=gate)
+    ingestion = make_queue(embeddings)
+
+    first = ingestion.submit(chunks(0))
+    in_flight = ingestion.submit(chunks(0) + chunks(1, 1))  # resubmitted while still embedding
+    assert ingestion.get_status(in_flight)["duplicates"] == 3
+    gate.set()
+    assert ingestion.wait(first, timeout=5)["embedded"] == 3
+    assert ingestion.wait(in_flight, timeout=5)["embedded"] == 1
+
+    stored = ingestion.submit(chunks(0))  # resubmitted once stored
+    status = ingestion.get_status(stored)
+    assert (status["state"], status["total"], status["duplicates"]) == ("done", 0, 3)
+    assert len(ingestion.store_manager) == 4
+
+
+def test_streamed_upload_is_requeued_when_more_chunks_arrive(make_queue):
+    ingestion = make_queue(RecordingEmbeddings())
+    upload_id = ingestion.submit(chunks(0), upload_id="doc-1")
+    assert ingestion.wait(upload_id, timeout=5)["state"] == "done"
+
+    assert ingestion.submit(chunks(1), upload_id="doc-1") == "doc-1"
+    assert ingestion.get_status("doc-1")["finished_at"] is None
+    status = ingestion.wait("doc-1", timeout=5)
+    assert (status["state"], status["total"], status["embedded"]) == ("done", 6, 6)
+
+
+def test_failed_batches_mark_the_upload_and_can_be_retried(make_queue):
+    failing = RecordingEmbeddings(error=RuntimeError("rate limited"))
+    ingestion = make_queue(failing)
+    upload_id = ingestion.submit(chunks(0))
+    status = ingestion.wait(upload_id, timeout=5)
+    assert (status["state"], status["failed"], status["error"]) == ("failed", 3, "rate limited")
+    assert len(ingestion.store_manager) == 0
+
+    # Failed chunks are no longer pending, so submitting them again embeds them
+    ingestion.embeddings = RecordingEmbeddings()
+    retry = ingestion.submit(chunks(0))
+    assert ingestion.wait(retry, timeout=5)["embedded"] == 3
+    assert len(ingestion.store_manager) == 3
@@ -0,0 +1,54 @@
+# tests/test_prompt_repo.py
+
+import pytest
+
+from app.db import prompt_repo
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, rows=None):
+        self.status_code = status_code
+        self._rows = rows if rows is not None else []
+        self.text = str(self._rows)
+
+    def json(self):
+        return self._rows
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Requests sent to Supabase; GETs find an empty system_prompt table."""
+    sent = []
+
+    def request(request):
+        sent.append(request["method"])
+        return FakeResponse(200) if request["method"] == "GET" else FakeResponse(201, [{}])
+
+    monkeypatch.setattr(prompt_repo.supabase, "request", request)
+    monkeypatch.setattr(prompt_repo, "_cached", None)
+    return sent
+
+
+def test_default_prompt_is_cached_when_none_is_saved(requests):
+    first = prompt_repo.get_system_prompt_record()
+    second = prompt_repo.get_system_prompt_record()
+    assert first == second == prompt_repo.SystemPrompt(prompt_repo.DEFAULT_SYSTEM_PROMPT, "default")
+    assert requests == ["GET"]
+
+
+def test_update_replaces_the_cached_default(requests):
+    prompt_repo.get_system_prompt_record()
+    assert prompt_repo.update_system_prompt("Answer in French.", "U1")
+    prompt = prompt_repo.get_system_prompt_record()
+    assert prompt.text == "Answer in French."
+    assert prompt.version == prompt_repo.prompt_version("Answer in French.")
+    assert requests == ["GET", "POST"]
+
+
+def test_failed_fetch_is_not_cached(monkeypatch):
+    sent = []
+    monkeypatch.setattr(prompt_repo.supabase, "request", lambda request: sent.append(1) or FakeResponse(500))
+    monkeypatch.setattr(prompt_repo, "_cached", None)
+    assert prompt_repo.get_system_prompt_record().version == "default"
+    prompt_repo.get_system_prompt_record()
+    assert len(sent) == 2
@@ -0,0 +1,31 @@
+# tests/test_query_router.py
+
+import pytest
+
+from app.query_router import route_query, uses_rag
+
+
+@pytest.mark.parametrize("message", ["hi", "hello there", "thanks a lot!", "good morning"])
+def test_small_talk_skips_retrieval(message):
+    route = route_query(message)
+    assert route == "general"
+    assert not uses_rag(route, has_file_text=False)
+
+
+@pytest.mark.parametrize("message", [
+    "How many vacation days do I get?",
+    "what is the capital of france",
+    "what's our expense limit for travel",
+    "what is our leave policy",
+    "who is the CEO of acme",
+])
+def test_questions_keep_retrieval(message):
+    assert uses_rag(route_query(message), has_file_text=False)
+
+
+def test_attachments_decide_the_route():
+    assert route_query("hi", has_documents=True) == "document"
+    assert route_query("hi", has_images=True) == "image"
+    assert route_query("hi", has_documents=True, has_images=True) == "mixed"
+    assert not uses_rag("document", has_file_text=True)
+    assert not uses_rag("image", has_file_text=False)
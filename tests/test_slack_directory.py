@@ -0,0 +1,55 @@
+# tests/test_slack_directory.py
+
+import asyncio
+
+from app.utils import slack_utils
+from app.utils.slack_utils import SlackDirectory
+
+
+class FakeClient:
+    """users_info from a mutable profile, counting calls."""
+
+    def __init__(self, **profile):
+        self.profile = {"id": "U1", "name": "ana", **profile}
+        self.calls = 0
+
+    def users_info(self, user):
+        self.calls += 1
+        return {"user": dict(self.profile)}
+
+
+class FakeAsyncClient(FakeClient):
+    async def users_info(self, user):
+        return FakeClient.users_info(self, user)
+
+
+def test_demoted_admin_loses_access_on_the_next_check(monkeypatch):
+    monkeypatch.setattr(slack_utils, "slack_directory", SlackDirectory(ttl=3600))
+    client = FakeClient(is_admin=True)
+    assert slack_utils.slack_directory.user(client, "U1")["name"] == "ana"  # display name, cached
+
+    assert slack_utils.is_admin("U1", client)
+    client.profile["is_admin"] = False
+    assert not slack_utils.is_admin("U1", client)
+    assert client.calls == 3
+
+    # Display lookups keep using the cached profile, now the refreshed one
+    assert slack_utils.slack_directory.user(client, "U1")["is_admin"] is False
+    assert client.calls == 3
+
+
+def test_async_admin_check_refetches(monkeypatch):
+    monkeypatch.setattr(slack_utils, "slack_directory", SlackDirectory(ttl=3600))
+    client = FakeAsyncClient(is_owner=True)
+    assert asyncio.run(slack_utils.is_admin_async("U1", client))
+    client.profile["is_owner"] = False
+    assert not asyncio.run(slack_utils.is_admin_async("U1", client))
+    assert client.calls == 2
+
+
+def test_short_admin_ttl_reuses_a_recent_profile():
+    directory = SlackDirectory(ttl=3600)
+    client = FakeClient(is_admin=True)
+    directory.user(client, "U1", max_age=60)
+    directory.user(client, "U1", max_age=60)
+    assert client.calls == 1
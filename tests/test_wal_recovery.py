@@ -0,0 +1,80 @@
+# tests/test_wal_recovery.py
+
+import os
+
+import numpy as np
+import pytest
+
+from app.chunk_store import namespace_key
+from app.index_persistence import WAL_DIR
+from app.vector_store_utils import VectorStoreManager
+
+DIM = 8
+ALICE = {"user": "U1", "team": "T1"}
+BOB = {"user": "U2", "team": "T1"}
+
+
+def vector(i: int) -> list[float]:
+    return np.random.default_rng(i).standard_normal(DIM).astype(np.float32).tolist()
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """Opens managers over one folder, as successive processes would after a restart."""
+    managers = []
+
+    def open_store():
+        manager = VectorStoreManager(str(tmp_path), embeddings=None, fsync=False)
+        manager.load()
+        managers.append(manager)
+        return manager
+
+    yield open_store
+    for manager in managers:
+        manager.stop_compactor()
+
+
+def add(manager, start: int, count: int, metadata=None):
+    texts = [f"chunk {i}" for i in range(start, start + count)]
+    manager.add_embeddings([(text, vector(i)) for i, text in zip(range(start, start + count), texts)], [metadata] * count)
+    return texts
+
+
+def contents(manager) -> list[str]:
+    return sorted(manager.get_chunks([chunk_id for chunk_id, _ in manager.search(vector(0), 100)]))
+
+
+def test_unflushed_writes_are_replayed_from_the_wal(open_store):
+    texts = add(open_store(), 0, 5)
+    recovered = open_store()
+    assert len(recovered) == 5
+    assert contents(recovered) == sorted(texts)
+    assert recovered.get_chunks([recovered.search(vector(3), 1)[0][0]]) == ["chunk 3"]
+
+
+def test_torn_tail_is_dropped_and_the_store_stays_writable(open_store):
+    manager = open_store()
+    texts = add(manager, 0, 3)
+    wal = os.path.join(manager.folder, WAL_DIR)
+    with open(os.path.join(wal, sorted(os.listdir(wal))[-1]), "ab") as f:
+        f.write(b"\x40\x00\x00\x00 half a record")  # crash in the middle of an append
+
+    recovered = open_store()
+    assert contents(recovered) == sorted(texts)
+    texts += add(recovered, 3, 2)
+    assert contents(open_store()) == sorted(texts)
+
+
+def test_snapshot_plus_wal_tail_after_compaction_and_deletes(open_store):
+    manager = open_store()
+    alice = add(manager, 0, 4, ALICE)
+    add(manager, 4, 3, BOB)
+    assert manager.compact()
+    alice += add(manager, 7, 2, ALICE)  # in the WAL after the snapshot
+    assert manager.delete_namespace(namespace_key(BOB)) == 3
+
+    recovered = open_store()
+    assert contents(recovered) == sorted(alice)
+    assert recovered.search(vector(5), 10, namespaces=[namespace_key(BOB)]) == []
+    assert not recovered.filter_new(["chunk 8"], namespace_key(ALICE))
+    assert recovered.filter_new(["chunk 5"], namespace_key(BOB)) == ["chunk 5"]